@@ -1,231 +1,543 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import numpy as np
-import io
-import os
-from datetime import datetime
-
-# --- IMPORTAMOS TUS MÓDULOS ---
-from data_loader import load_data
-from engine import run_optimization, calculate_sequential_gantt, run_monte_carlo
-
-# --- CONFIGURACIÓN ---
-st.set_page_config(page_title="Strategic Portfolio Optimizer", layout="wide")
-st.markdown("<style>.stTabs [data-baseweb='tab-list'] {gap: 10px;}</style>", unsafe_allow_html=True)
-
-# --- ESTADO Y PERSISTENCIA ---
-if 'escenarios' not in st.session_state: st.session_state['escenarios'] = []
-HISTORY_FILE = "historial_decisiones.csv"
-
-def save_history(name, budget, hours, score, cost, time, items):
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M")
-    b_val = budget if budget is not None else "Ilimitado"
-    df_new = pd.DataFrame([{'Fecha': ts, 'Escenario': name, 'Presupuesto': b_val, 'Horas': hours, 'Valor': score, 'Coste': cost, 'Tiempo_Real': time, 'Items': items}])
-    if not os.path.exists(HISTORY_FILE): df_new.to_csv(HISTORY_FILE, index=False)
-    else: df_new.to_csv(HISTORY_FILE, mode='a', header=False, index=False)
-
-# --- CARGA DE DATOS ---
-current_dir = os.path.dirname(os.path.abspath(__file__))
-archivo = os.path.join(current_dir, "Roadmap_2026_CORREGIDO.xlsx")
-hoja = "4_Actividades_Priorizadas" 
-
-try:
-    df, _ = load_data(archivo, hoja)
-    if df.empty: 
-        st.error("⚠️ No se pudieron leer los datos. Revisa el Excel.")
-        st.stop()
-except Exception as e:
-    st.error(f"Error crítico: {e}")
-    st.stop()
-
-# --- SIDEBAR ---
-st.sidebar.header("🕹️ Controles de Estrategia")
-hours_total = st.sidebar.slider("⏳ Tu Tiempo (Bolsa Horas Anual)", 0, 1000, 300, step=10)
-hours_week = st.sidebar.number_input("Velocidad (Horas/Semana)", 1, 40, 10)
-
-st.sidebar.divider()
-
-use_budget = st.sidebar.checkbox("🔒 Activar límite de Presupuesto", value=False)
-if use_budget:
-    budget = st.sidebar.slider("💰 Presupuesto Máximo (€)", 0, 5000, 600, step=50)
-else:
-    budget = None
-    st.sidebar.caption("✅ Presupuesto ilimitado.")
-
-st.sidebar.divider()
-
-sc_name = st.sidebar.text_input("Nombre Escenario", "Escenario A")
-c1, c2 = st.sidebar.columns(2)
-if c1.button("💾 Comparar"):
-    res = run_optimization(df, hours_total, budget)
-    st.session_state['escenarios'].append({'Nombre': sc_name, 'Valor': res['Score_Real'].sum(), 'Coste': res['Coste'].sum()})
-    st.sidebar.success("Añadido")
-
-if c2.button("📜 Historial"):
-    res = run_optimization(df, hours_total, budget)
-    save_history(sc_name, budget, hours_total, res['Score_Real'].sum(), res['Coste'].sum(), res['Horas'].sum(), len(res))
-    st.sidebar.success("Guardado")
-
-if st.sidebar.button("🗑️ Reset"): st.session_state['escenarios'] = []
-
-# --- MOTOR PRINCIPAL ---
-df_opt = run_optimization(df, hours_total, budget)
-val = df_opt['Score_Real'].sum()
-coste_real = df_opt['Coste'].sum()
-
-# --- DASHBOARD ---
-st.title("Strategic Portfolio Optimizer (SPO)")
-st.caption(f"Roadmap 2026 | Estrategia 'Time-First' & 'Leader Risk Mitigation'")
-
-k1, k2, k3, k4 = st.columns(4)
-k1.metric("Valor Estratégico", f"{val:.1f}")
-k2.metric("Tiempo Usado", f"{df_opt['Horas'].sum()} h", delta=f"{hours_total - df_opt['Horas'].sum()} h libres")
-presupuesto_str = f"/ {budget}€" if budget else "(Sin límite)"
-k3.metric("Coste Resultante", f"{coste_real} €", f"vs {presupuesto_str}")
-k4.metric("Actividades", len(df_opt))
-
-# --- PESTAÑAS ---
-tabs = st.tabs(["📖 Contexto", "🎯 Plan", "📅 Gantt", "📈 Curva de Valor", "🔍 Auditoría", "🎲 Riesgo", "🆚 Comparador", "📥 Exportar"])
-
-with tabs[0]: # CONTEXTO
-    st.markdown("## 🧭 Visión General del Informe")
-    st.markdown("""
-    Este dashboard es tu **cuadro de mando ejecutivo** para 2026. A diferencia de una lista de tareas tradicional, 
-    utiliza un **algoritmo de optimización matemática (Knapsack)** que prioriza tus actividades basándose en el **retorno por hora invertida**.
-    
-    El sistema asume que, como líder, tu restricción principal no es el dinero, sino el **tiempo y la atención**.
-    """)
-    
-    st.divider()
-    
-    col_info, col_nav = st.columns(2)
-    
-    with col_info:
-        st.info("### 🧠 Lógica del Motor")
-        st.markdown("""
-        * **Leader Risk Mitigation:** El algoritmo asume que tu seniority reduce el riesgo técnico a la mitad.
-          `Prob_Adj = 1 - (Riesgo / 2)`
-        * **Time-First Strategy:** El eje central de decisión es la eficiencia temporal.
-        """)
-        st.latex(r'''Score = (Empleabilidad \times 0.4) + (Capa \times 0.4) + (Facilidad \times 0.2)''')
-        
-    with col_nav:
-        st.success("### 📂 Guía de Pestañas")
-        with st.expander("🎯 1. Plan Estratégico (Scatter & Ranking)"):
-            st.write("Visualiza qué actividades entran en tu agenda (Verde) y cuáles se quedan fuera (Rojo) por falta de tiempo o valor.")
-        with st.expander("📅 2. Gantt Secuencial"):
-            st.write("Orden lógico de ejecución. El algoritmo adelanta tareas pequeñas que desbloquean grandes hitos.")
-        with st.expander("📈 3. Curva de Valor"):
-            st.write("Análisis de sensibilidad. Te dice si estudiar más horas aporta valor real o si estás saturado.")
-        with st.expander("🎲 4. Riesgo (Monte Carlo)"):
-            st.write("Simulación de incertidumbre. Predicción realista de tiempos aplicando la Ley de Hofstadter.")
-
-    st.divider()
-    st.markdown("### ⚙️ Taxonomía de Arquitectura 2026")
-    cols = st.columns(5)
-    cols[0].metric("Orchestration", "10 pts", "Core Agéntico")
-    cols[1].metric("Governance", "9 pts", "Diferenciador Enterprise")
-    cols[2].metric("Data & Memory", "9 pts", "Base del Conocimiento")
-    cols[3].metric("Models (LLMs)", "7 pts", "Commodity Potente")
-    cols[4].metric("Infrastructure", "5 pts", "Utility")
-
-with tabs[1]: # PLAN
-    st.caption("📍 **Explicación:** Las burbujas **VERDES** son las seleccionadas. Fíjate en las que están arriba a la izquierda (Alto Valor, Poco Tiempo).")
-    c1, c2 = st.columns([2,1])
-    with c1:
-        df['Estado'] = np.where(df.index.isin(df_opt.index), 'SI', 'NO')
-        fig = px.scatter(df, x="Horas", y="Score_Real", color="Estado", size="Horas", 
-                         hover_data=['Actividad', 'Coste', 'Probabilidad', 'Probabilidad_Original'], 
-                         color_discrete_map={'SI':'#00CC96', 'NO':'#EF553B'},
-                         title="Matriz Valor (Y) vs Esfuerzo en Tiempo (X)")
-        fig.update_layout(xaxis_title="Horas de Dedicación", yaxis_title="Score Real (Valor)")
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # RESTAURADO: Interpretación del Plan
-        st.info(f"**Insight:** Has seleccionado **{len(df_opt)} actividades** estratégicas. Las actividades en ROJO se han descartado porque consumen demasiado tiempo para el valor que aportan comparado con las seleccionadas.")
-
-    with c2:
-        st.subheader("Ranking de Eficiencia (Dedicacion Horas/Score)")
-        st.dataframe(df_opt[['Actividad', 'Horas', 'Eficiencia']].sort_values(by='Eficiencia', ascending=False), 
-                     hide_index=True, column_config={"Eficiencia": st.column_config.NumberColumn(format="%.2f")})
-
-with tabs[2]: # GANTT
-    st.caption("🗓️ **Explicación:** Cronograma optimizado por dependencias. No intentes alterar el orden; está calculado para desbloquear valor lo antes posible.")
-    gantt = calculate_sequential_gantt(df_opt, hours_week)
-    if not gantt.empty:
-        color_col = 'Capa_desc' if 'Capa_desc' in gantt.columns else 'Tipo'
-        fig_g = px.timeline(gantt, x_start="Inicio", x_end="Fin", y="Tarea", color=color_col, hover_data=['Pre_req'])
-        fig_g.update_yaxes(autorange="reversed")
-        st.plotly_chart(fig_g, use_container_width=True)
-        st.success(f"📅 Fecha fin estimada: **{gantt['Fin'].max().strftime('%d/%m/%Y')}** (a ritmo de {hours_week}h/semana)")
-    else: st.info("No hay tareas seleccionadas")
-
-with tabs[3]: # CURVA
-    st.caption("📈 **Explicación:** Esta curva muestra el ROI de tu tiempo. Si se aplana, considera reducir horas.")
-    if st.button("🚀 Calcular Curva"):
-        max_h = max(1000, hours_total * 2)
-        steps = np.linspace(0, max_h, 30)
-        data_curve = []
-        pbar = st.progress(0)
-        for i, h_sim in enumerate(steps):
-            r = run_optimization(df, h_sim, budget=None) 
-            data_curve.append({'Horas_Disp': h_sim, 'Valor': r['Score_Real'].sum(), 'Coste_Asociado': r['Coste'].sum()})
-            pbar.progress((i+1)/30)
-        
-        df_curve = pd.DataFrame(data_curve)
-        fig_c = px.line(df_curve, x="Horas_Disp", y="Valor", markers=True, title="Curva de Valor vs Dedicación")
-        fig_c.add_vline(x=hours_total, line_dash="dash", line_color="red")
-        fig_c.add_trace(go.Scatter(x=[hours_total], y=[val], mode='markers+text', marker=dict(color='red', size=15, symbol='star'), text=["TÚ"], name="Plan Actual"))
-        st.plotly_chart(fig_c, use_container_width=True)
-        
-        # RESTAURADO: Diagnóstico Marginal
-        st.info(f"""
-        **Diagnóstico Inteligente:**
-        Con **{hours_total} horas**, consigues **{val:.1f} puntos**.
-        
-        * **Si la curva sigue subiendo:** Tienes capacidad de absorber más conocimiento valioso.
-        * **Si la curva se aplana (Meseta):** Estás entrando en rendimientos decrecientes. Estudiar más horas solo añade actividades de bajo impacto ("relleno").
-        """)
-
-with tabs[4]: # AUDITORÍA
-    st.caption("🔍 **Explicación:** Datos brutos para verificar por qué el algoritmo tomó sus decisiones.")
-    audit_cols = ['ID', 'Actividad', 'Score_Real', 'Probabilidad', 'Probabilidad_Original', 'Eficiencia']
-    cols_to_show = [c for c in audit_cols if c in df.columns]
-    st.dataframe(df[cols_to_show].sort_values(by='Score_Real', ascending=False), use_container_width=True)
-
-with tabs[5]: # RIESGO
-    st.caption("🎲 **Explicación:** Predicción realista. Considera que las tareas suelen retrasarse un 10-50%.")
-    if st.button("Lanzar Monte Carlo"):
-        mc = run_monte_carlo(df_opt)
-        c1, c2 = st.columns(2)
-        c1.plotly_chart(px.histogram(mc, x="Horas", title="Distribución de Tiempo Real"), use_container_width=True)
-        c2.plotly_chart(px.histogram(mc, x="Valor", title="Distribución de Valor Esperado"), use_container_width=True)
-        
-        # RESTAURADO: Interpretación de Percentiles
-        p50 = np.percentile(mc['Horas'], 50)
-        p90 = np.percentile(mc['Horas'], 90)
-        st.warning(f"""
-        ⚠️ **Análisis de Riesgo:**
-        * **Escenario Probable (50%):** Terminarás en **{int(p50)} horas**.
-        * **Escenario Pesimista (90%):** Podrías tardar hasta **{int(p90)} horas** si surgen complicaciones técnicas.
-        * **Consejo:** Asegúrate de tener un colchón de **{int(p90 - hours_total)} horas** extra disponibles.
-        """)
-
-with tabs[6]: # COMPARADOR
-    st.caption("🆚 **Explicación:** Usa esto para comparar si es mejor 'Pocos recursos' vs 'Muchos recursos'.")
-    if st.session_state['escenarios']:
-        cdf = pd.DataFrame(st.session_state['escenarios'])
-        st.dataframe(cdf, use_container_width=True)
-        st.plotly_chart(px.bar(cdf, x='Nombre', y='Valor', color='Coste'), use_container_width=True)
-    else: st.info("Añade escenarios usando el botón 'Comparar' en la barra lateral.")
-
-with tabs[7]: # EXPORTAR
-    st.caption("📥 **Explicación:** Descarga y comparte.")
-    if not df_opt.empty:
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-            df_opt.to_excel(writer, sheet_name='Plan_Optimizado', index=False)
-
-        st.download_button("📥 Descargar Plan (Excel)", buffer.getvalue(), "Plan_SPO.xlsx")
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import numpy as np
+import os
+from functools import partial
+
+# --- IMPORTAMOS TUS MÓDULOS ---
+from data_loader import load_workbook, file_signature, SCORE_WEIGHTS
+from cache import RESULT_CACHE
+from instrumentation import collect_stats
+from storage import DecisionStore
+from exporter import EXPORT_FORMATS, export_plan
+from jobs import JobManager, DONE, CANCELLED, FAILED
+from engine import (PortfolioModel, run_optimization, greedy_plan, value_curve, calculate_sequential_gantt, calculate_parallel_gantt,
+                    resource_utilization, run_monte_carlo,
+                    run_monte_carlo_adaptive, simulate_schedule, pareto_frontier, sensitivity_analysis,
+                    run_robust_optimization, hours_reliability, weight_sensitivity, compare_portfolios)
+
+# --- CONFIGURACIÓN ---
+st.set_page_config(page_title="Strategic Portfolio Optimizer", layout="wide")
+st.markdown("<style>.stTabs [data-baseweb='tab-list'] {gap: 10px;}</style>", unsafe_allow_html=True)
+
+# --- ESTADO Y PERSISTENCIA ---
+HISTORY_FILE = "historial_decisiones.csv"  # formato antiguo: se importa una vez a SQLite
+DB_FILE = os.environ.get("SPO_DB_PATH", "spo_decisiones.db")
+PAGE_SIZE = 25
+# Modo robusto: escenarios de duración, semilla y segundos máximos de CBC
+ROBUST_SCENARIOS = 1_000
+ROBUST_SEED = 2026
+ROBUST_TIME_LIMIT = 10
+# Estabilidad frente a los pesos del Score: vectores sorteados y semilla (fija = cacheable)
+WEIGHT_SAMPLES = 1_000
+WEIGHT_SEED = 2026
+# Trabajos en segundo plano: hilos del pool y cada cuánto se repinta su progreso
+JOB_WORKERS = 2
+JOB_POLL_SECONDS = 0.5
+# Solve interactivo 'anytime': segundos máximos antes de quedarnos con la mejor cartera encontrada.
+# CBC puede pasarse de su timeLimit: pasado este tiempo el rerun no espera más y enseña la voraz
+SOLVE_TIME_LIMIT = 5
+
+@st.cache_resource
+def get_store(path):
+    # Una conexión por proceso (WAL): escenarios e historial sobreviven a reruns y sesiones
+    store = DecisionStore(path)
+    store.import_history_csv(HISTORY_FILE)
+    return store
+
+store = get_store(DB_FILE)
+
+@st.cache_resource
+def get_jobs():
+    # Un pool por proceso: los cálculos largos sobreviven a los reruns y no bloquean los widgets
+    return JobManager(max_workers=JOB_WORKERS)
+
+jobs = get_jobs()
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress(job):
+    # Mientras corre solo se repinta este fragmento; al acabar, rerun completo para pintar el resultado
+    if job.done():
+        st.rerun()
+    st.progress(job.progress, text=f"⏳ {job.label}: {job.progress:.0%} ({job.elapsed:.0f} s)")
+    if st.button("✖️ Cancelar", key=f"cancelar_{job.key}"):
+        job.cancel()
+        st.rerun()
+
+def background(start, fn, *args, **kwargs):
+    # Lanza el cálculo al pulsar (o reutiliza uno idéntico ya lanzado) y devuelve su resultado
+    # si ya terminó; mientras corre muestra el progreso y devuelve None
+    job = jobs.submit(fn, *args, **kwargs) if start else jobs.lookup(fn, *args, **kwargs)
+    if job is None:
+        return None
+    if job.status == DONE:
+        return job.result()
+    if job.status == CANCELLED:
+        st.caption(f"Cálculo cancelado ({job.label}).")
+    elif job.status == FAILED:
+        st.error(f"Error en {job.label}: {job.error}")
+    else:
+        job_progress(job)
+    return None
+
+def save_decision(kind, name, res):
+    store.record(kind, name, hours_total, budget, res.score.sum(), res.cost.sum(), res.hours.sum(),
+                 res.ids, weekly_hours=hours_week, portfolio=hoja)
+
+# --- INSTRUMENTACIÓN (opcional) ---
+# El checkbox vive al final de la barra lateral; su valor ya está en session_state al empezar el rerun
+diag_ctx = collect_stats() if st.session_state.get('diagnostico') else None
+diag_stats = diag_ctx.__enter__() if diag_ctx else None
+
+# --- CARGA DE DATOS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+archivo = os.path.join(current_dir, "Roadmap_2026_CORREGIDO.xlsx")
+DEFAULT_SHEET = "4_Actividades_Priorizadas"
+
+@st.cache_resource
+def cached_workbook(file_path, signature):
+    # Todas las hojas del libro de una vez, como Portfolio; `signature` (tamaño, mtime) forma parte
+    # de la clave: un Excel editado nunca sirve datos viejos. cache_resource y no cache_data: las
+    # carteras son de solo lectura y se comparten entre reruns sin copiarlas (ni rehacer sus arrays)
+    return load_workbook(file_path)
+
+try:
+    carteras = cached_workbook(archivo, file_signature(archivo))
+    if not len(carteras):
+        st.error("⚠️ No se pudieron leer los datos. Revisa el Excel.")
+        st.stop()
+    default = carteras.names.index(DEFAULT_SHEET) if DEFAULT_SHEET in carteras else 0
+    hoja = st.sidebar.selectbox("📂 Cartera", carteras.names, index=default)
+    portfolio = carteras[hoja]
+    # La hoja como DataFrame solo para mostrarla (no se modifica: la comparten todas las sesiones)
+    df = portfolio.frame
+    if df.empty:
+        st.error("⚠️ No se pudieron leer los datos. Revisa el Excel.")
+        st.stop()
+except Exception as e:
+    st.error(f"Error crítico: {e}")
+    st.stop()
+
+@st.cache_resource
+def cached_model(file_path, sheet_target, signature):
+    # Un modelo por cartera y versión del Excel que sobrevive entre reruns: guarda la última
+    # solución y la tabla del DP, así mover un slider no resuelve desde cero
+    return PortfolioModel(cached_workbook(file_path, signature)[sheet_target])
+
+model = cached_model(archivo, hoja, file_signature(archivo))
+
+# --- SIDEBAR ---
+st.sidebar.header("🕹️ Controles de Estrategia")
+hours_total = st.sidebar.slider("⏳ Tu Tiempo (Bolsa Horas Anual)", 0, 1000, 300, step=10)
+hours_week = st.sidebar.number_input("Velocidad (Horas/Semana)", 1, 40, 10)
+
+st.sidebar.divider()
+
+use_budget = st.sidebar.checkbox("🔒 Activar límite de Presupuesto", value=False)
+if use_budget:
+    budget = st.sidebar.slider("💰 Presupuesto Máximo (€)", 0, 5000, 600, step=50)
+else:
+    budget = None
+    st.sidebar.caption("✅ Presupuesto ilimitado.")
+
+robust = st.sidebar.checkbox("🛡️ Modo robusto (cumplir las horas con probabilidad α)", value=False)
+if robust:
+    alpha = st.sidebar.slider("Confianza α", 0.50, 0.99, 0.90, step=0.01)
+    st.sidebar.caption(f"Plan con P(horas reales ≤ {hours_total} h) ≥ {alpha:.0%} sobre {ROBUST_SCENARIOS:,} escenarios.")
+
+    # Robusto: restricción probabilística sobre escenarios de duración (semilla fija = cacheable).
+    # Puede agotar ROBUST_TIME_LIMIT: corre en segundo plano y mientras tanto se ve el determinista
+    # (se lanza solo si no hay ya un trabajo para estos parámetros: uno cancelado no se relanza)
+    robust_args = (portfolio, hours_total, budget)
+    robust_kwargs = dict(alpha=alpha, scenarios=ROBUST_SCENARIOS, seed=ROBUST_SEED, time_limit=ROBUST_TIME_LIMIT)
+    with st.sidebar:
+        robust_plan = background(jobs.lookup(run_robust_optimization, *robust_args, **robust_kwargs) is None,
+                                 run_robust_optimization, *robust_args, **robust_kwargs)
+else:
+    robust_plan = None
+
+# Determinista: el solve va al pool de trabajos y el rerun lo espera como mucho SOLVE_TIME_LIMIT
+# (desde que se lanzó). Si CBC se alarga, se ve la voraz y el plan se repinta al terminar
+det_job = jobs.submit(run_optimization, portfolio, hours_total, budget, model=model, time_limit=SOLVE_TIME_LIMIT)
+try:
+    det_plan = det_job.result(timeout=max(SOLVE_TIME_LIMIT - det_job.elapsed, 0))
+except TimeoutError:
+    det_plan = None
+
+def solve_plan():
+    if robust_plan is not None:
+        return robust_plan
+    return det_plan if det_plan is not None else greedy_plan(portfolio, hours_total, budget, model=model)
+
+st.sidebar.divider()
+
+sc_name = st.sidebar.text_input("Nombre Escenario", "Escenario A")
+c1, c2 = st.sidebar.columns(2)
+def save_current(kind, done):
+    # Con el robusto (o el solve) aún en marcha no se guarda otro plan en su lugar
+    if robust and robust_plan is None:
+        st.sidebar.warning("El plan robusto no está listo: guárdalo cuando termine de calcularse.")
+        return
+    if not robust and det_plan is None:
+        st.sidebar.warning("El plan aún se está calculando: guárdalo cuando termine.")
+        return
+    save_decision(kind, sc_name, solve_plan())
+    st.sidebar.success(done)
+
+if c1.button("💾 Comparar"):
+    save_current('escenario', "Añadido")
+
+if c2.button("📜 Historial"):
+    save_current('historial', "Guardado")
+
+# El almacén es compartido (todas las carteras y sesiones): Reset solo borra los escenarios de
+# esta cartera y pide confirmación, porque el borrado es permanente
+with st.sidebar.popover("🗑️ Reset"):
+    n_reset = store.count(kind='escenario', portfolio=hoja)
+    st.caption(f"Borra para siempre los {n_reset} escenarios guardados de '{hoja}'.")
+    if st.button("Confirmar borrado", disabled=not n_reset):
+        store.delete(kind='escenario', portfolio=hoja)
+        st.rerun()
+
+# --- MOTOR PRINCIPAL ---
+# `plan` (Portfolio) va al motor; `df_opt` son sus filas para mostrarlas
+plan = solve_plan()
+df_opt = plan.frame
+val = df_opt['Score_Real'].sum()
+coste_real = df_opt['Coste'].sum()
+
+# --- DASHBOARD ---
+st.title("Strategic Portfolio Optimizer (SPO)")
+st.caption(f"Roadmap 2026 | Estrategia 'Time-First' & 'Leader Risk Mitigation'")
+
+k1, k2, k3, k4 = st.columns(4)
+k1.metric("Valor Estratégico", f"{val:.1f}")
+k2.metric("Tiempo Usado", f"{df_opt['Horas'].sum()} h", delta=f"{hours_total - df_opt['Horas'].sum()} h libres")
+presupuesto_str = f"/ {budget}€" if budget else "(Sin límite)"
+k3.metric("Coste Resultante", f"{coste_real} €", f"vs {presupuesto_str}")
+k4.metric("Actividades", len(df_opt))
+solve_info = plan.attrs.get('solve', {})
+if not robust and det_plan is None:
+    st.caption(f"⏱️ El solver sigue pasados {SOLVE_TIME_LIMIT} s: de momento, la cartera voraz, como mucho a "
+               f"**{solve_info['gap']:.1%}** del óptimo (cota {solve_info['bound']:.1f}).")
+    job_progress(det_job)
+elif solve_info.get('status', 'Optimal') != 'Optimal':
+    limit = ROBUST_TIME_LIMIT if robust_plan is not None else SOLVE_TIME_LIMIT
+    st.caption(f"⏱️ Mejor cartera encontrada en {limit} s ({solve_info['status']}): como mucho a "
+               f"**{solve_info['gap']:.1%}** del óptimo (cota {solve_info['bound']:.1f}).")
+if robust and robust_plan is None:
+    st.caption("🛡️ El plan robusto no está listo (ver la barra lateral): mientras tanto se muestra el determinista.")
+elif robust:
+    det = det_plan if det_plan is not None else greedy_plan(portfolio, hours_total, budget, model=model)
+    st.caption(f"🛡️ P(horas reales ≤ {hours_total} h): **{hours_reliability(plan, hours_total, seed=ROBUST_SEED):.0%}** "
+               f"con el plan robusto vs {hours_reliability(det, hours_total, seed=ROBUST_SEED):.0%} con el determinista "
+               f"(valor {det.score.sum():.1f}).")
+
+# --- PESTAÑAS ---
+tabs = st.tabs(["📖 Contexto", "🎯 Plan", "📅 Gantt", "📈 Curva de Valor", "🔍 Auditoría", "🎲 Riesgo", "🆚 Comparador", "📥 Exportar"])
+
+with tabs[0]: # CONTEXTO
+    st.markdown("## 🧭 Visión General del Informe")
+    st.markdown("""
+    Este dashboard es tu **cuadro de mando ejecutivo** para 2026. A diferencia de una lista de tareas tradicional, 
+    utiliza un **algoritmo de optimización matemática (Knapsack)** que prioriza tus actividades basándose en el **retorno por hora invertida**.
+    
+    El sistema asume que, como líder, tu restricción principal no es el dinero, sino el **tiempo y la atención**.
+    """)
+    
+    st.divider()
+    
+    col_info, col_nav = st.columns(2)
+    
+    with col_info:
+        st.info("### 🧠 Lógica del Motor")
+        st.markdown("""
+        * **Leader Risk Mitigation:** El algoritmo asume que tu seniority reduce el riesgo técnico a la mitad.
+          `Prob_Adj = 1 - (Riesgo / 2)`
+        * **Time-First Strategy:** El eje central de decisión es la eficiencia temporal.
+        """)
+        st.latex(r'''Score = (Empleabilidad \times 0.4) + (Capa \times 0.4) + (Facilidad \times 0.2)''')
+        
+    with col_nav:
+        st.success("### 📂 Guía de Pestañas")
+        with st.expander("🎯 1. Plan Estratégico (Scatter & Ranking)"):
+            st.write("Visualiza qué actividades entran en tu agenda (Verde) y cuáles se quedan fuera (Rojo) por falta de tiempo o valor.")
+        with st.expander("📅 2. Gantt Secuencial"):
+            st.write("Orden lógico de ejecución. El algoritmo adelanta tareas pequeñas que desbloquean grandes hitos.")
+        with st.expander("📈 3. Curva de Valor"):
+            st.write("Análisis de sensibilidad. Te dice si estudiar más horas aporta valor real o si estás saturado.")
+        with st.expander("🎲 4. Riesgo (Monte Carlo)"):
+            st.write("Simulación de incertidumbre. Predicción realista de tiempos aplicando la Ley de Hofstadter.")
+
+    st.divider()
+    st.markdown("### ⚙️ Taxonomía de Arquitectura 2026")
+    cols = st.columns(5)
+    cols[0].metric("Orchestration", "10 pts", "Core Agéntico")
+    cols[1].metric("Governance", "9 pts", "Diferenciador Enterprise")
+    cols[2].metric("Data & Memory", "9 pts", "Base del Conocimiento")
+    cols[3].metric("Models (LLMs)", "7 pts", "Commodity Potente")
+    cols[4].metric("Infrastructure", "5 pts", "Utility")
+
+with tabs[1]: # PLAN
+    st.caption("📍 **Explicación:** Las burbujas **VERDES** son las seleccionadas. Fíjate en las que están arriba a la izquierda (Alto Valor, Poco Tiempo).")
+    c1, c2 = st.columns([2,1])
+    with c1:
+        # Copia solo para pintar: la cartera que reciben los trabajos no cambia con las horas
+        df_plot = df.assign(Estado=np.where(df.index.isin(df_opt.index), 'SI', 'NO'))
+        fig = px.scatter(df_plot, x="Horas", y="Score_Real", color="Estado", size="Horas", 
+                         hover_data=['Actividad', 'Coste', 'Probabilidad', 'Probabilidad_Original'], 
+                         color_discrete_map={'SI':'#00CC96', 'NO':'#EF553B'},
+                         title="Matriz Valor (Y) vs Esfuerzo en Tiempo (X)")
+        fig.update_layout(xaxis_title="Horas de Dedicación", yaxis_title="Score Real (Valor)")
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # RESTAURADO: Interpretación del Plan
+        st.info(f"**Insight:** Has seleccionado **{len(df_opt)} actividades** estratégicas. Las actividades en ROJO se han descartado porque consumen demasiado tiempo para el valor que aportan comparado con las seleccionadas.")
+
+    with c2:
+        st.subheader("Ranking de Eficiencia (Dedicacion Horas/Score)")
+        st.dataframe(df_opt[['Actividad', 'Horas', 'Eficiencia']].sort_values(by='Eficiencia', ascending=False), 
+                     hide_index=True, column_config={"Eficiencia": st.column_config.NumberColumn(format="%.2f")})
+
+with tabs[2]: # GANTT
+    st.caption("🗓️ **Explicación:** Cronograma optimizado por dependencias. No intentes alterar el orden; está calculado para desbloquear valor lo antes posible.")
+    team_txt = st.text_input("👥 Equipo en paralelo (horas/semana por recurso, separadas por comas)", value=str(hours_week))
+    try:
+        team = [float(x) for x in team_txt.replace(';', ',').split(',') if x.strip()] or [hours_week]
+    except ValueError:
+        st.warning("Formato no válido: usa números separados por comas (p. ej. 10, 5). Se usa un único recurso.")
+        team = [hours_week]
+    # Un solo recurso = Gantt secuencial de siempre
+    resources = team if len(team) > 1 else None
+    hours_week_gantt = team[0] if resources is None else hours_week
+
+    ritmo = f"{hours_week_gantt:g}h/semana" if resources is None else f"{len(team)} recursos en paralelo"
+    if resources is None:
+        gantt = calculate_sequential_gantt(plan, hours_week_gantt)
+    else:
+        gantt = calculate_parallel_gantt(plan, resources)
+    if not gantt.empty:
+        color_col = 'Recurso' if resources else ('Capa_desc' if 'Capa_desc' in gantt.columns else 'Tipo')
+        fig_g = px.timeline(gantt, x_start="Inicio", x_end="Fin", y="Tarea", color=color_col, hover_data=['Pre_req'])
+        fig_g.update_yaxes(autorange="reversed")
+        st.plotly_chart(fig_g, use_container_width=True)
+        st.success(f"📅 Fecha fin estimada: **{gantt['Fin'].max().strftime('%d/%m/%Y')}** (a ritmo de {ritmo})")
+        if resources:
+            util = resource_utilization(gantt, resources)
+            st.dataframe(util, hide_index=True, use_container_width=True,
+                         column_config={"Ocupacion": st.column_config.ProgressColumn(min_value=0, max_value=1, format="%.2f")})
+    else: st.info("No hay tareas seleccionadas")
+
+with tabs[3]: # CURVA
+    st.caption("📈 **Explicación:** Esta curva muestra el ROI de tu tiempo. Si se aplana, considera reducir horas.")
+    max_h = max(1000, hours_total * 2)
+    # Un solo DP da el óptimo exacto para cada hora (sin 30 llamadas al solver), en segundo plano
+    curve = background(st.button("🚀 Calcular Curva"), value_curve, portfolio, max_h)
+    if curve is not None:
+        df_curve = curve.to_frame()
+        fig_c = px.line(df_curve, x="Horas_Disp", y="Valor", line_shape='hv', hover_data=['Coste_Asociado', 'Actividades'],
+                        title="Curva de Valor vs Dedicación")
+        fig_c.add_vline(x=hours_total, line_dash="dash", line_color="red")
+        fig_c.add_trace(go.Scatter(x=[hours_total], y=[val], mode='markers+text', marker=dict(color='red', size=15, symbol='star'), text=["TÚ"], name="Plan Actual"))
+        st.plotly_chart(fig_c, use_container_width=True)
+        
+        # RESTAURADO: Diagnóstico Marginal
+        st.info(f"""
+        **Diagnóstico Inteligente:**
+        Con **{hours_total} horas**, consigues **{val:.1f} puntos**.
+        
+        * **Si la curva sigue subiendo:** Tienes capacidad de absorber más conocimiento valioso.
+        * **Si la curva se aplana (Meseta):** Estás entrando en rendimientos decrecientes. Estudiar más horas solo añade actividades de bajo impacto ("relleno").
+        """)
+
+with tabs[4]: # AUDITORÍA
+    st.caption("🔍 **Explicación:** Datos brutos para verificar por qué el algoritmo tomó sus decisiones.")
+    audit_cols = ['ID', 'Actividad', 'Score_Real', 'Probabilidad', 'Probabilidad_Original', 'Eficiencia']
+    cols_to_show = [c for c in audit_cols if c in df.columns]
+    audit = df[cols_to_show].reset_index(drop=True)
+    try:
+        # Una sola pasada del DP: sin re-resolver por cada actividad
+        sens = sensitivity_analysis(portfolio, hours_total, budget)
+    except ValueError as e:
+        sens = None
+        st.warning(f"Sensibilidad no disponible: {e}")
+    if sens is not None:
+        a1, a2 = st.columns(2)
+        a1.metric("Valor de 1 hora extra", f"{sens.marginal_hour:.2f}")
+        if sens.marginal_budget is not None:
+            a2.metric("Valor de 1 € extra", f"{sens.marginal_budget:.3f}")
+        extra = sens.frame.drop(columns=['ID', 'Actividad'])
+        if budget is None:
+            extra = extra.drop(columns='Coste_Extra')
+        audit = pd.concat([audit, extra], axis=1)
+    st.dataframe(audit.sort_values(by='Score_Real', ascending=False), use_container_width=True)
+
+    if sens is not None and not sens.frame['Seleccionada'].all():
+        fuera = sens.frame[~sens.frame['Seleccionada']]
+        pick = st.selectbox("❓ ¿Por qué no entra...?", fuera.index,
+                            format_func=lambda i: str(fuera.loc[i, 'Actividad'] if 'Actividad' in df.columns else fuera.loc[i, 'ID']))
+        row = fuera.loc[pick]
+        motivo = []
+        if np.isnan(row['Perdida_Si_Dentro']):
+            motivo.append("no cabe en las horas/presupuesto actuales (ni con sus prerrequisitos)")
+        else:
+            motivo.append(f"forzarla costaría **{row['Perdida_Si_Dentro']:.2f} puntos** de valor")
+        if not np.isnan(row['Horas_Extra']):
+            motivo.append(f"entra con **{row['Horas_Extra']:g} horas más** ({row['Valor_Hora_Extra']:.2f} puntos por hora extra)")
+        if budget is not None and not np.isnan(row['Coste_Extra']):
+            motivo.append(f"o con **{row['Coste_Extra']:g} € más** de presupuesto")
+        texto = "; ".join(motivo)
+        st.info(texto[0].upper() + texto[1:] + ".")
+
+    st.markdown("#### ⚖️ Estabilidad frente a los pesos del Score")
+    if all(c in df.columns for c in SCORE_WEIGHTS):
+        # Miles de vectores de pesos puntuados de golpe; solo se resuelve donde la cartera puede cambiar
+        sweep = background(st.button("⚖️ Barrer pesos"), weight_sensitivity, portfolio, hours_total, SCORE_WEIGHTS, budget,
+                           samples=WEIGHT_SAMPLES, seed=WEIGHT_SEED)
+        if sweep is not None:
+            w1, w2, w3 = st.columns(3)
+            w1.metric("Plan actual se mantiene", f"{sweep.base_share:.0%}")
+            w2.metric("Carteras distintas", len(sweep.portfolios))
+            w3.metric("Resoluciones necesarias", f"{sweep.solves:,} de {len(sweep.weights):,}")
+            estab = sweep.frame[(sweep.frame['Frecuencia'] > 0) | sweep.frame['En_Base']]
+            estab = estab.sort_values(by='Frecuencia', ascending=False)
+            fig_w = px.bar(estab, x='Actividad' if 'Actividad' in estab.columns else 'ID', y='Frecuencia', color='En_Base',
+                           title="Frecuencia de selección con pesos alternativos")
+            st.plotly_chart(fig_w, use_container_width=True)
+            st.caption(f"⚖️ **Explicación:** {len(sweep.weights):,} variaciones de los pesos "
+                       f"({', '.join(f'{c} {w:.0%}' for c, w in SCORE_WEIGHTS.items())}). "
+                       "Las actividades cerca del 100% entran pase lo que pase; las intermedias dependen de la fórmula.")
+    else:
+        st.caption("La hoja no trae los ingredientes del Score (" + ", ".join(SCORE_WEIGHTS) + ").")
+
+with tabs[5]: # RIESGO
+    st.caption("🎲 **Explicación:** Predicción realista. Considera que las tareas suelen retrasarse un 10-50%.")
+    adaptive = st.checkbox("⏱️ Modo adaptativo (simula hasta que P50/P90 se estabilizan)")
+    launch = st.button("Lanzar Monte Carlo")
+    # Simulaciones en segundo plano: al volver a la pestaña (mismo plan) se recoge el resultado
+    p50 = p90 = None
+    if adaptive:
+        mc_ad = background(launch, run_monte_carlo_adaptive, plan)
+        if mc_ad is not None:
+            st.dataframe(mc_ad['Resumen'], use_container_width=True)
+            estado = "convergido" if mc_ad['Convergido'] else "sin converger"
+            st.caption(f"{estado.capitalize()} tras {mc_ad['Iteraciones']:,} iteraciones (IC 95%)")
+            p50, p90 = mc_ad['Resumen'].loc['Horas', ['P50', 'P90']]
+    else:
+        mc = background(launch, run_monte_carlo, plan, iterations=10_000)
+        if mc is not None:
+            c1, c2 = st.columns(2)
+            c1.plotly_chart(px.histogram(mc, x="Horas", title="Distribución de Tiempo Real"), use_container_width=True)
+            c2.plotly_chart(px.histogram(mc, x="Valor", title="Distribución de Valor Esperado"), use_container_width=True)
+
+            # RESTAURADO: Interpretación de Percentiles
+            p50 = np.percentile(mc['Horas'], 50)
+            p90 = np.percentile(mc['Horas'], 90)
+    if p50 is not None:
+        st.warning(f"""
+        ⚠️ **Análisis de Riesgo:**
+        * **Escenario Probable (50%):** Terminarás en **{int(p50)} horas**.
+        * **Escenario Pesimista (90%):** Podrías tardar hasta **{int(p90)} horas** si surgen complicaciones técnicas.
+        * **Consejo:** Asegúrate de tener un colchón de **{int(p90 - hours_total)} horas** extra disponibles.
+        """)
+
+    # Fechas de fin: las duraciones sorteadas pasan por la estructura del Gantt
+    sim = background(launch, simulate_schedule, plan, hours_week_gantt, iterations=5_000, resources=resources)
+    if sim is not None and sim['P50'] is not None:
+        c3, c4 = st.columns(2)
+        c3.plotly_chart(px.histogram(sim['Fin'], x="Fin", title="Distribución de Fecha de Fin"), use_container_width=True)
+        crit = sim['Criticidad'].sort_values(by='Criticidad_Dependencias', ascending=False)
+        c4.plotly_chart(px.bar(crit, x='Tarea', y='Criticidad_Dependencias', title="Frecuencia en la cadena crítica de dependencias"),
+                        use_container_width=True)
+        st.info(f"📅 **Fecha fin P50:** {sim['P50'].strftime('%d/%m/%Y')} · **P90:** {sim['P90'].strftime('%d/%m/%Y')} (a ritmo de {ritmo})")
+
+with tabs[6]: # COMPARADOR
+    st.caption("🆚 **Explicación:** Usa esto para comparar si es mejor 'Pocos recursos' vs 'Muchos recursos'.")
+    f1, f2, f3, f4 = st.columns([2, 1, 1, 1])
+    name_filter = f1.text_input("🔎 Filtrar por nombre (prefijo)", key='cmp_nombre')
+    kind_label = f2.selectbox("Origen", ["Escenarios", "Historial", "Todo"], key='cmp_tipo')
+    kind = {'Escenarios': 'escenario', 'Historial': 'historial', 'Todo': None}[kind_label]
+    # Por defecto, solo las decisiones de la cartera abierta
+    cartera_label = f3.selectbox("Cartera", [hoja, "Todas"], key='cmp_cartera')
+    cartera = None if cartera_label == "Todas" else cartera_label
+    # Filtrado, conteo y paginación en SQLite: a pandas solo llega la página visible
+    n_rows = store.count(kind=kind, name=name_filter, portfolio=cartera)
+    if n_rows:
+        n_pages = (n_rows - 1) // PAGE_SIZE + 1
+        page = f4.number_input(f"Página (de {n_pages})", 1, n_pages, 1, key='cmp_pagina')
+        cdf = store.query(kind=kind, name=name_filter, portfolio=cartera, limit=PAGE_SIZE,
+                          offset=(page - 1) * PAGE_SIZE)
+        st.caption(f"{n_rows} decisiones guardadas · mostrando {len(cdf)}")
+        st.dataframe(cdf, use_container_width=True, hide_index=True)
+        st.plotly_chart(px.bar(cdf, x='Nombre', y='Valor', color='Coste', hover_data=['Fecha', 'Horas', 'Presupuesto']),
+                        use_container_width=True)
+
+        chosen = st.selectbox("Ver actividades de la decisión", cdf['ID'],
+                              format_func=lambda i: f"#{i} · {cdf.loc[cdf['ID'] == i, 'Nombre'].iloc[0]}")
+        ids = store.items(chosen)
+        # Los IDs solo tienen sentido en la cartera donde se guardó la decisión
+        origen = cdf.loc[cdf['ID'] == chosen, 'Cartera'].iloc[0]
+        if not ids:
+            st.caption("Decisión importada del historial antiguo: no guarda las actividades.")
+        elif pd.isna(origen) or origen not in carteras:
+            st.caption(f"La decisión no es de ninguna cartera de este libro ({origen if pd.notna(origen) else 'sin cartera'}): "
+                       f"sus {len(ids)} actividades no se pueden mostrar.")
+        else:
+            origen_df = carteras[origen].frame
+            st.dataframe(origen_df[origen_df['ID'].isin(ids)][['ID', 'Actividad', 'Horas', 'Coste', 'Score_Real']],
+                         use_container_width=True, hide_index=True)
+    else: st.info("Añade escenarios usando el botón 'Comparar' en la barra lateral.")
+
+    if len(carteras) > 1:
+        st.divider()
+        st.subheader("🗂️ Carteras del libro (mismas horas y presupuesto)")
+        st.dataframe(compare_portfolios(carteras, hours_total, budget), use_container_width=True, hide_index=True)
+
+    st.divider()
+    # Un solo DP 2D: óptimo para todas las combinaciones (horas, presupuesto), en segundo plano
+    pf = background(st.button("🗺️ Calcular Frontera Horas x Presupuesto"), pareto_frontier, portfolio)
+    if pf is not None:
+        fig_s = go.Figure(go.Surface(x=pf.cost_axis, y=pf.hours_axis, z=pf.surface, colorscale='Viridis', showscale=False))
+        fig_s.add_trace(go.Scatter3d(x=pf.frontier['Coste'], y=pf.frontier['Horas'], z=pf.frontier['Valor'],
+                                     mode='markers', marker=dict(size=3, color='red'), name="Frontera de Pareto"))
+        fig_s.update_layout(title="Valor óptimo por Horas y Presupuesto", height=600,
+                            scene=dict(xaxis_title="Presupuesto (€)", yaxis_title="Horas", zaxis_title="Valor"))
+        st.plotly_chart(fig_s, use_container_width=True)
+        st.caption(f"{len(pf.frontier)} carteras no dominadas (más valor exige más horas o más presupuesto).")
+        st.dataframe(pf.frontier.drop(columns='IDs'), use_container_width=True)
+
+with tabs[7]: # EXPORTAR
+    st.caption("📥 **Explicación:** Descarga y comparte. Incluye Plan, Gantt, resumen de Riesgo y Auditoría.")
+    if not df_opt.empty:
+        fmt = st.radio("Formato", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f][0], horizontal=True)
+        _, mime, ext = EXPORT_FORMATS[fmt]
+        # Se genera solo al pulsar (callable) y queda cacheado por huella del plan
+        st.download_button("📥 Descargar Plan", partial(export_plan, df, df_opt, fmt, hours_week_gantt, resources),
+                           f"Plan_SPO.{ext}", mime=mime)
+
+# --- DIAGNÓSTICO DE CACHÉ ---
+with st.sidebar.expander("⚡ Caché del motor"):
+    st.json(RESULT_CACHE.stats())
+    trabajos = jobs.jobs()
+    if not trabajos.empty:
+        st.caption("Trabajos en segundo plano")
+        st.dataframe(trabajos, hide_index=True, use_container_width=True)
+    st.checkbox("🩺 Diagnóstico de rendimiento", key='diagnostico')
+
+if diag_ctx:
+    diag_ctx.__exit__(None, None, None)
+    with st.sidebar.expander("🩺 Diagnóstico", expanded=True):
+        st.caption("Tiempos por etapa de esta ejecución (solo lo que no salió de la caché)")
+        st.dataframe(diag_stats.stage_frame(), hide_index=True, use_container_width=True,
+                     column_config={"Segundos": st.column_config.NumberColumn(format="%.4f")})
+        solver = diag_stats.last('solver')
+        if solver:
+            st.caption("Último solve")
+            st.json(solver)
+        if diag_stats.records.get('model'):
+            st.caption("Tamaño del modelo")
+            st.json(diag_stats.last('model'))
+        st.caption("Caché (aciertos / fallos por función)")
+        st.json(dict(diag_stats.counters))
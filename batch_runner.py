@@ -0,0 +1,202 @@
+"""
+BATCH RUNNER DE ESCENARIOS (SIN STREAMLIT)
+------------------------------------------
+Resuelve una rejilla de escenarios (horas x presupuesto x horas/semana) en un
+pool de procesos y va escribiendo cada resultado en CSV, Parquet o en el
+almacén SQLite de la app según llega, sin acumularlos en memoria.
+
+Run with:
+    python batch_runner.py --hours 100 200 300 --budget none 600 \
+        --weekly-hours 10 20 --workers 4 --output escenarios.parquet
+"""
+
+import argparse
+import csv
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from data_loader import load_data
+from engine import PortfolioModel, run_optimization, calculate_sequential_gantt
+from portfolio import as_portfolio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Roadmap_2026_CORREGIDO.xlsx")
+DEFAULT_SHEET = "4_Actividades_Priorizadas"
+
+RESULT_FIELDS = ['Escenario', 'Horas_Disp', 'Presupuesto', 'Horas_Semana',
+                 'Valor', 'Coste', 'Horas', 'Actividades', 'IDs', 'Fin']
+
+# Estado de cada proceso del pool: la cartera se carga una sola vez por worker
+_WORKER = {}
+
+
+def _init_worker(df):
+    _WORKER['portfolio'] = portfolio = as_portfolio(df)
+    _WORKER['model'] = PortfolioModel(portfolio)
+
+
+def solve_scenario(scenario):
+    """Optimiza y calendariza un escenario; devuelve una fila de resultados."""
+    sc_id, hours, budget, weekly_hours = scenario
+    portfolio, model = _WORKER['portfolio'], _WORKER['model']
+
+    # Plan como sub-cartera: los totales salen de sus arrays, sin construir DataFrames
+    plan = run_optimization(portfolio, hours, budget, model=model)
+    gantt = calculate_sequential_gantt(plan, weekly_hours)
+    return {
+        'Escenario': sc_id,
+        'Horas_Disp': hours,
+        'Presupuesto': budget,
+        'Horas_Semana': weekly_hours,
+        'Valor': float(plan.score.sum()),
+        'Coste': float(plan.cost.sum()),
+        'Horas': float(plan.hours.sum()),
+        'Actividades': len(plan),
+        'IDs': ';'.join(str(int(i)) for i in plan.ids),
+        'Fin': gantt['Fin'].max().strftime('%Y-%m-%d') if not gantt.empty else None,
+    }
+
+
+def scenario_grid(hours, budgets, weekly_hours):
+    """Producto cartesiano perezoso de la rejilla, con ID correlativo."""
+    for sc_id, (h, b, w) in enumerate(itertools.product(hours, budgets, weekly_hours)):
+        yield sc_id, h, b, w
+
+
+class CsvSink:
+    """Escribe filas en CSV a medida que llegan (un flush por lote)."""
+
+    def __init__(self, path):
+        self._f = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._f, fieldnames=RESULT_FIELDS)
+        self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetSink:
+    """Escribe cada lote como un row group de Parquet (requiere pyarrow)."""
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ('Escenario', pa.int64()), ('Horas_Disp', pa.float64()), ('Presupuesto', pa.float64()),
+            ('Horas_Semana', pa.float64()), ('Valor', pa.float64()), ('Coste', pa.float64()),
+            ('Horas', pa.float64()), ('Actividades', pa.int64()), ('IDs', pa.string()), ('Fin', pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class SqliteSink:
+    """Guarda cada lote como escenarios del DecisionStore (una transacción por lote)."""
+
+    def __init__(self, path, portfolio=None):
+        from storage import DecisionStore
+
+        self._store = DecisionStore(path)
+        self._portfolio = portfolio
+
+    def write(self, rows):
+        self._store.record_many([
+            dict(kind='escenario', name=f"Batch {r['Escenario']}", hours=r['Horas_Disp'], budget=r['Presupuesto'],
+                 weekly_hours=r['Horas_Semana'], value=r['Valor'], cost=r['Coste'], used_hours=r['Horas'],
+                 activity_ids=[int(i) for i in r['IDs'].split(';') if i], portfolio=self._portfolio)
+            for r in rows])
+
+    def close(self):
+        self._store.close()
+
+
+def open_sink(path, portfolio=None):
+    if path.endswith('.parquet'):
+        return ParquetSink(path)
+    if path.endswith(('.db', '.sqlite')):
+        return SqliteSink(path, portfolio)
+    return CsvSink(path)
+
+
+def run_batch(df, scenarios, sink, workers=1, batch_size=256):
+    """
+    Resuelve `scenarios` y los va volcando en `sink` por lotes. `df` puede
+    ser el DataFrame de la cartera o su `Portfolio`.
+    Con workers > 1 mantiene solo una ventana acotada de tareas en vuelo,
+    así que ni los escenarios ni los resultados se acumulan en memoria.
+    """
+    batch, done = [], 0
+
+    def emit(row):
+        nonlocal batch, done
+        batch.append(row)
+        done += 1
+        if len(batch) >= batch_size:
+            sink.write(batch)
+            batch = []
+
+    if workers <= 1:
+        _init_worker(df)
+        for scenario in scenarios:
+            emit(solve_scenario(scenario))
+    else:
+        scenarios = iter(scenarios)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(df,)) as pool:
+            in_flight = {pool.submit(solve_scenario, sc) for sc in itertools.islice(scenarios, workers * 4)}
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    emit(future.result())
+                    nxt = next(scenarios, None)
+                    if nxt is not None:
+                        in_flight.add(pool.submit(solve_scenario, nxt))
+
+    if batch:
+        sink.write(batch)
+    logger.info("%d escenarios resueltos", done)
+    return done
+
+
+def _parse_budget(value):
+    return None if value.lower() in ('none', 'inf', 'ilimitado') else float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Barrido batch de escenarios del SPO")
+    parser.add_argument('--workbook', default=DEFAULT_WORKBOOK)
+    parser.add_argument('--sheet', default=DEFAULT_SHEET)
+    parser.add_argument('--hours', type=float, nargs='+', required=True)
+    parser.add_argument('--budget', type=_parse_budget, nargs='+', default=[None],
+                        help="presupuestos en €; 'none' = ilimitado")
+    parser.add_argument('--weekly-hours', type=float, nargs='+', default=[10])
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--output', required=True, help="ruta .csv, .parquet o .db (almacén SQLite de la app)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    _, portfolio = load_data(args.workbook, args.sheet)
+    sink = open_sink(args.output, args.sheet)
+    try:
+        run_batch(portfolio, scenario_grid(args.hours, args.budget, args.weekly_hours), sink,
+                  workers=args.workers, batch_size=args.batch_size)
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    main()
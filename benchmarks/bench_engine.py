@@ -0,0 +1,226 @@
+"""
+SUITE DE BENCHMARKS DEL MOTOR
+-----------------------------
+Mide tiempo (mejor de N repeticiones) y pico de memoria (tracemalloc) de cada
+función del motor sobre roadmaps sintéticos de 100 a 100k actividades, guarda
+los resultados en JSON y marca regresiones frente a una línea base.
+
+Run with:
+    python benchmarks/bench_engine.py --sizes 100 1000 10000 --output resultados.json
+    python benchmarks/bench_engine.py --save-baseline          # fija la línea base
+    python benchmarks/bench_engine.py --fail-on-regression     # exit 1 si empeora
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.synthetic import generate_roadmap, write_workbook, SHEET  # noqa: E402
+from data_loader import _prepare, load_data  # noqa: E402
+from cache import RESULT_CACHE  # noqa: E402
+from engine import PortfolioModel, run_optimization, calculate_sequential_gantt, run_monte_carlo  # noqa: E402
+from portfolio import Portfolio  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000]
+
+# Capacidad de los casos de optimización: una bolsa anual como la del slider de
+# la app. Con 100k actividades el DP nativo aún cabe en MAX_NATIVE_CELLS.
+PLAN_HOURS = 400
+PLAN_BUDGET = 1_000
+
+# Tamaño máximo por caso: escribir un Excel de 100k filas o resolver con CBC
+# (el presupuesto saca el problema del DP nativo) lleva minutos, no segundos.
+# Se amplía con --max-size.
+SIZE_LIMITS = {
+    'run_optimization_budget': 10_000,
+    'load_data_excel': 10_000,
+    'load_data_cached': 10_000,
+}
+
+
+def _case_run_optimization(ctx):
+    return lambda: run_optimization(ctx['df'], PLAN_HOURS)
+
+
+def _case_run_optimization_budget(ctx):
+    return lambda: run_optimization(ctx['df'], PLAN_HOURS, PLAN_BUDGET)
+
+
+def _case_gantt(ctx):
+    return lambda: calculate_sequential_gantt(ctx['df'], 10)
+
+
+def _case_monte_carlo(ctx):
+    return lambda: run_monte_carlo(ctx['df'], iterations=1_000, seed=1)
+
+
+def _scenario_sweep(source):
+    # Como batch_runner: modelo reutilizado y, por escenario, plan + Gantt + Monte Carlo
+    model = PortfolioModel(source)
+
+    def run():
+        for hours in range(PLAN_HOURS - 50, PLAN_HOURS + 50, 10):
+            RESULT_CACHE.clear()
+            plan = run_optimization(source, hours, model=model)
+            calculate_sequential_gantt(plan, 10)
+            run_monte_carlo(plan, iterations=100, seed=1)
+    return run
+
+
+def _case_scenarios_frame(ctx):
+    return _scenario_sweep(ctx['df'])
+
+
+def _case_scenarios_portfolio(ctx):
+    return _scenario_sweep(Portfolio.from_frame(ctx['df']))
+
+
+def _case_load_data_excel(ctx):
+    # Carga en frío: Excel -> pipeline de scoring -> caché Parquet (vacía cada vez)
+    def run():
+        for fname in os.listdir(ctx['cache_dir']):
+            os.remove(os.path.join(ctx['cache_dir'], fname))
+        return load_data(ctx['workbook'], SHEET)
+    return run
+
+
+def _case_load_data_cached(ctx):
+    load_data(ctx['workbook'], SHEET)  # calienta la caché columnar
+    return lambda: load_data(ctx['workbook'], SHEET)
+
+
+CASES = {
+    'run_optimization': _case_run_optimization,
+    'run_optimization_budget': _case_run_optimization_budget,
+    'calculate_sequential_gantt': _case_gantt,
+    'run_monte_carlo': _case_monte_carlo,
+    'scenarios_frame': _case_scenarios_frame,
+    'scenarios_portfolio': _case_scenarios_portfolio,
+    'load_data_excel': _case_load_data_excel,
+    'load_data_cached': _case_load_data_cached,
+}
+
+
+def measure(fn, repeat=3):
+    """Mejor tiempo de `repeat` ejecuciones y pico de memoria de una de ellas."""
+    best = float('inf')
+    for _ in range(repeat):
+        RESULT_CACHE.clear()
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+
+    RESULT_CACHE.clear()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(sizes, cases=None, repeat=3, seed=0, max_size=None, log=print):
+    """Ejecuta los casos pedidos para cada tamaño; devuelve la lista de resultados."""
+    cases = cases or list(CASES)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            raw = generate_roadmap(n, seed=seed)
+            ctx = {'df': _prepare(raw.copy()), 'raw': raw, 'cache_dir': os.path.join(tmp, '.spo_cache')}
+
+            for name in cases:
+                limit = max_size or SIZE_LIMITS.get(name)
+                if limit is not None and n > limit:
+                    continue
+                if name.startswith('load_data') and 'workbook' not in ctx:
+                    ctx['workbook'] = write_workbook(raw, os.path.join(tmp, f"sintetico_{n}.xlsx"))
+                    os.makedirs(ctx['cache_dir'], exist_ok=True)
+
+                seconds, peak = measure(CASES[name](ctx), repeat)
+                results.append({'case': name, 'size': n, 'seconds': seconds, 'peak_mb': peak / 2**20})
+                log(f"{name:<28} {n:>8} {seconds * 1000:>11.1f} ms {peak / 2**20:>9.1f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.005):
+    """
+    Regresiones frente a la línea base: más de `tolerance` (relativo) de tiempo
+    o de memoria. Por debajo de `min_seconds` el ruido manda y no se marca.
+    """
+    base = {(r['case'], r['size']): r for r in baseline.get('results', [])}
+    flagged = []
+    for r in results:
+        ref = base.get((r['case'], r['size']))
+        if ref is None:
+            continue
+        slower = r['seconds'] > ref['seconds'] * (1 + tolerance) and r['seconds'] - ref['seconds'] > min_seconds
+        bigger = r['peak_mb'] > ref['peak_mb'] * (1 + tolerance) and r['peak_mb'] - ref['peak_mb'] > 1
+        if slower or bigger:
+            flagged.append({**r, 'baseline_seconds': ref['seconds'], 'baseline_peak_mb': ref['peak_mb']})
+    return flagged
+
+
+def _report(sizes, results, regressions):
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'sizes': sizes,
+        'results': results,
+        'regressions': regressions,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del motor SPO sobre roadmaps sintéticos")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-size', type=int, default=None, help="ignora SIZE_LIMITS y usa este tope")
+    parser.add_argument('--output', default=os.path.join(HERE, "results.json"))
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="guarda esta ejecución como línea base")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    print(f"{'caso':<28} {'tareas':>8} {'tiempo':>14} {'pico mem':>12}")
+    results = run_suite(args.sizes, args.cases, args.repeat, args.seed, args.max_size)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESIÓN {r['case']} [{r['size']}]: {r['seconds'] * 1000:.1f} ms "
+                  f"(base {r['baseline_seconds'] * 1000:.1f} ms), {r['peak_mb']:.1f} MB "
+                  f"(base {r['baseline_peak_mb']:.1f} MB)")
+        if not regressions:
+            print("Sin regresiones frente a la línea base")
+
+    report = _report(args.sizes, results, regressions)
+    target = args.baseline if args.save_baseline else args.output
+    with open(target, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados en {target}")
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Benchmark de escalado del Monte Carlo multi-proceso (1 -> N cores).
+Run with: python benchmarks/bench_monte_carlo.py --tasks 300 --iterations 200000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from cache import RESULT_CACHE  # noqa: E402
+from engine import run_monte_carlo  # noqa: E402
+
+
+def make_plan(n_tasks, seed=0):
+    """Plan sintético con la forma del Excel (Horas, Coste, Probabilidad, Score_Real)."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Horas': rng.integers(1, 100, n_tasks),
+        'Coste': rng.integers(0, 5, n_tasks) * 50,
+        'Probabilidad': rng.uniform(0.5, 1.0, n_tasks),
+        'Score_Real': rng.uniform(2.0, 10.0, n_tasks),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=300)
+    parser.add_argument('--iterations', type=int, default=200_000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    plan = make_plan(args.tasks)
+    draws = 2 * args.tasks * args.iterations
+    print(f"{args.tasks} tareas x {args.iterations} iteraciones = {draws / 1e6:.0f}M sorteos")
+    print(f"{'workers':>8} {'segundos':>10} {'speedup':>8} {'idéntico':>9}")
+
+    reference, base_time = None, None
+    workers = 1
+    while workers <= args.max_workers:
+        # Con semilla el resultado se cachea (y `workers` no entra en la clave): cada medida en frío
+        RESULT_CACHE.clear()
+        t0 = time.perf_counter()
+        res = run_monte_carlo(plan, args.iterations, seed=args.seed, workers=workers)
+        elapsed = time.perf_counter() - t0
+
+        if reference is None:
+            reference, base_time = res, elapsed
+        same = res.equals(reference)
+        print(f"{workers:>8} {elapsed:>10.2f} {base_time / elapsed:>7.2f}x {str(same):>9}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
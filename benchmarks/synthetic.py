@@ -0,0 +1,109 @@
+"""
+GENERADOR DE ROADMAPS SINTÉTICOS
+--------------------------------
+Roadmaps reproducibles (misma semilla -> mismo roadmap) con la forma de la
+hoja '4_Actividades_Priorizadas': tamaño, profundidad y ramificación del
+bosque de Pre_req y distribuciones de score / horas / coste configurables.
+
+    raw = generate_roadmap(10_000, seed=1, max_depth=6, branching=3)
+    df = generate_portfolio(10_000, seed=1)       # ya puntuado, como load_data
+    write_workbook(raw, "sintetico.xlsx")         # para medir load_data
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_loader import _prepare  # noqa: E402
+
+SHEET = "4_Actividades_Priorizadas"
+CAPAS = ['Orchestration', 'Data & Memory', 'Governance', 'Agents', 'MLOps', 'Foundations']
+TIPOS = ['Curso', 'Certificación', 'Proyecto', 'Lectura']
+
+
+def _draw(rng, dist, size):
+    """
+    Muestra de una distribución descrita como tupla:
+    ('uniform', low, high), ('integers', low, high), ('lognormal', mean, sigma)
+    o ('choice', valores, probabilidades).
+    """
+    kind, *params = dist
+    if kind == 'uniform':
+        return rng.uniform(params[0], params[1], size)
+    if kind == 'integers':
+        return rng.integers(params[0], params[1], size, endpoint=True)
+    if kind == 'lognormal':
+        return rng.lognormal(params[0], params[1], size)
+    if kind == 'choice':
+        return rng.choice(np.asarray(params[0]), size, p=params[1] if len(params) > 1 else None)
+    raise ValueError(f"Distribución desconocida: {kind}")
+
+
+def dependency_forest(n, rng, max_depth=4, branching=3, dependency_share=0.6):
+    """
+    Bosque aleatorio de Pre_req (posiciones, -1 = raíz). Cada tarea depende,
+    con probabilidad `dependency_share`, de una tarea anterior que aún no esté
+    a `max_depth` niveles ni tenga ya `branching` hijos.
+    """
+    parent = np.full(n, -1, dtype=np.int64)
+    depth = np.zeros(n, dtype=np.int64)
+    children = np.zeros(n, dtype=np.int64)
+    wants_parent = rng.random(n) < dependency_share
+    picks = rng.random(n)
+
+    # Candidatas a padre: lista con borrado O(1) (intercambio con la última)
+    open_nodes, slot = [], np.full(n, -1, dtype=np.int64)
+    for i in range(n):
+        if wants_parent[i] and open_nodes:
+            p = open_nodes[int(picks[i] * len(open_nodes))]
+            parent[i] = p
+            depth[i] = depth[p] + 1
+            children[p] += 1
+            if children[p] >= branching:
+                last = open_nodes.pop()
+                if last != p:
+                    open_nodes[slot[p]] = last
+                    slot[last] = slot[p]
+        if depth[i] < max_depth and branching > 0:
+            slot[i] = len(open_nodes)
+            open_nodes.append(i)
+    return parent
+
+
+def generate_roadmap(n, seed=0, max_depth=4, branching=3, dependency_share=0.6,
+                     score=('uniform', 1.0, 10.0), hours=('integers', 1, 80),
+                     cost=('choice', [0, 0, 0, 50, 100, 200, 400]),
+                     probability=('uniform', 40.0, 100.0)):
+    """
+    Hoja 'cruda' tal como vendría del Excel (Id, Actividad, Coste, Horas,
+    Score, Pre_req, Probabilidad en %, Tipo, Capa_desc).
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n + 1)
+    parent = dependency_forest(n, rng, max_depth, branching, dependency_share)
+
+    return pd.DataFrame({
+        'Id': ids,
+        'Actividad': [f"Actividad {i}" for i in ids],
+        'Coste': _draw(rng, cost, n),
+        'Horas': _draw(rng, hours, n),
+        'Score': np.round(_draw(rng, score, n), 2),
+        'Pre_req': np.where(parent >= 0, parent + 1, 0),
+        'Probabilidad': np.round(_draw(rng, probability, n), 1),
+        'Tipo': rng.choice(TIPOS, n),
+        'Capa_desc': rng.choice(CAPAS, n),
+    })
+
+
+def generate_portfolio(n, seed=0, **kwargs):
+    """Roadmap sintético ya normalizado y puntuado (mismas columnas que load_data)."""
+    return _prepare(generate_roadmap(n, seed, **kwargs))
+
+
+def write_workbook(raw, path, sheet=SHEET):
+    """Guarda la hoja cruda como Excel para medir la carga real."""
+    raw.to_excel(path, sheet_name=sheet, index=False)
+    return path
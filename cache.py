@@ -0,0 +1,128 @@
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def fingerprint(name, df, columns, *params):
+    """
+    HUELLA DE CONTENIDO (CLAVE DE CACHÉ)
+    ------------------------------------
+    Hash rápido de las columnas relevantes de `df` (más su índice) y de los
+    parámetros de la llamada. Dos llamadas con los mismos datos dan la misma
+    clave aunque vengan de DataFrames distintos (o de una `Portfolio`).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(name.encode())
+
+    if hasattr(df, 'content_digest'):
+        # Portfolio: el hash por filas ya está calculado (y es el mismo que el del DataFrame)
+        cols, data = df.content_digest(columns)
+    else:
+        cols = [c for c in columns if c in df.columns]
+        data = pd.util.hash_pandas_object(df[cols], index=True).to_numpy().tobytes()
+    h.update(repr((cols, len(df))).encode())
+    h.update(data)
+
+    for p in params:
+        # 300 y 300.0 son el mismo parámetro
+        if isinstance(p, (int, float, np.integer, np.floating)) and not isinstance(p, bool):
+            p = float(p)
+        h.update(repr(p).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    CACHÉ LRU DE RESULTADOS DEL MOTOR
+    ---------------------------------
+    Memoria acotada a `maxsize` entradas (se expulsa la menos usada) y,
+    opcionalmente, copia en disco (`disk_dir`) para sobrevivir a reinicios.
+    """
+
+    def __init__(self, maxsize=128, disk_dir=None):
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """Devuelve el valor cacheado o None (cuenta acierto/fallo)."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+
+        if self.disk_dir and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), 'rb') as f:
+                    value = pickle.load(f)
+            except Exception:
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                self._remember(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            # Escritura atómica: nunca dejamos un pickle a medias
+            tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.disk_hits = 0
+        if disk and self.disk_dir and os.path.isdir(self.disk_dir):
+            for fname in os.listdir(self.disk_dir):
+                if fname.endswith('.pkl'):
+                    os.remove(os.path.join(self.disk_dir, fname))
+
+    def stats(self):
+        """Contadores visibles: aciertos, fallos, aciertos en disco y tamaño."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
+
+
+# Caché compartida por todo el motor. SPO_CACHE_DIR activa la persistencia en disco.
+RESULT_CACHE = ResultCache(
+    maxsize=int(os.environ.get('SPO_CACHE_SIZE', 128)),
+    disk_dir=os.environ.get('SPO_CACHE_DIR') or None,
+)
@@ -1,79 +1,434 @@
-import pandas as pd
-import numpy as np
-import streamlit as st
-
-@st.cache_data
-def load_data(file_path, sheet_target):
-    try:
-        # 1. Lectura directa
-        df = pd.read_excel(file_path, sheet_name=sheet_target)
-
-        # 2. Normalización de Nombres (Limpieza básica)
-        df.columns = df.columns.str.strip().str.capitalize() 
-        
-        # Mapeo de seguridad para variantes de nombres comunes
-        rename_map = {
-            'Pre-req': 'Pre_req', 'Dependencia': 'Pre_req',
-            'Prob': 'Probabilidad', 'Riesgo': 'Probabilidad',
-            'Coste €': 'Coste', 'Score final': 'Score',
-            'Capa_score': 'Capa_score', 'Empleabilidad': 'Empleabilidad', 'Facilidad': 'Facilidad'
-        }
-        df = df.rename(columns=rename_map)
-
-        # 3. Lógica de "Auto-Cálculo" del Score (EL FIX)
-        # Si el Excel no trae 'Score' calculado, lo calculamos nosotros con los ingredientes.
-        if 'Score' not in df.columns:
-            # Verificamos si tenemos los ingredientes necesarios
-            ingredientes = ['Empleabilidad', 'Capa_score', 'Facilidad']
-            if all(col in df.columns for col in ingredientes):
-                # Fórmula: 40% Empleabilidad + 40% Capa + 20% Facilidad
-                df['Score'] = (df['Empleabilidad'] * 0.4) + \
-                              (df['Capa_score'] * 0.4) + \
-                              (df['Facilidad'] * 0.2)
-            else:
-                # Si no hay Score ni ingredientes, fallará en la validación siguiente
-                pass
-
-        # 4. Validación de Columnas Mínimas
-        # Ahora 'Score' ya debería existir (o venir del Excel o calculado arriba)
-        required_cols = ['Id', 'Actividad', 'Coste', 'Horas', 'Score', 'Pre_req', 'Probabilidad']
-        missing = [c for c in required_cols if c not in df.columns]
-        
-        if missing:
-            st.error(f"Faltan columnas clave en el Excel: {missing}")
-            return pd.DataFrame(), pd.DataFrame()
-
-        # 5. Limpieza de Datos
-        df = df.dropna(subset=['Actividad'])
-        
-        cols_numeric = ['Id', 'Coste', 'Horas', 'Score', 'Pre_req', 'Probabilidad']
-        for col in cols_numeric:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-        # 6. Lógica de Negocio Avanzada (Leader Risk & Time-First)
-        
-        # A. Normalizar probabilidad (0-1) si viene en formato 0-100
-        if df['Probabilidad'].max() > 1.5:
-            df['Probabilidad'] = df['Probabilidad'] / 100.0
-
-        # B. === LEADER RISK MITIGATION ===
-        # Guardamos original para auditoría
-        df['Probabilidad_Original'] = df['Probabilidad']
-        # Fórmula: Prob_Adj = 1 - (Riesgo / 2) -> Seniority reduce el riesgo a la mitad
-        df['Probabilidad'] = 1 - ((1 - df['Probabilidad_Original']) / 2)
-
-        # C. Calcular Score Real (Valor ajustado al riesgo)
-        df['Score_Real'] = df['Score'] * df['Probabilidad']
-        
-        # D. === EFICIENCIA BASADA EN TIEMPO (ROI por Hora) ===
-        # Evitamos división por cero poniendo un valor muy alto (9999) si horas es 0
-        df['Eficiencia'] = np.where(df['Horas'] <= 0, 9999, df['Score_Real'] / df['Horas'])
-
-        # Renombrar ID para consistencia interna del engine
-        df = df.rename(columns={'Id': 'ID'})
-
-        return df, df.copy()
-
-    except Exception as e:
-        st.error(f"Error técnico leyendo el Excel: {e}")
-        return pd.DataFrame(), pd.DataFrame()
\ No newline at end of file
+import os
+import json
+import hashlib
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+import instrumentation
+from instrumentation import stage
+from portfolio import Portfolio, as_portfolio
+
+logger = logging.getLogger(__name__)
+
+# Mapeo de seguridad para variantes de nombres comunes
+RENAME_MAP = {
+    'Pre-req': 'Pre_req', 'Dependencia': 'Pre_req',
+    'Prob': 'Probabilidad', 'Riesgo': 'Probabilidad',
+    'Coste €': 'Coste', 'Score final': 'Score',
+    'Capa_score': 'Capa_score', 'Empleabilidad': 'Empleabilidad', 'Facilidad': 'Facilidad'
+}
+REQUIRED_COLS = ['Id', 'Actividad', 'Coste', 'Horas', 'Score', 'Pre_req', 'Probabilidad']
+# Fórmula del Score cuando la hoja no lo trae: 40% Empleabilidad + 40% Capa + 20% Facilidad
+SCORE_WEIGHTS = {'Empleabilidad': 0.4, 'Capa_score': 0.4, 'Facilidad': 0.2}
+SCORE_INGREDIENTS = list(SCORE_WEIGHTS)
+# Columnas que leemos del Excel (el resto de la hoja ni se parsea)
+USED_COLS = set(REQUIRED_COLS + SCORE_INGREDIENTS + ['Tipo', 'Capa_id', 'Capa_desc'])
+
+# Sube este número si cambia el pipeline de scoring: invalida las cachés en disco
+CACHE_VERSION = 2
+
+
+def _normalize_name(col):
+    return RENAME_MAP.get(str(col).strip().capitalize(), str(col).strip().capitalize())
+
+
+def _normalize_columns(df):
+    # 2. Normalización de Nombres (Limpieza básica)
+    df.columns = df.columns.str.strip().str.capitalize()
+    return df.set_axis([RENAME_MAP.get(c, c) for c in df.columns], axis=1)
+
+
+def _missing_columns(columns):
+    """Columnas clave que faltan (Score no falta si se puede auto-calcular)."""
+    can_score = all(col in columns for col in SCORE_INGREDIENTS)
+    return [c for c in REQUIRED_COLS if c not in columns and not (c == 'Score' and can_score)]
+
+
+def _prepare(df):
+    """Pipeline de normalización y scoring. Lanza ValueError si faltan columnas."""
+    prepared, _ = _prepare_many({0: df})
+    return prepared[0]
+
+
+def _prepare_many(raw, strict=True):
+    """
+    PIPELINE DE SCORING VECTORIZADO (VARIAS HOJAS A LA VEZ)
+    -------------------------------------------------------
+    `raw` es {clave: hoja cruda}. Las hojas se apilan en un único DataFrame y
+    cada paso del pipeline corre una sola vez sobre todas las filas; lo que
+    depende de la hoja (Score ausente, probabilidad en 0-100) se decide por
+    hoja con groupby. Devuelve ({clave: hoja puntuada}, {clave: motivo}) con
+    el mismo resultado que puntuar cada hoja por separado. Con strict=True una
+    hoja sin las columnas clave lanza ValueError; si no, va a los descartes.
+    """
+    frames, dtypes, skipped = {}, {}, {}
+    for key, df in raw.items():
+        df = _normalize_columns(df)
+        missing = _missing_columns(df.columns)
+        if missing:
+            # 4. Validación de Columnas Mínimas
+            msg = f"Faltan columnas clave en el Excel: {missing}"
+            if strict:
+                raise ValueError(msg)
+            skipped[key] = msg
+            continue
+        frames[key] = df
+        dtypes[key] = df.dtypes
+    if not frames:
+        return {}, skipped
+
+    keys = list(frames)
+    df = pd.concat([frames[k] for k in keys], keys=range(len(keys)), names=['_hoja', None])
+    sheet = df.index.get_level_values(0)
+
+    # 3. Lógica de "Auto-Cálculo" del Score (EL FIX)
+    # Si la hoja no trae 'Score' calculado, lo calculamos nosotros con los ingredientes.
+    auto = np.isin(sheet, [i for i, k in enumerate(keys) if 'Score' not in frames[k].columns])
+    if auto.any():
+        # Fórmula: 40% Empleabilidad + 40% Capa + 20% Facilidad (SCORE_WEIGHTS)
+        formula = sum(df[col] * weight for col, weight in SCORE_WEIGHTS.items())
+        df['Score'] = formula.where(auto, df['Score'] if 'Score' in df.columns else np.nan)
+
+    # 5. Limpieza de Datos
+    df = df.dropna(subset=['Actividad'])
+
+    cols_numeric = ['Id', 'Coste', 'Horas', 'Score', 'Pre_req', 'Probabilidad']
+    source = df[cols_numeric]
+    for col in cols_numeric:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    # 6. Lógica de Negocio Avanzada (Leader Risk & Time-First)
+
+    # A. Normalizar probabilidad (0-1) si viene en formato 0-100 (decisión por hoja)
+    percent = df['Probabilidad'].groupby(level=0).transform('max') > 1.5
+    rescaled = set(df.index.get_level_values(0)[percent.to_numpy()])
+    df['Probabilidad'] = df['Probabilidad'].where(~percent, df['Probabilidad'] / 100.0)
+
+    # B. === LEADER RISK MITIGATION ===
+    # Guardamos original para auditoría
+    df['Probabilidad_Original'] = df['Probabilidad']
+    # Fórmula: Prob_Adj = 1 - (Riesgo / 2) -> Seniority reduce el riesgo a la mitad
+    df['Probabilidad'] = 1 - ((1 - df['Probabilidad_Original']) / 2)
+
+    # C. Calcular Score Real (Valor ajustado al riesgo)
+    df['Score_Real'] = df['Score'] * df['Probabilidad']
+
+    # D. === EFICIENCIA BASADA EN TIEMPO (ROI por Hora) ===
+    # Evitamos división por cero poniendo un valor muy alto (9999) si horas es 0
+    df['Eficiencia'] = np.where(df['Horas'] <= 0, 9999, df['Score_Real'] / df['Horas'])
+
+    # Separar por hoja: solo sus columnas, con sus tipos originales (el apilado rellena con NaN)
+    added = ['Score', 'Probabilidad_Original', 'Score_Real', 'Eficiencia']
+    derived = cols_numeric + added  # tipos que fija el pipeline
+    prepared = {}
+    parts = dict(iter(df.groupby(level=0, sort=False)))
+    for i, key in enumerate(keys):
+        original = dtypes[key]
+        cols = list(dict.fromkeys(list(original.index) + added))
+        part = parts[i][cols] if i in parts else df.iloc[:0][cols]
+        # Las numéricas recuperan el tipo que tendrían al puntuar la hoja sola: enteras si la hoja
+        # las traía enteras; si venían como texto (raro), se infiere solo para esa columna y hoja
+        restore = {c: original[c] for c in cols if c not in derived}
+        for c in cols_numeric:
+            # La probabilidad se recalcula siempre; su tipo sobrevive en la original si no se reescaló
+            target = 'Probabilidad_Original' if c == 'Probabilidad' else c
+            kind = original[c].kind if c in original.index else 'f'
+            if c == 'Probabilidad' and i in rescaled:
+                continue
+            if kind in 'iu':
+                restore[target] = np.int64
+            elif kind != 'f':
+                restore[target] = pd.to_numeric(source[c].loc[i] if i in parts else source[c].iloc[:0],
+                                                errors='coerce').dtype
+        part = part.droplevel(0).astype({c: t for c, t in restore.items() if part[c].dtype != t})
+        # Renombrar ID para consistencia interna del engine
+        prepared[key] = part.set_axis(['ID' if c == 'Id' else c for c in cols], axis=1)
+    return prepared, skipped
+
+
+def file_signature(file_path):
+    """Firma barata del fichero: (tamaño, mtime en ns)."""
+    st_ = os.stat(file_path)
+    return st_.st_size, st_.st_mtime_ns
+
+
+def _content_hash(file_path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_paths(file_path, sheet_target, cache_dir=None):
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(file_path)), '.spo_cache')
+    stem = f"{os.path.basename(file_path)}.{sheet_target}"
+    return os.path.join(cache_dir, f"{stem}.parquet"), os.path.join(cache_dir, f"{stem}.json")
+
+
+def _write_columnar(df, path):
+    """Parquet si hay pyarrow; si no, pickle (mismo contrato, algo más lento)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        # Con índice: tras el dropna puede tener huecos (0, 1, 3...) y la carga en frío los conserva
+        df.to_parquet(tmp)
+    except ImportError:
+        df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def _read_columnar(path):
+    try:
+        return pd.read_parquet(path)
+    except ImportError:
+        return pd.read_pickle(path)
+
+
+def load_scored_sheet(file_path, sheet_target, cache_dir=None):
+    """
+    CARGA CON CACHÉ COLUMNAR EN DISCO
+    ---------------------------------
+    Devuelve la hoja ya normalizada y puntuada. La primera vez parsea el Excel
+    (solo las columnas que usamos) y guarda el resultado en Parquet junto a
+    su firma (tamaño, mtime y hash de contenido). Si el Excel cambia, se
+    reconstruye; si solo cambia el mtime (mismo contenido), se reutiliza.
+    """
+    data_path, meta_path = _cache_paths(file_path, sheet_target, cache_dir)
+    reason, meta = _check_cache(file_path, meta_path, [data_path])
+    if reason is not None:
+        return _cached_sheet(data_path, reason)
+
+    # 1. Lectura (solo columnas necesarias) + pipeline de scoring
+    logger.info("Reconstruyendo caché columnar de %s [%s]", file_path, sheet_target)
+    instrumentation.count('cache.load_data.miss')
+    with stage('load.read_excel'):
+        raw = pd.read_excel(file_path, sheet_name=sheet_target, usecols=lambda c: _normalize_name(c) in USED_COLS)
+    with stage('load.prepare'):
+        df = _prepare(raw)
+
+    with stage('load.cache_write'):
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        _write_columnar(df, data_path)
+        _write_meta(meta_path, meta)
+    instrumentation.record('load', file=os.path.basename(file_path), sheet=sheet_target, rows=len(df), source='excel')
+    return df
+
+
+def _check_cache(file_path, meta_path, data_paths):
+    """
+    ¿Sirve la caché columnar de este Excel? Devuelve (motivo, meta): motivo es
+    'signature' o 'content_hash' si sirve, None si hay que reconstruir; meta es
+    la firma actual (lista para guardar tras reconstruir) o la guardada.
+    """
+    size, mtime = file_signature(file_path)
+
+    meta = None
+    if os.path.exists(meta_path) and all(os.path.exists(p) for p in data_paths):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION:
+            meta = None
+
+    if meta is not None:
+        # Camino rápido: misma firma -> mismos datos, sin leer el Excel
+        if meta['size'] == size and meta['mtime_ns'] == mtime:
+            return 'signature', meta
+        # Firma distinta: solo el hash de contenido decide si hay que reconstruir
+        with stage('load.content_hash'):
+            digest = _content_hash(file_path)
+        if digest == meta['hash']:
+            meta.update(size=size, mtime_ns=mtime)
+            _write_meta(meta_path, meta)
+            return 'content_hash', meta
+    else:
+        with stage('load.content_hash'):
+            digest = _content_hash(file_path)
+    return None, {'version': CACHE_VERSION, 'size': size, 'mtime_ns': mtime, 'hash': digest}
+
+
+def _cached_sheet(data_path, reason):
+    """Lee la hoja ya puntuada de la caché columnar (y lo cuenta como acierto)."""
+    instrumentation.count('cache.load_data.hit')
+    with stage('load.cache_read'):
+        df = _read_columnar(data_path)
+    instrumentation.record('load', file=os.path.basename(data_path), rows=len(df), source='cache', reason=reason)
+    return df
+
+
+def _write_meta(meta_path, meta):
+    tmp = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def load_data(file_path, sheet_target):
+    """
+    Núcleo sin Streamlit: devuelve (df, portfolio) o lanza la excepción
+    (fichero inexistente, columnas que faltan...). `portfolio` es la
+    `Portfolio` compacta de solo lectura que consume el motor (en vez de una
+    segunda copia del DataFrame). Los scripts batch lo usan tal cual.
+    """
+    df = load_scored_sheet(file_path, sheet_target)
+    return df, Portfolio.from_frame(df)
+
+
+# Clave de la caché del libro completo (lista de carteras y hojas descartadas)
+WORKBOOK_CACHE_KEY = '__libro__'
+
+
+def _read_raw_workbook(file_path):
+    """Todas las hojas del libro en una sola apertura (solo las columnas que usamos)."""
+    return pd.read_excel(file_path, sheet_name=None, usecols=lambda c: _normalize_name(c) in USED_COLS)
+
+
+def _cached_workbook(file_path, cache_dir=None):
+    """
+    ((hojas, descartes), meta) desde la caché; (None, meta nueva) si hay que
+    reconstruir el libro.
+    """
+    _, meta_path = _cache_paths(file_path, WORKBOOK_CACHE_KEY, cache_dir)
+    sheets = []
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            sheets = json.load(f).get('sheets', [])
+    data_paths = [_cache_paths(file_path, sheet, cache_dir)[0] for sheet in sheets]
+    reason, meta = _check_cache(file_path, meta_path, data_paths)
+    if reason is None:
+        return None, meta
+    instrumentation.count('cache.load_workbook.hit')
+    with stage('load.cache_read'):
+        frames = {sheet: _read_columnar(path) for sheet, path in zip(sheets, data_paths)}
+    return (frames, meta['skipped']), meta
+
+
+def _write_workbook_cache(file_path, frames, skipped, meta, cache_dir=None):
+    _, book_meta_path = _cache_paths(file_path, WORKBOOK_CACHE_KEY, cache_dir)
+    os.makedirs(os.path.dirname(book_meta_path), exist_ok=True)
+    # Cada hoja queda también en su caché individual: load_scored_sheet la reutiliza
+    for sheet, df in frames.items():
+        data_path, meta_path = _cache_paths(file_path, sheet, cache_dir)
+        _write_columnar(df, data_path)
+        _write_meta(meta_path, meta)
+    _write_meta(book_meta_path, dict(meta, sheets=list(frames), skipped=skipped))
+
+
+def load_workbooks(paths, workers=1, cache_dir=None, strict=False):
+    """
+    CARGA DE VARIOS LIBROS (TODAS LAS HOJAS)
+    ----------------------------------------
+    Abre cada libro una sola vez y lee todas sus hojas; las que tienen las
+    columnas clave son carteras y el resto (glosarios, paneles...) se
+    descarta. Todas las hojas nuevas de todos los libros pasan juntas por el
+    pipeline de scoring vectorizado. Con `workers` > 1 los libros se parsean
+    en un pool de procesos (openpyxl no suelta el GIL). Cada libro tiene su
+    caché columnar, igual que load_scored_sheet.
+    Devuelve un PortfolioRegistry con carteras 'libro/hoja' (cada una, una
+    `Portfolio` construida aquí una sola vez).
+    """
+    paths = list(paths)
+    loaded, skipped, metas, stale = {}, {}, {}, []
+    for path in paths:
+        cached, metas[path] = _cached_workbook(path, cache_dir)
+        if cached is None:
+            stale.append(path)
+            continue
+        frames, dropped = cached
+        loaded.update({(path, sheet): df for sheet, df in frames.items()})
+        skipped.update({(path, sheet): msg for sheet, msg in dropped.items()})
+
+    if stale:
+        instrumentation.count('cache.load_workbook.miss', len(stale))
+        logger.info("Leyendo %d libro(s) completos: %s", len(stale), stale)
+        with stage('load.read_workbook'):
+            if workers > 1 and len(stale) > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    books = list(pool.map(_read_raw_workbook, stale))
+            else:
+                books = [_read_raw_workbook(path) for path in stale]
+        raw = {(path, sheet): df for path, book in zip(stale, books) for sheet, df in book.items()}
+        with stage('load.prepare'):
+            fresh, dropped = _prepare_many(raw, strict=strict)
+        with stage('load.cache_write'):
+            for path, book in zip(stale, books):
+                frames = {sheet: fresh[(path, sheet)] for sheet in book if (path, sheet) in fresh}
+                _write_workbook_cache(path, frames, {s: m for (p, s), m in dropped.items() if p == path},
+                                      metas[path], cache_dir)
+        loaded.update(fresh)
+        skipped.update(dropped)
+
+    for (path, sheet), df in loaded.items():
+        instrumentation.record('load', file=os.path.basename(path), sheet=sheet, rows=len(df),
+                               source='excel' if path in stale else 'cache')
+
+    def label(path, sheet):
+        return f"{os.path.splitext(os.path.basename(path))[0]}/{sheet}"
+
+    # Orden de los libros y, dentro de cada libro, orden de sus hojas
+    order = {path: i for i, path in enumerate(paths)}
+    keys = sorted(loaded, key=lambda k: order[k[0]])
+    return PortfolioRegistry({label(*k): loaded[k] for k in keys},
+                             {label(*k): msg for k, msg in skipped.items()})
+
+
+def load_workbook(file_path, sheets=None, cache_dir=None):
+    """
+    Todas las carteras de un libro (nombradas por su hoja). Con `sheets` solo
+    esas, y si alguna no existe o no es una cartera se lanza ValueError.
+    """
+    reg = load_workbooks([file_path], cache_dir=cache_dir)
+    prefix = f"{os.path.splitext(os.path.basename(file_path))[0]}/"
+    portfolios = {name[len(prefix):]: df for name, df in reg.items()}
+    skipped = {name[len(prefix):]: msg for name, msg in reg.skipped.items()}
+    if sheets is not None:
+        for sheet in sheets:
+            if sheet not in portfolios:
+                raise ValueError(skipped.get(sheet, f"La hoja '{sheet}' no existe en {file_path}"))
+        portfolios = {sheet: portfolios[sheet] for sheet in sheets}
+    return PortfolioRegistry(portfolios, skipped)
+
+
+class PortfolioRegistry:
+    """
+    REGISTRO DE CARTERAS
+    --------------------
+    Carteras ya puntuadas por nombre (una por equipo: hojas o libros
+    distintos), listas para optimizarse lado a lado
+    (`engine.optimize_portfolios` / `engine.compare_portfolios`). Se guardan como
+    `Portfolio` (los DataFrames se convierten al registrarlos), así que el
+    motor las consume sin reconstruir sus arrays; `registry[nombre].frame` es
+    la hoja. `skipped` guarda las hojas leídas que no son carteras y el motivo.
+    """
+
+    def __init__(self, portfolios, skipped=None):
+        self._portfolios = {name: as_portfolio(p) for name, p in portfolios.items()}
+        self.skipped = dict(skipped or {})
+
+    @property
+    def names(self):
+        return list(self._portfolios)
+
+    def __getitem__(self, name):
+        return self._portfolios[name]
+
+    def __contains__(self, name):
+        return name in self._portfolios
+
+    def __iter__(self):
+        return iter(self._portfolios)
+
+    def __len__(self):
+        return len(self._portfolios)
+
+    def items(self):
+        return self._portfolios.items()
+
+    def frame(self):
+        """Todas las carteras apiladas con una columna 'Cartera'."""
+        if not self._portfolios:
+            return pd.DataFrame(columns=['Cartera'])
+        return pd.concat([p.frame.assign(Cartera=name) for name, p in self.items()], ignore_index=True)
@@ -1,178 +1,2161 @@
-import pulp
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-import heapq
-
-def run_optimization(df, hours, budget=None):
-    """
-    MOTOR DE OPTIMIZACIÓN (KNAPSACK PROBLEM)
-    ----------------------------------------
-    Selecciona el mejor conjunto de actividades que caben en el tiempo disponible.
-    """
-    # 1. Crear el problema de maximización
-    prob = pulp.LpProblem("Opt", pulp.LpMaximize)
-    rows = df.index.tolist()
-    
-    # 2. Variables de decisión (Binarias: 1 = Hago la tarea, 0 = No la hago)
-    x = pulp.LpVariable.dicts("Sel", rows, cat='Binary')
-    
-    # 3. Función Objetivo: Maximizar la suma de 'Score_Real'
-    prob += pulp.lpSum([df.loc[i, 'Score_Real'] * x[i] for i in rows])
-    
-    # 4. Restricciones
-    
-    # A. Restricción de TIEMPO (Obligatoria: Tu cuello de botella)
-    prob += pulp.lpSum([df.loc[i, 'Horas'] * x[i] for i in rows]) <= hours
-    
-    # B. Restricción de PRESUPUESTO (Opcional: Solo si activaste el checkbox)
-    if budget is not None:
-        prob += pulp.lpSum([df.loc[i, 'Coste'] * x[i] for i in rows]) <= budget
-    
-    # C. Restricción de DEPENDENCIAS (Integridad Referencial)
-    # Si la tarea 'Hijo' se selecciona (x=1), la tarea 'Padre' DEBE seleccionarse (x=1).
-    # Matemáticamente: x[hijo] <= x[padre]
-    if 'ID' in df.columns and 'Pre_req' in df.columns:
-        id_map = dict(zip(df['ID'], df.index))
-        for i in rows:
-            pre_id = df.loc[i, 'Pre_req']
-            # Solo si tiene un prerrequisito válido que existe en el Excel
-            if pre_id > 0 and pre_id in id_map:
-                padre_idx = id_map[pre_id]
-                prob += x[i] <= x[padre_idx]
-
-    # 5. Resolver
-    prob.solve(pulp.PULP_CBC_CMD(msg=0))
-    
-    # 6. Devolver resultado
-    selected_indices = [i for i in rows if x[i].varValue == 1]
-    return df.loc[selected_indices].copy()
-
-
-def calculate_sequential_gantt(df_opt, weekly_hours):
-    """
-    MOTOR DE CALENDARIZACIÓN (TOPOLOGICAL SORT + HEAP)
-    --------------------------------------------------
-    Ordena las tareas óptimas en una línea de tiempo realista.
-    Usa 'Score Heredado' para priorizar desbloqueadores.
-    """
-    if df_opt.empty: return pd.DataFrame()
-    
-    # 1. Mapeo de Grafos (Relaciones Padre-Hijo)
-    task_map = df_opt.set_index('ID').to_dict('index')
-    children_map = {i: [] for i in df_opt['ID']} # Quién depende de mí
-    in_degree = {i: 0 for i in df_opt['ID']}     # De cuántos dependo yo
-    
-    for pid, row in task_map.items():
-        pre = row['Pre_req']
-        if pre > 0 and pre in task_map:
-            children_map[pre].append(pid)
-            in_degree[pid] += 1
-
-    # 2. Cálculo de "Score Heredado" (Back-Propagation)
-    # Una tarea pequeña necesaria para una grande hereda la importancia de la grande.
-    memo_effective_score = {}
-
-    def get_effective_score(task_id):
-        if task_id in memo_effective_score: return memo_effective_score[task_id]
-        
-        my_score = task_map[task_id]['Score_Real']
-        # Miro el potencial de mis hijos recursivamente
-        max_child_potential = 0
-        if children_map[task_id]:
-            max_child_potential = max([get_effective_score(child) for child in children_map[task_id]])
-        
-        # Valgo lo que valgo yo, O lo que vale mi hijo más importante (el mayor de los dos)
-        effective_score = max(my_score, max_child_potential)
-        memo_effective_score[task_id] = effective_score
-        return effective_score
-
-    # Pre-calentamos el score para todas las tareas
-    for pid in task_map: get_effective_score(pid)
-
-    # 3. Cola de Prioridad (Heap)
-    # Metemos las tareas que NO tienen dependencias pendientes (in_degree 0)
-    queue = []
-    for pid, count in in_degree.items():
-        if count == 0:
-            # Usamos negativo porque python heapq es min-heap (queremos sacar el score más alto)
-            heapq.heappush(queue, (-memo_effective_score[pid], pid))
-            
-    # 4. Bucle Principal de Asignación
-    tasks = []
-    end_dates_map = {} 
-    # Fecha de inicio: Primer lunes laboral de 2026
-    resource_free_date = datetime(2026, 1, 5) 
-    
-    while queue:
-        # Sacamos la mejor tarea disponible
-        _, pid = heapq.heappop(queue)
-        row = task_map[pid]
-        
-        # Calculamos cuándo puede empezar
-        pre = row['Pre_req']
-        earliest_start_by_dep = datetime(2026, 1, 5)
-        
-        # A. Restricción de Dependencia: No antes de que acabe el padre
-        if pre > 0 and pre in end_dates_map:
-            earliest_start_by_dep = end_dates_map[pre] + timedelta(days=1)
-            
-        # B. Restricción de Recurso: No antes de que TÚ estés libre
-        actual_start = max(earliest_start_by_dep, resource_free_date)
-        
-        # Calculamos duración (semanas -> días)
-        duration = max(1, int((row['Horas'] / max(1, weekly_hours)) * 7))
-        end_date = actual_start + timedelta(days=duration)
-        
-        # Actualizamos estado del sistema
-        end_dates_map[pid] = end_date
-        resource_free_date = end_date 
-        
-        # Guardamos la tarea
-        tasks.append({
-            'Tarea': row['Actividad'], 
-            'Inicio': actual_start, 
-            'Fin': end_date, 
-            'Tipo': row.get('Tipo', 'General'), 
-            'ID': pid, 
-            'Pre_req': pre,
-            'Capa_desc': row.get('Capa_desc', 'General')
-        })
-        
-        # 5. Desbloqueo de Hijos
-        # Ahora que he terminado esta tarea, aviso a mis hijos
-        for child_id in children_map[pid]:
-            in_degree[child_id] -= 1
-            # Si un hijo ya no tiene dependencias pendientes, entra a la cola
-            if in_degree[child_id] == 0:
-                heapq.heappush(queue, (-memo_effective_score[child_id], child_id))
-                
-    return pd.DataFrame(tasks)
-
-
-def run_monte_carlo(df_plan, iterations=500):
-    """
-    SIMULACIÓN DE RIESGO (MONTE CARLO)
-    ----------------------------------
-    Evalúa qué tan probable es cumplir el plan.
-    """
-    res = []
-    # Usamos Score_Real (que ya tiene el ajuste de riesgo de Líder)
-    val_col = 'Score_Real' 
-    
-    for _ in range(iterations):
-        # 1. Incertidumbre de Tiempo (Ley de Hofstadter: siempre tardas más)
-        # Multiplicador aleatorio entre 0.9 (90% del tiempo est.) y 1.5 (150%)
-        t_factor = np.random.uniform(0.9, 1.5, size=len(df_plan))
-        real_h = (df_plan['Horas'] * t_factor).sum()
-        
-        # 2. Incertidumbre de Éxito (Bernoulli)
-        # Tiramos el dado basado en la Probabilidad de la tarea
-        success = np.random.random(size=len(df_plan)) < df_plan['Probabilidad'].values
-        
-        # Si éxito=True sumamos valor, si no, 0.
-        real_v = np.where(success, df_plan[val_col], 0).sum()
-        
-        res.append({'Horas': real_h, 'Valor': real_v})
-        
-    return pd.DataFrame(res)
\ No newline at end of file
+import os
+import re
+import copy
+import time
+import tempfile
+import pulp
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import heapq
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from statistics import NormalDist
+
+from cache import RESULT_CACHE, fingerprint
+from portfolio import Portfolio, as_portfolio
+import instrumentation
+from instrumentation import stage
+
+
+def _take(df, positions):
+    """Filas elegidas: copia del DataFrame o, con una `Portfolio`, su sub-cartera."""
+    return df.take(positions) if isinstance(df, Portfolio) else df.iloc[positions].copy()
+
+
+def _ids(df):
+    """ID de cada actividad (el índice si el DataFrame no trae la columna)."""
+    if isinstance(df, Portfolio):
+        return df.ids
+    return df['ID'].to_numpy() if 'ID' in df.columns else df.index.to_numpy()
+
+
+def _forest_preorder(parent):
+    """
+    Recorre el bosque de dependencias en preorden (DFS iterativo).
+    Devuelve (order, end): order[k] es la tarea en la posición k y end[k] la
+    primera posición después de su subárbol. Las tareas atrapadas en ciclos de
+    Pre_req nunca se alcanzan desde una raíz y lanzan ValueError.
+    """
+    n = len(parent)
+    children = [[] for _ in range(n)]
+    for child in np.flatnonzero(parent >= 0):
+        children[parent[child]].append(child)
+
+    order = []
+    stack = list(np.flatnonzero(parent < 0)[::-1])
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(reversed(children[node]))
+
+    if len(order) < n:
+        raise ValueError("Pre_req contiene ciclos: las dependencias no forman un bosque")
+
+    order = np.array(order, dtype=np.int64)
+    size = np.ones(n, dtype=np.int64)
+    for node in order[::-1]:
+        if parent[node] >= 0:
+            size[parent[node]] += size[node]
+
+    pos = np.empty(n, dtype=np.int64)
+    pos[order] = np.arange(n)
+    end = pos[order] + size[order]
+    return order, end
+
+
+def _integral_weights(values):
+    """Redondea hacia arriba a enteros (sin perder factibilidad)."""
+    return np.ceil(np.asarray(values, dtype=float) - 1e-9).astype(np.int64)
+
+
+def _objective_units(score):
+    """
+    Objetivo entero y desempate determinista compartidos por todos los backends.
+    El valor se expresa en micro-puntos (sumas exactas) y, ante carteras de
+    igual valor, gana la que usa menos filas y más arriba en el Excel.
+    """
+    value = np.round(np.asarray(score, dtype=float) * 1e6).astype(np.int64)
+    tiebreak = -np.arange(1, len(value) + 1, dtype=np.int64)
+    return value, tiebreak
+
+
+def _knapsack_dp(value, tiebreak, w_h, order, end, max_h, w_c=None, max_c=None):
+    """
+    KNAPSACK SOBRE BOSQUE DE DEPENDENCIAS (PROGRAMACIÓN DINÁMICA)
+    -------------------------------------------------------------
+    Recorre el preorden de atrás hacia delante. En la posición k solo hay dos
+    opciones: coger la tarea (y seguir con su subárbol) o saltarse la tarea y
+    todo su subárbol. dp[k][c] = mejor (valor, desempate) desde k con capacidad c.
+    Con presupuesto la capacidad es una rejilla 2D (horas x coste).
+    Devuelve la matriz `take` (n x capacidades) para reconstruir la selección
+    y la tabla de valor óptimo (en micro-puntos) para cada capacidad.
+    """
+    n = len(order)
+    shape = (max_h + 1,) if w_c is None else (max_h + 1, max_c + 1)
+    take = np.zeros((n,) + shape, dtype=bool)
+
+    # Solo guardamos las filas del DP que aún se van a leer (memoria ~ profundidad)
+    pending = np.bincount(end, minlength=n + 1) + np.r_[0, np.ones(n, dtype=np.int64)]
+    zeros = np.zeros(shape, dtype=np.int64)
+    rows = {n: (zeros, zeros)}
+
+    for k in range(n - 1, -1, -1):
+        if k % 64 == 0:
+            instrumentation.progress(n - k, n)  # también punto de cancelación de trabajos
+        i = order[k]
+        best_v, best_t = (a.copy() for a in rows[end[k]])
+        nxt_v, nxt_t = rows[k + 1]
+
+        wh = w_h[i]
+        wc = 0 if w_c is None else w_c[i]
+        if wh <= max_h and (w_c is None or wc <= max_c):
+            if w_c is None:
+                src = (slice(0, max_h + 1 - wh),)
+                region = (slice(wh, None),)
+            else:
+                src = (slice(0, max_h + 1 - wh), slice(0, max_c + 1 - wc))
+                region = (slice(wh, None), slice(wc, None))
+            cand_v = nxt_v[src] + value[i]
+            cand_t = nxt_t[src] + tiebreak[i]
+            old_v, old_t = best_v[region], best_t[region]
+            better = (cand_v > old_v) | ((cand_v == old_v) & (cand_t > old_t))
+            best_v[region] = np.where(better, cand_v, old_v)
+            best_t[region] = np.where(better, cand_t, old_t)
+            take[k][region] = better
+
+        for r in (k + 1, end[k]):
+            pending[r] -= 1
+            if pending[r] == 0:
+                del rows[r]
+        rows[k] = (best_v, best_t)
+
+    return take, rows[0][0]
+
+
+def _trace_selection(take, order, end, w_h, cap_h, w_c=None, cap_c=None):
+    """
+    Reconstruye la selección óptima para muchas capacidades a la vez.
+    Cada capacidad es un 'carril'; todos avanzan juntos por el preorden.
+    Devuelve una matriz booleana (n_tareas x n_carriles).
+    """
+    n = len(order)
+    rem_h = np.array(cap_h, dtype=np.int64)
+    rem_c = None if w_c is None else np.array(cap_c, dtype=np.int64)
+    lanes = np.arange(len(rem_h))
+    nxt = np.zeros(len(rem_h), dtype=np.int64)
+    selection = np.zeros((n, len(rem_h)), dtype=bool)
+
+    for k in range(n):
+        here = lanes[nxt == k]
+        if here.size == 0:
+            continue
+        if w_c is None:
+            took = take[k, rem_h[here]]
+        else:
+            took = take[k, rem_h[here], rem_c[here]]
+
+        i = order[k]
+        yes, no = here[took], here[~took]
+        selection[i, yes] = True
+        rem_h[yes] -= w_h[i]
+        if w_c is not None:
+            rem_c[yes] -= w_c[i]
+        nxt[yes] = k + 1
+        nxt[no] = end[k]
+
+    return selection
+
+
+# Tamaño máximo (tareas x celdas de capacidad) que resolvemos con el DP nativo
+MAX_NATIVE_CELLS = 50_000_000
+# La tabla guardada del DP cubre hasta este múltiplo de la capacidad pedida
+TABLE_HEADROOM = 2
+# "Menos infinito" en micro-puntos: sumarle valores nunca desborda int64
+NEG_UNITS = np.iinfo(np.int64).min // 4
+
+
+class PortfolioModel:
+    """
+    MODELO PERSISTENTE DE OPTIMIZACIÓN
+    ----------------------------------
+    Se construye una sola vez a partir de arrays NumPy (Score_Real, Horas,
+    Coste, índice del padre): los de la `Portfolio` tal cual, sin copiarlos.
+    El problema PuLP se crea la primera vez que hace falta CBC y, entre
+    resoluciones, solo cambian los lados derechos de las restricciones de
+    horas y presupuesto.
+    """
+
+    def __init__(self, df):
+        with stage('optimize.model'):
+            self._setup(df)
+
+    def _setup(self, df):
+        portfolio = as_portfolio(df)
+        self.score = portfolio.score
+        self.hours = portfolio.hours
+        self.cost = portfolio.cost
+        self.parent = portfolio.parent
+        self.value_units, self.tiebreak = _objective_units(self.score)
+
+        # Estructura de bosque para el backend nativo (None si hay ciclos)
+        try:
+            self.order, self.end = _forest_preorder(self.parent)
+        except ValueError:
+            self.order = self.end = None
+        self._reset_state()
+
+    def _reset_state(self):
+        self.prob = None
+        self.last_solver = None
+        # Estado incremental: última solución óptima y tablas del DP nativo
+        self.incumbent = None
+        self.last_mode = None
+        # Detalle del último solve (estado, nodos, iteraciones, gap...) para la instrumentación
+        self.last_info = {}
+        self._dp_tables = {}
+        self._lock = threading.Lock()
+
+    def rescored(self, score):
+        """
+        Copia del modelo con otro Score_Real (mismas horas, costes y bosque de
+        Pre_req, sin recalcularlos) y sin estado incremental ni MILP.
+        """
+        model = copy.copy(self)
+        model.score = np.asarray(score, dtype=float)
+        model.value_units, model.tiebreak = _objective_units(model.score)
+        model._reset_state()
+        return model
+
+    def _build_milp(self):
+        with stage('optimize.build_milp'):
+            self._formulate_milp()
+        instrumentation.record('model', backend='cbc', variables=len(self.x),
+                               constraints=len(self.prob.constraints),
+                               nonzeros=sum(len(c) for c in self.prob.constraints.values()))
+
+    def _formulate_milp(self):
+        # 1. Problema de maximización y variables binarias (1 = Hago la tarea)
+        n = len(self.score)
+        self.prob = pulp.LpProblem("Opt", pulp.LpMaximize)
+        self.x = [pulp.LpVariable(f"Sel_{k}", cat='Binary') for k in range(n)]
+
+        # 2. Función Objetivo: Maximizar la suma de 'Score_Real'
+        # Si la precisión de coma flotante lo permite, usamos el mismo objetivo
+        # entero con desempate que el DP para que ambos elijan la misma cartera.
+        scale = int(-self.tiebreak.sum()) + 1
+        if (int(np.abs(self.value_units).sum()) + 1) * scale < 2 ** 52:
+            coefs = (self.value_units * scale + self.tiebreak).astype(float)
+            self.objective_scale = scale
+        else:
+            coefs = self.score
+            self.objective_scale = None
+        self.prob += pulp.LpAffineExpression(zip(self.x, coefs))
+
+        # 3. Restricciones de TIEMPO y PRESUPUESTO (el RHS se fija en cada solve)
+        self.hours_constraint = pulp.LpConstraint(
+            pulp.LpAffineExpression(zip(self.x, self.hours)), pulp.LpConstraintLE, "Horas", 0)
+        self.budget_constraint = pulp.LpConstraint(
+            pulp.LpAffineExpression(zip(self.x, self.cost)), pulp.LpConstraintLE, "Presupuesto", 0)
+        self.prob += self.hours_constraint
+        self.prob += self.budget_constraint
+
+        # 4. Restricción de DEPENDENCIAS: x[hijo] <= x[padre]
+        for child in np.flatnonzero(self.parent >= 0):
+            self.prob += self.x[child] - self.x[self.parent[child]] <= 0, f"Dep_{child}"
+
+    def solve(self, hours, budget=None, solver='auto'):
+        """
+        Resuelve para (hours, budget) y devuelve las posiciones seleccionadas.
+        Es incremental: en modo 'auto', si la última solución óptima sigue
+        cabiendo y el problema solo se ha estrechado, se devuelve sin resolver.
+        `last_mode` indica cómo se obtuvo: 'incumbent', 'table', 'warm' o 'cold'.
+        """
+        if len(self.score) == 0:
+            return np.array([], dtype=np.int64)
+
+        with self._lock:
+            if solver == 'auto' and self._incumbent_still_optimal(hours, budget):
+                self.last_mode = 'incumbent'
+                self.incumbent['hours'], self.incumbent['budget'] = hours, budget
+                instrumentation.record('solver', backend=self.last_solver, mode='incumbent', status='Optimal',
+                                       hours=hours, budget=budget, selected=len(self.incumbent['selected']))
+                return self.incumbent['selected'].copy()
+
+            name = select_solver(self, hours, budget) if solver == 'auto' else solver
+            if name not in SOLVER_BACKENDS:
+                raise ValueError(f"Solver desconocido: {name}")
+
+            self.last_solver = name
+            self.last_info = {}
+            with stage(f'optimize.{name}'):
+                selected = SOLVER_BACKENDS[name][1](self, hours, budget)
+            instrumentation.record('solver', backend=name, mode=self.last_mode, hours=hours, budget=budget,
+                                   selected=len(selected), **self.last_info)
+            self.incumbent = {
+                'hours': hours, 'budget': budget, 'selected': selected,
+                'used_hours': self.hours[selected].sum(), 'used_cost': self.cost[selected].sum(),
+            }
+            return selected.copy()
+
+    def _incumbent_still_optimal(self, hours, budget):
+        """
+        Prueba barata de optimalidad: si las nuevas horas y presupuesto no
+        superan a los anteriores, el conjunto factible solo ha encogido; si la
+        solución anterior sigue cabiendo, sigue siendo la óptima.
+        """
+        inc = self.incumbent
+        if inc is None or not inc.get('optimal', True):
+            return False
+        old_budget = np.inf if inc['budget'] is None else inc['budget']
+        new_budget = np.inf if budget is None else budget
+        return (hours <= inc['hours'] and new_budget <= old_budget
+                and inc['used_hours'] <= hours + 1e-9 and inc['used_cost'] <= new_budget + 1e-9)
+
+    def greedy(self, hours, budget=None, deadline=None):
+        """
+        SOLUCIÓN VORAZ INMEDIATA
+        ------------------------
+        Cartera factible en milisegundos que respeta los Pre_req. Cada tarea
+        se valora con su cadena (ella más sus prerrequisitos): valor de la
+        cadena / horas de la cadena, que es la Eficiencia de la tarea más el
+        valor que hereda un prerrequisito de lo que desbloquea. Se recorren
+        de mejor a peor y se añade la cadena pendiente si aún cabe. Lo que
+        falta de cada cadena se lleva acumulado por posición del preorden (sin
+        recorrer ancestros por tarea); al pasar `deadline` (perf_counter, se mira
+        cada 64 tareas) se devuelve lo elegido hasta ahí, que ya es factible.
+        """
+        n = len(self.score)
+        if n == 0 or self.order is None:
+            return np.array([], dtype=np.int64)  # con ciclos, el conjunto vacío es la única apuesta segura
+        weights = np.vstack([self.score, self.hours, self.cost])
+        chain = weights.copy()
+        for i in self.order[self.parent[self.order] >= 0]:
+            chain[:, i] += chain[:, self.parent[i]]
+        chain_v, chain_h = chain[0], chain[1]
+        ratio = np.where(chain_h > 0, chain_v / np.maximum(chain_h, 1e-12), np.inf)
+        rank = np.lexsort((-self.score, -ratio))
+
+        # pending[:, k]: valor, horas y coste de la parte aún no elegida de la cadena de order[k]
+        pos = np.empty(n, dtype=np.int64)
+        pos[self.order] = np.arange(n)
+        pending = chain[:, self.order]
+        end = self.end
+
+        sel = np.zeros(n, dtype=bool)
+        rem_h = hours + 1e-9
+        rem_c = np.inf if budget is None else budget + 1e-9
+        parent = self.parent.tolist()
+        for step, i in enumerate(rank[chain_v[rank] > 0].tolist()):
+            if deadline is not None and step and step % 64 == 0 and time.perf_counter() > deadline:
+                break
+            if sel[i]:
+                continue
+            v, h, c = pending[:, pos[i]]
+            if h > rem_h or c > rem_c or v <= 0:
+                continue
+            path, j = [], i
+            while j >= 0 and not sel[j]:
+                path.append(j)
+                j = parent[j]
+            sel[path] = True
+            rem_h -= h
+            rem_c -= c
+            # Lo recién elegido deja de estar pendiente para todo su subárbol (un tramo del
+            # preorden). Los subárboles de una cadena están anidados: basta una suma acumulada
+            top = pos[path[-1]]
+            if len(path) == 1:
+                pending[:, top:end[top]] -= weights[:, i:i + 1]
+            else:
+                delta = np.zeros((3, end[top] - top + 1))
+                np.add.at(delta, (slice(None), pos[path] - top), weights[:, path])
+                np.add.at(delta, (slice(None), end[pos[path]] - top), -weights[:, path])
+                pending[:, top:end[top]] -= np.cumsum(delta[:, :-1], axis=1)
+        return np.flatnonzero(sel)
+
+    def upper_bound(self, hours, budget=None):
+        """
+        Cota superior de Dantzig: relajación lineal del knapsack sin Pre_req
+        (una tarea puede entrar a trozos). Ninguna cartera factible la supera;
+        con presupuesto vale la menor de las cotas por horas y por coste.
+        """
+        useful = self.score > 0
+        bound = _dantzig_bound(self.score[useful], self.hours[useful], hours)
+        if budget is not None:
+            bound = min(bound, _dantzig_bound(self.score[useful], self.cost[useful], budget))
+        return bound
+
+    def solve_anytime(self, hours, budget=None, solver='auto', time_limit=None, gap=None):
+        """
+        OPTIMIZACIÓN 'ANYTIME'
+        ----------------------
+        Devuelve (posiciones, info). Empieza con la solución voraz (milisegundos)
+        y su distancia a la cota de Dantzig; si no basta con `gap` (relativo),
+        intenta mejorarla con el backend elegido dentro de `time_limit`
+        segundos: el DP nativo se interrumpe al agotar el tiempo y CBC recibe
+        el límite, el gap y la voraz como arranque. `info` trae status
+        ('Optimal', 'Feasible' o 'Greedy'), value, bound y gap, así que cada
+        resultado dice cuánto puede estar del óptimo.
+        """
+        t0 = time.perf_counter()
+        target = 0.0 if gap is None else gap
+        if len(self.score) == 0:
+            return np.array([], dtype=np.int64), _solve_info('Optimal', 0.0, 0.0)
+
+        with self._lock:
+            if solver == 'auto' and self._incumbent_still_optimal(hours, budget):
+                selected = self.incumbent['selected'].copy()
+                value = self.score[selected].sum()
+                return selected, _solve_info('Optimal', value, value)
+
+            with stage('optimize.greedy'):
+                best = self.greedy(hours, budget, None if time_limit is None else t0 + time_limit)
+                bound = self.upper_bound(hours, budget)
+            value = self.score[best].sum()
+            status = 'Optimal' if _relative_gap(value, bound) <= 1e-9 else 'Greedy'
+
+            name = select_solver(self, hours, budget) if solver == 'auto' else solver
+            if name not in SOLVER_BACKENDS:
+                raise ValueError(f"Solver desconocido: {name}")
+            remaining = None if time_limit is None else time_limit - (time.perf_counter() - t0)
+            if _relative_gap(value, bound) > target and (remaining is None or remaining > 0):
+                self.last_solver = name
+                self.last_info = {}
+                try:
+                    with _deadline(None if remaining is None else t0 + time_limit), stage(f'optimize.{name}'):
+                        if name == 'cbc':
+                            selected = _solve_cbc(self, hours, budget, time_limit=remaining, gap=gap, start=best)
+                        else:
+                            selected = SOLVER_BACKENDS[name][1](self, hours, budget)
+                except _TimeLimitReached:
+                    self.last_info = {'status': 'Stopped on time'}
+                else:
+                    found = self.score[selected].sum()
+                    if self._feasible(selected, hours, budget) and found >= value - 1e-9:
+                        best, value = selected, found
+                        if self.last_info.get('solution', 'Optimal') == 'Optimal':
+                            bound = value
+                        elif 'best_bound' in self.last_info:
+                            # Parado por tiempo o gap: la cota de CBC (ya en Score_Real) suele ser mucho
+                            # mejor que la de Dantzig (su 'Gap:' viene redondeado a dos decimales, no sirve)
+                            bound = min(bound, max(self.last_info['best_bound'], value))
+                        status = 'Optimal' if _relative_gap(value, bound) <= 1e-9 else 'Feasible'
+
+            info = _solve_info(status, value, bound)
+            instrumentation.record('solver', backend=self.last_solver if status != 'Greedy' else 'greedy',
+                                   mode='anytime', hours=hours, budget=budget, time_limit=time_limit,
+                                   gap_target=gap, selected=len(best), seconds=time.perf_counter() - t0,
+                                   **{k: v for k, v in self.last_info.items() if k not in info}, **info)
+            self.incumbent = {
+                'hours': hours, 'budget': budget, 'selected': best, 'optimal': status == 'Optimal',
+                'used_hours': self.hours[best].sum(), 'used_cost': self.cost[best].sum(),
+            }
+            return best.copy(), info
+
+    def unscaled_bound(self, bound):
+        """
+        Cota de CBC (en las unidades del objetivo del MILP) pasada a Score_Real.
+        Con objetivo escalado, el desempate (negativo, como mucho scale - 1 en
+        total) se descuenta a favor de la cota, que así sigue siendo válida.
+        """
+        if self.objective_scale is None:
+            return bound
+        return (bound + self.objective_scale - 1) / self.objective_scale / 1e6
+
+    def _feasible(self, selected, hours, budget=None):
+        """¿Cabe en horas y presupuesto y respeta los Pre_req?"""
+        sel = np.zeros(len(self.score), dtype=bool)
+        sel[selected] = True
+        has_parent = sel & (self.parent >= 0)
+        return (self.hours[sel].sum() <= hours + 1e-9
+                and (budget is None or self.cost[sel].sum() <= budget + 1e-9)
+                and sel[self.parent[has_parent]].all())
+
+    def warm_start(self, hours, budget=None):
+        """
+        Solución inicial factible para (hours, budget) a partir de la última:
+        se van quitando hojas seleccionadas de menor Score_Real/hora hasta que cabe.
+        """
+        n = len(self.score)
+        sel = np.zeros(n, dtype=bool)
+        if self.incumbent is not None:
+            sel[self.incumbent['selected']] = True
+        budget = np.inf if budget is None else budget
+        efficiency = self.score / np.maximum(self.hours, 1e-9)
+        has_parent = self.parent >= 0
+
+        while sel.any() and (self.hours[sel].sum() > hours + 1e-9 or self.cost[sel].sum() > budget + 1e-9):
+            # Solo hojas: quitar un padre con hijos seleccionados rompería Pre_req
+            busy = np.bincount(self.parent[sel & has_parent], minlength=n) > 0
+            leaves = np.flatnonzero(sel & ~busy)
+            if leaves.size == 0:
+                sel[:] = False
+                break
+            sel[leaves[np.argmin(efficiency[leaves])]] = False
+        return np.flatnonzero(sel)
+
+
+# --- REGISTRO DE BACKENDS DE RESOLUCIÓN ---
+# nombre -> (puede_resolver(model, hours, budget), resolver(model, hours, budget))
+# En modo 'auto' gana el primero registrado que acepte el problema.
+SOLVER_BACKENDS = {}
+
+
+def register_solver(name, can_solve=None):
+    """Decorador para añadir un backend al registro."""
+    def decorator(solve):
+        SOLVER_BACKENDS[name] = (can_solve or (lambda model, hours, budget: True), solve)
+        return solve
+    return decorator
+
+
+def select_solver(model, hours, budget=None):
+    """Elige backend según la forma del problema (bosque, enteros, tamaño)."""
+    for name, (can_solve, _) in SOLVER_BACKENDS.items():
+        if can_solve(model, hours, budget):
+            return name
+    raise ValueError("Ningún backend puede resolver este problema")
+
+
+def _budget_grid(cost, budget):
+    """
+    Costes enteros divididos por su MCD (rejilla compacta) y presupuesto en
+    esas unidades. Como la suma de costes es múltiplo del MCD, suelo(cap / MCD)
+    da exactamente las mismas carteras factibles para cualquier presupuesto.
+    """
+    w_c = _integral_weights(cost)
+    cap = max(int(np.floor(budget + 1e-9)), 0)
+    g = int(np.gcd.reduce(w_c)) if len(w_c) else 0
+    g = g or 1
+    return w_c // g, cap // g
+
+
+def _dantzig_bound(value, weight, capacity):
+    """Relajación lineal del knapsack: por valor/peso, la última a trozos."""
+    free = weight <= 0
+    total = value[free].sum()
+    value, weight = value[~free], weight[~free]
+    if capacity <= 0 or len(value) == 0:
+        return float(total)
+    rank = np.argsort(-(value / weight), kind='stable')
+    value, weight = value[rank], weight[rank]
+    filled = np.cumsum(weight)
+    whole = np.searchsorted(filled, capacity + 1e-9, side='right')
+    total += value[:whole].sum()
+    if whole < len(value):
+        room = capacity - (filled[whole - 1] if whole else 0.0)
+        total += value[whole] * room / weight[whole]
+    return float(total)
+
+
+def _relative_gap(value, bound):
+    """Distancia relativa a la cota: 0 = óptimo probado."""
+    if bound <= 1e-12:
+        return 0.0
+    return float(max(0.0, (bound - value) / bound))
+
+
+def _solve_info(status, value, bound):
+    return {'status': status, 'value': float(value), 'bound': float(max(bound, value)),
+            'gap': _relative_gap(value, bound)}
+
+
+class _TimeLimitReached(Exception):
+    """Se agotó el tiempo de un solve 'anytime' (se sale por el punto de progreso del DP)."""
+
+
+class _deadline:
+    """
+    Durante el bloque, el progreso del motor comprueba el reloj y lanza
+    _TimeLimitReached al pasar `deadline`; sigue avisando a quien ya
+    escuchara (p. ej. un trabajo en segundo plano).
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def __enter__(self):
+        if self.deadline is None:
+            return self
+        outer = instrumentation.current_progress()
+
+        def check(done, total):
+            if time.perf_counter() > self.deadline:
+                raise _TimeLimitReached()
+            if outer is not None:
+                outer(done, total)
+
+        self._listen = instrumentation.listen_progress(check)
+        self._listen.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.deadline is not None:
+            self._listen.__exit__(*exc)
+        return False
+
+
+def _native_can_solve(model, hours, budget):
+    if model.order is None or hours < 0 or (budget is not None and budget < 0):
+        return False
+    weights = [model.hours] if budget is None else [model.hours, model.cost]
+    for w in weights:
+        if (w < 0).any() or (w != np.round(w)).any():
+            return False
+
+    # Por encima de la suma de pesos la tabla no crece (ver _solve_native)
+    cells = len(model.score) * (min(int(np.floor(hours + 1e-9)), int(model.hours.sum())) + 1)
+    if budget is not None:
+        w_c, cap = _budget_grid(model.cost, budget)
+        cells *= min(cap, int(w_c.sum())) + 1
+    return cells <= MAX_NATIVE_CELLS
+
+
+@register_solver('native', can_solve=_native_can_solve)
+def _solve_native(model, hours, budget):
+    """
+    Knapsack sobre el bosque de dependencias, en proceso y sin ficheros.
+    La tabla del DP vale para TODAS las capacidades hasta la suya, así que se
+    guarda en el modelo (con holgura, ver TABLE_HEADROOM) y los siguientes
+    solves dentro de ella son solo una reconstrucción O(n).
+    """
+    w_h = _integral_weights(model.hours)
+    # Por encima de la suma de pesos la respuesta ya no cambia
+    max_h = min(int(np.floor(hours + 1e-9)), int(w_h.sum()))
+    if budget is None:
+        w_c, cap = None, None
+    else:
+        w_c, cap = _budget_grid(model.cost, budget)
+        cap = min(cap, int(w_c.sum()))
+
+    table = model._dp_tables.get(budget is not None)
+    if table is not None and table['max_h'] >= max_h and (w_c is None or table['max_c'] >= cap):
+        model.last_mode = 'table'
+    else:
+        # Holgura: la tabla cubre hasta TABLE_HEADROOM veces la capacidad pedida
+        # (sin pasar de la suma de pesos ni de MAX_NATIVE_CELLS). Así el primer
+        # solve cuesta poco más que uno en frío y los siguientes son trazas.
+        n = len(model.score)
+        table_h = min(int(w_h.sum()), max(TABLE_HEADROOM * max_h, 1))
+        table_c = None if w_c is None else min(int(w_c.sum()), max(TABLE_HEADROOM * cap, 1))
+        if n * (table_h + 1) * (1 if table_c is None else table_c + 1) > MAX_NATIVE_CELLS:
+            table_h, table_c = max_h, cap
+        with stage('optimize.native_dp'):
+            take, _ = _knapsack_dp(model.value_units, model.tiebreak, w_h, model.order, model.end,
+                                   table_h, w_c, table_c)
+        table = {'take': take, 'max_h': table_h, 'max_c': table_c}
+        instrumentation.record('model', backend='native', tasks=n, cells=int(take.size))
+        model._dp_tables[budget is not None] = table
+        model.last_mode = 'cold'
+
+    with stage('optimize.trace'):
+        if w_c is None:
+            selection = _trace_selection(table['take'], model.order, model.end, w_h, [max_h])
+        else:
+            selection = _trace_selection(table['take'], model.order, model.end, w_h, [max_h], w_c, [cap])
+    # El DP es exacto: sin nodos de ramificación ni gap
+    model.last_info = {'status': 'Optimal', 'gap': 0.0, 'table_cells': int(table['take'].size)}
+    return np.flatnonzero(selection[:, 0])
+
+
+@register_solver('cbc')
+def _solve_cbc(model, hours, budget, time_limit=None, gap=None, start=None):
+    """
+    MILP con CBC: sirve para cualquier forma del problema (ciclos, decimales...).
+    Con `time_limit` / `gap` (relativo) CBC para antes y devuelve la mejor
+    solución encontrada; `start` es una solución factible de arranque.
+    """
+    if model.prob is None:
+        model._build_milp()
+
+    model.hours_constraint.changeRHS(float(hours))
+    # Sin presupuesto: RHS = coste total, la restricción nunca es activa
+    model.budget_constraint.changeRHS(float(model.cost.sum() if budget is None else budget))
+
+    # MIP start: la última solución, recortada hasta que vuelva a ser factible
+    # (o la que nos pasen, si es mejor)
+    warm = model.incumbent is not None or start is not None
+    if warm:
+        candidates = [] if model.incumbent is None else [model.warm_start(hours, budget)]
+        if start is not None:
+            candidates.append(start)
+        mask = np.zeros(len(model.x), dtype=bool)
+        mask[max(candidates, key=lambda c: model.score[c].sum())] = True
+        for var, on in zip(model.x, mask.tolist()):
+            var.setInitialValue(int(on))
+    limited = time_limit is not None or gap is not None
+    # Con la instrumentación activa (o con límites, para saber el gap) pedimos el log de CBC
+    log_path = None
+    if instrumentation.enabled() or limited:
+        fd, log_path = tempfile.mkstemp(suffix='-cbc.log')
+        os.close(fd)
+    try:
+        model.prob.solve(pulp.PULP_CBC_CMD(msg=0, warmStart=warm, logPath=log_path,
+                                           timeLimit=None if time_limit is None else max(time_limit, 0.01),
+                                           gapRel=gap))
+        model.last_info = {'status': pulp.LpStatus[model.prob.status]}
+        if log_path:
+            model.last_info.update(_parse_cbc_log(log_path))
+            if 'gap' in model.last_info:
+                model.last_info['gap'] = abs(model.last_info['gap'])  # CBC lo da con signo al maximizar
+            if 'best_bound' in model.last_info:
+                model.last_info['best_bound'] = model.unscaled_bound(abs(model.last_info['best_bound']))
+        model.last_info['solution'] = _cbc_solution(model.prob, model.last_info)
+    finally:
+        if log_path and os.path.exists(log_path):
+            os.remove(log_path)
+    model.last_mode = 'warm' if warm else 'cold'
+
+    with stage('optimize.extract'):
+        values = np.array([v.varValue or 0 for v in model.x], dtype=float)
+    return np.flatnonzero(values > 0.5)
+
+
+# Línea 'Result - ...' del log de CBC cuando prueba el óptimo (sin gap ni límite de tiempo)
+CBC_PROVEN_OPTIMAL = 'Optimal solution found'
+_CBC_LOG_FIELDS = {
+    'nodes': (re.compile(r'Enumerated nodes:\s+(\d+)'), int),
+    'iterations': (re.compile(r'Total iterations:\s+(\d+)'), int),
+    'gap': (re.compile(r'Gap:\s+([-\d.eE+]+)'), float),
+    'objective': (re.compile(r'Objective value:\s+([-\d.eE+]+)'), float),
+    'best_bound': (re.compile(r'Upper bound:\s+([-\d.eE+]+)'), float),
+    'cbc_seconds': (re.compile(r'Time \(Wallclock seconds\):\s+([\d.]+)'), float),
+    'result': (re.compile(r'Result - (.+)'), str.strip),
+}
+
+
+def _parse_cbc_log(path):
+    """Nodos, iteraciones, gap y objetivo del resumen final de CBC."""
+    with open(path, errors='replace') as f:
+        text = f.read()
+    info = {}
+    for field, (pattern, cast) in _CBC_LOG_FIELDS.items():
+        match = pattern.search(text)
+        if match:
+            info[field] = cast(match.group(1))
+    if 'gap' not in info and info.get('result') == CBC_PROVEN_OPTIMAL:
+        info['gap'] = 0.0
+    return info
+
+
+def _cbc_solution(prob, info):
+    """
+    'Optimal', 'Feasible' o None. PuLP da sol_status óptimo también cuando CBC
+    para por gapRel ('... (within gap tolerance)') o por tiempo; solo el
+    resultado del log distingue el óptimo probado. Sin log no hubo límites.
+    """
+    solution = {1: 'Optimal', 2: 'Feasible'}.get(prob.sol_status)
+    if solution == 'Optimal' and info.get('result', CBC_PROVEN_OPTIMAL) != CBC_PROVEN_OPTIMAL:
+        return 'Feasible'
+    return solution
+
+
+# Columnas de las que depende cada resultado (claves de la caché)
+OPTIMIZATION_COLUMNS = ['ID', 'Pre_req', 'Score_Real', 'Horas', 'Coste']
+GANTT_COLUMNS = ['ID', 'Pre_req', 'Score_Real', 'Horas', 'Actividad', 'Tipo', 'Capa_desc']
+MONTE_CARLO_COLUMNS = ['Horas', 'Probabilidad', 'Score_Real']
+
+
+def _cache_get(label, key):
+    """RESULT_CACHE.get que además cuenta aciertos/fallos por función en las estadísticas."""
+    value = RESULT_CACHE.get(key)
+    instrumentation.count(f"cache.{label}.{'hit' if value is not None else 'miss'}")
+    return value
+
+
+def run_optimization(df, hours, budget=None, model=None, solver='auto', time_limit=None, gap=None):
+    """
+    MOTOR DE OPTIMIZACIÓN (KNAPSACK PROBLEM)
+    ----------------------------------------
+    Selecciona el mejor conjunto de actividades que caben en el tiempo disponible.
+    Pasa un `PortfolioModel` ya construido para reutilizarlo entre llamadas.
+    `solver` = 'auto' (según forma del problema), 'native' o 'cbc'.
+    Con `time_limit` (segundos) o `gap` (relativo, p. ej. 0.01) el solve es
+    'anytime': parte de una solución voraz inmediata y la mejora hasta agotar
+    el tiempo o llegar al gap. Sin ellos se prueba el óptimo. En ambos casos
+    plan.attrs['solve'] dice el status, el valor, la cota superior y el gap.
+    Con una `Portfolio` en lugar del DataFrame el plan es su sub-cartera
+    (portfolio.take), sin pasar por pandas.
+    """
+    anytime = time_limit is not None or gap is not None
+    # Cacheamos solo las posiciones elegidas: las filas salen siempre del df actual
+    if anytime:
+        key = fingerprint('run_optimization', df, OPTIMIZATION_COLUMNS, hours, budget, solver, time_limit, gap)
+    else:
+        key = fingerprint('run_optimization', df, OPTIMIZATION_COLUMNS, hours, budget, solver)
+    cached = _cache_get('run_optimization', key)
+    if cached is None:
+        if model is None:
+            model = PortfolioModel(df)
+        if anytime:
+            selected, info = model.solve_anytime(hours, budget, solver, time_limit, gap)
+            cached = {'selected': selected, 'info': info}
+        else:
+            cached = model.solve(hours, budget, solver)
+        # Parado por el reloj, el resultado depende de lo rápido que fue esta vez: no se cachea
+        if time_limit is None or cached['info']['status'] == 'Optimal':
+            RESULT_CACHE.put(key, cached)
+
+    if anytime:
+        selected, info = cached['selected'], cached['info']
+    else:
+        selected = cached
+        score = df.score if isinstance(df, Portfolio) else df['Score_Real'].to_numpy(dtype=float)
+        value = float(score[selected].sum())
+        info = _solve_info('Optimal', value, value)
+    with stage('optimize.result_frame'):
+        plan = _take(df, selected)
+    plan.attrs['solve'] = dict(info)
+    return plan
+
+
+def greedy_plan(df, hours, budget=None, model=None):
+    """
+    Plan voraz inmediato (PortfolioModel.greedy), sin solver ni caché, con su
+    cota de Dantzig en plan.attrs['solve']: lo que se enseña mientras el solve
+    'anytime' sigue en marcha. Acepta el modelo compartido aunque otro hilo
+    lo esté resolviendo (la voraz solo lee sus arrays).
+    """
+    if model is None:
+        model = PortfolioModel(df)
+    selected = model.greedy(hours, budget)
+    value = float(model.score[selected].sum())
+    bound = model.upper_bound(hours, budget)
+    plan = _take(df, selected)
+    plan.attrs['solve'] = _solve_info('Optimal' if _relative_gap(value, bound) <= 1e-9 else 'Greedy', value, bound)
+    return plan
+
+
+def _per_portfolio(value, name):
+    # Un valor para todas o un dict {cartera: valor}
+    return value.get(name) if isinstance(value, dict) else value
+
+
+def optimize_portfolios(portfolios, hours, budget=None, solver='auto'):
+    """
+    CARTERAS LADO A LADO
+    --------------------
+    {cartera: plan óptimo} para un registro o dict {nombre: cartera}.
+    `hours` y `budget` pueden ser un valor o un dict por cartera.
+    """
+    return {name: run_optimization(p, _per_portfolio(hours, name), _per_portfolio(budget, name), solver=solver)
+            for name, p in portfolios.items()}
+
+
+def compare_portfolios(portfolios, hours, budget=None, solver='auto'):
+    """Comparativa lado a lado: valor, horas, coste y actividades del plan óptimo de cada cartera."""
+    rows = []
+    for name, plan in optimize_portfolios(portfolios, hours, budget, solver).items():
+        plan, portfolio = as_portfolio(plan), as_portfolio(portfolios[name])
+        rows.append({
+            'Cartera': name,
+            'Actividades': len(plan),
+            'Actividades_Total': len(portfolio),
+            'Valor': plan.score.sum(),
+            'Valor_Total': portfolio.score.sum(),
+            'Horas': plan.hours.sum(),
+            'Coste': plan.cost.sum(),
+        })
+    return pd.DataFrame(rows, columns=['Cartera', 'Actividades', 'Actividades_Total', 'Valor', 'Valor_Total',
+                                       'Horas', 'Coste'])
+
+
+def hour_scenarios(hours, scenarios, seed=None):
+    """
+    Matriz (escenarios x tareas) de horas reales: cada tarea se desvía por un
+    factor uniforme en HOURS_FACTOR_RANGE, la misma ley que run_monte_carlo.
+    Se sortea de una vez, sin bucles por escenario.
+    """
+    rng = np.random.default_rng(seed)
+    low, high = HOURS_FACTOR_RANGE
+    return rng.uniform(low, high, size=(scenarios, len(hours))) * np.asarray(hours, dtype=float)
+
+
+def hours_reliability(df_plan, hours, iterations=10_000, seed=None):
+    """Probabilidad (Monte Carlo) de que el plan termine dentro de `hours`."""
+    if df_plan.empty:
+        return 1.0
+    return float((run_monte_carlo(df_plan, iterations, seed=seed)['Horas'] <= hours + 1e-9).mean())
+
+
+def run_robust_optimization(df, hours, budget=None, alpha=0.9, scenarios=1_000, seed=None, time_limit=60):
+    """
+    OPTIMIZACIÓN ROBUSTA (RESTRICCIÓN PROBABILÍSTICA POR ESCENARIOS)
+    ----------------------------------------------------------------
+    Maximiza el valor esperado (Score_Real ya es Score x Probabilidad)
+    exigiendo P(horas reales <= hours) >= alpha, estimada sobre `scenarios`
+    sorteos de duraciones (aproximación por media muestral, SAA).
+    Con `seed` es reproducible y cacheable. Si CBC agota `time_limit`,
+    plan.attrs['solve'] dice el status, el valor, la cota y el gap.
+    """
+    if not 0 < alpha <= 1:
+        raise ValueError("alpha debe estar en (0, 1]")
+    key = None
+    if seed is not None:
+        key = fingerprint('run_robust_optimization', df, OPTIMIZATION_COLUMNS, hours, budget, alpha,
+                          scenarios, seed, time_limit)
+        cached = _cache_get('run_robust_optimization', key)
+    if key is None or cached is None:
+        with stage('optimize.chance_constrained'):
+            selected, info = _solve_chance_constrained(as_portfolio(df), hours, budget, alpha, scenarios, seed,
+                                                       time_limit)
+        cached = {'selected': selected, 'info': info}
+        # Como en run_optimization: un plan cortado por time_limit no se cachea
+        if key is not None and info['status'] == 'Optimal':
+            RESULT_CACHE.put(key, cached)
+    plan = _take(df, cached['selected'])
+    plan.attrs['solve'] = dict(cached['info'])
+    return plan
+
+
+def _deflated_incumbent(portfolio, scen, hours, budget, allowed):
+    """
+    Mejor plan determinista 'con colchón' que ya cumple la restricción en los
+    escenarios: un DP trazado para todas las bolsas 0..hours a la vez, y se
+    queda la de más valor que falla en `allowed` escenarios como mucho.
+    Devuelve None si el problema no es un bosque de horas enteras.
+    """
+    w_h = _integral_weights(portfolio.hours)
+    try:
+        order, end = _forest_preorder(portfolio.parent)
+    except ValueError:
+        return None
+    if (w_h < 0).any() or (portfolio.hours != w_h).any():
+        return None
+
+    cap_h = max(int(np.floor(hours + 1e-9)), 0)
+    w_c = cap_c = None
+    if budget is not None:
+        if (portfolio.cost < 0).any():
+            return None
+        w_c, cap_c = _budget_grid(portfolio.cost, budget)
+    if len(portfolio) * (cap_h + 1) * (1 if cap_c is None else cap_c + 1) > MAX_NATIVE_CELLS:
+        return None
+
+    value, tiebreak = _objective_units(portfolio.score)
+    take, _ = _knapsack_dp(value, tiebreak, w_h, order, end, cap_h, w_c, cap_c)
+    lanes = np.arange(cap_h + 1)
+    selection = _trace_selection(take, order, end, w_h, lanes, w_c, None if w_c is None else np.full(len(lanes), cap_c))
+
+    # Escenarios fallados por cada bolsa reducida (escenarios x bolsas, una multiplicación)
+    misses = ((scen @ selection) > hours + 1e-9).sum(axis=0)
+    ok = np.flatnonzero(misses <= allowed)
+    return np.flatnonzero(selection[:, ok[np.argmax((value @ selection)[ok])]])
+
+
+def _solve_chance_constrained(portfolio, hours, budget, alpha, scenarios, seed, time_limit):
+    n = len(portfolio)
+    if n == 0:
+        return np.array([], dtype=np.int64), _solve_info('Optimal', 0.0, 0.0)
+    score, cost, parent = portfolio.score, portfolio.cost, portfolio.parent
+    scen = hour_scenarios(portfolio.hours, scenarios, seed)
+    allowed = int(np.floor((1 - alpha) * scenarios + 1e-9))
+
+    # Tareas que ni solas con su cadena de prerrequisitos caben en suficientes escenarios
+    # (o en el presupuesto) quedan fuera del modelo. Los padres van antes en el preorden.
+    viable = np.ones(n, dtype=bool)
+    try:
+        order, _ = _forest_preorder(parent)
+    except ValueError:
+        order = None  # con ciclos decide CBC (las restricciones Dep_ ya lo impiden)
+    if order is not None:
+        chain_h, chain_c = scen.copy(), cost.copy()
+        for i in order[parent[order] >= 0]:
+            chain_h[:, i] += chain_h[:, parent[i]]
+            chain_c[i] += chain_c[parent[i]]
+        viable = (chain_h > hours + 1e-9).sum(axis=0) <= allowed
+        if budget is not None:
+            viable &= chain_c <= budget + 1e-9
+
+    # big-M ajustado: un plan factible cumple al menos un escenario t (h_t·x <= hours) y
+    # los factores van de low a high, así que en cualquier escenario h_s·x <= hours * high / low.
+    # Solo los escenarios que aún podrían violarse necesitan restricción.
+    low, high = HOURS_FACTOR_RANGE
+    big_m = np.minimum(scen[:, viable].sum(axis=1), hours * high / low if allowed < scenarios else np.inf) - hours
+    rows = np.flatnonzero(big_m > 1e-9)
+    cols = np.flatnonzero(viable)
+
+    incumbent = _deflated_incumbent(portfolio, scen, hours, budget, allowed)
+
+    prob = pulp.LpProblem("ChanceConstrained", pulp.LpMaximize)
+    x = {i: pulp.LpVariable(f"Sel_{i}", cat='Binary') for i in cols}
+    z = [pulp.LpVariable(f"Viol_{s}", cat='Binary') for s in rows]
+    prob += pulp.LpAffineExpression(zip(x.values(), score[cols]))
+
+    # Restricciones por escenario sacadas de la matriz de una vez: horas de las tareas + columna
+    # big-M. PuLP pide un objeto por fila, pero sin aritmética de expresiones fila a fila
+    xs = list(x.values())
+    coefs = np.hstack([scen[np.ix_(rows, cols)], -big_m[rows, None]]).tolist()
+    prob.extend({f"Escenario_{s}": pulp.LpConstraint(pulp.LpAffineExpression(zip(xs + [zs], row)),
+                                                    pulp.LpConstraintLE, rhs=hours)
+                 for s, zs, row in zip(rows.tolist(), z, coefs)})
+    if z:
+        prob += pulp.lpSum(z) <= allowed, "Probabilidad"
+    if budget is not None:
+        prob += pulp.LpAffineExpression(zip(xs, cost[cols])) <= float(budget), "Presupuesto"
+    for child in cols[parent[cols] >= 0]:
+        if parent[child] in x:
+            prob += x[child] - x[parent[child]] <= 0, f"Dep_{child}"
+        else:
+            prob += x[child] <= 0, f"Dep_{child}"
+
+    warm = incumbent is not None
+    if warm:
+        start = np.zeros(n, dtype=bool)
+        start[incumbent] = True
+        for i, var in x.items():
+            var.setInitialValue(int(start[i]))
+        over = (scen[rows] @ start) > hours + 1e-9
+        for zs, on in zip(z, over.tolist()):
+            zs.setInitialValue(int(on))
+
+    # El log de CBC da el gap con la mejor cota: con límite de tiempo el plan puede no ser óptimo.
+    # Sin cortes: con miles de filas densas la raíz se come el límite de tiempo
+    fd, log_path = tempfile.mkstemp(suffix='-cbc.log')
+    os.close(fd)
+    try:
+        prob.solve(pulp.PULP_CBC_CMD(msg=0, warmStart=warm, timeLimit=time_limit, logPath=log_path, options=['cuts off']))
+        info = _parse_cbc_log(log_path)
+        if 'gap' in info:
+            info['gap'] = abs(info['gap'])  # CBC lo da con signo al maximizar
+    finally:
+        os.remove(log_path)
+    status = pulp.LpStatus[prob.status]
+    solution = _cbc_solution(prob, info)
+
+    selected = None
+    if solution is not None:
+        chosen = np.array([i for i, var in x.items() if (var.varValue or 0) > 0.5], dtype=np.int64)
+        mask = np.zeros(n, dtype=bool)
+        mask[chosen] = True
+        if ((scen @ mask) > hours + 1e-9).sum() <= allowed:
+            selected = chosen
+    if selected is None or (warm and score[incumbent].sum() > score[selected].sum() + 1e-9):
+        # Sin solución de CBC (tiempo agotado) nos quedamos con el plan con colchón
+        selected = incumbent if warm else np.array([], dtype=np.int64)
+        solution = 'Heuristic' if warm else None
+
+    # Cota: la de CBC si la dejó en el log; si no, el valor de todas las tareas viables
+    value = float(score[selected].sum())
+    if solution == 'Optimal':
+        bound = value
+    elif 'best_bound' in info:
+        bound = min(abs(info['best_bound']), score[viable].sum())
+    else:
+        bound = score[viable].sum()
+    result = _solve_info('Optimal' if _relative_gap(value, bound) <= 1e-9 else solution or 'Stopped on time',
+                         value, bound)
+    instrumentation.record('solver', backend='cbc-saa', mode='warm' if warm else 'cold', cbc_status=status,
+                           solution=solution, hours=hours, budget=budget, alpha=alpha, scenarios=scenarios,
+                           scenario_rows=len(rows), allowed_violations=allowed, selected=len(selected),
+                           **{k: v for k, v in info.items() if k not in result}, **result)
+    return np.sort(selected), result
+
+
+class ValueCurve:
+    """
+    CURVA DE VALOR EXACTA
+    ---------------------
+    Valor óptimo para cada hora entera entre 0 y max_hours, con la selección
+    de actividades asociada a cada punto (matriz tareas x horas).
+    """
+
+    def __init__(self, df, selection, budget=None):
+        self.df = df
+        self.budget = budget
+        self.selection = selection
+        self.hours = np.arange(selection.shape[1])
+        portfolio = as_portfolio(df)
+        self.value = portfolio.score @ selection
+        self.cost = portfolio.cost @ selection
+        self.used_hours = portfolio.hours @ selection
+
+    def _column(self, hours):
+        # Curva escalonada: con h horas vale lo mismo que con floor(h)
+        return int(np.clip(np.floor(hours + 1e-9), 0, len(self.hours) - 1))
+
+    def at(self, hours):
+        """Valor óptimo con `hours` horas disponibles."""
+        return self.value[self._column(hours)]
+
+    def selected(self, hours):
+        """Actividades de la cartera óptima con `hours` horas disponibles."""
+        return _take(self.df, np.flatnonzero(self.selection[:, self._column(hours)]))
+
+    def to_frame(self, points=None):
+        """Curva como DataFrame; `points` permite muestrear cualquier resolución."""
+        if points is None:
+            cols = np.arange(len(self.hours))
+            x = self.hours
+        else:
+            x = np.asarray(points, dtype=float)
+            cols = np.clip(np.floor(x + 1e-9), 0, len(self.hours) - 1).astype(np.int64)
+        return pd.DataFrame({
+            'Horas_Disp': x,
+            'Valor': self.value[cols],
+            'Coste_Asociado': self.cost[cols],
+            'Horas_Usadas': self.used_hours[cols],
+            'Actividades': self.selection[:, cols].sum(axis=0),
+        })
+
+
+def value_curve(df, max_hours, budget=None):
+    """
+    CURVA DE VALOR (TREE KNAPSACK EN UNA SOLA PASADA)
+    -------------------------------------------------
+    Como las horas son enteras y cada tarea tiene un único padre, un solo DP
+    sobre la capacidad da el óptimo para TODAS las bolsas de horas 0..max_hours
+    sin lanzar el solver en cada punto. Horas/costes decimales se redondean
+    hacia arriba (la selección sigue siendo factible).
+    """
+    max_h = int(np.floor(max_hours + 1e-9))
+    if df.empty or max_h < 0:
+        return ValueCurve(df, np.zeros((len(df), max(max_h, 0) + 1), dtype=bool), budget)
+
+    portfolio = as_portfolio(df)
+    value, tiebreak = _objective_units(portfolio.score)
+    w_h = _integral_weights(portfolio.hours)
+    if (w_h < 0).any():
+        raise ValueError("value_curve necesita horas no negativas")
+    order, end = _forest_preorder(portfolio.parent)
+
+    if budget is None:
+        take, _ = _knapsack_dp(value, tiebreak, w_h, order, end, max_h)
+        selection = _trace_selection(take, order, end, w_h, np.arange(max_h + 1))
+    else:
+        # Costes escalados por su MCD para que la rejilla de presupuesto sea pequeña
+        if (portfolio.cost < 0).any():
+            raise ValueError("value_curve necesita costes no negativos")
+        w_c, cap = _budget_grid(portfolio.cost, budget)
+        take, _ = _knapsack_dp(value, tiebreak, w_h, order, end, max_h, w_c, cap)
+        selection = _trace_selection(take, order, end, w_h, np.arange(max_h + 1),
+                                     w_c, np.full(max_h + 1, cap))
+
+    return ValueCurve(df, selection, budget)
+
+
+class ParetoFrontier:
+    """
+    FRONTERA DE PARETO VALOR / HORAS / COSTE
+    ----------------------------------------
+    `surface[h, c]` = valor óptimo con hours_axis[h] horas y cost_axis[c] €.
+    `frontier` = carteras no dominadas: ninguna otra da más valor con menos
+    (o iguales) horas y coste. Horas_Min / Coste_Min son los puntos de ruptura
+    de la superficie: desde ahí esa cartera pasa a ser la óptima.
+    """
+
+    def __init__(self, df, take, order, end, w_h, w_c, hours_axis, cost_axis, surface):
+        self.df = df
+        self.hours_axis = hours_axis
+        self.cost_axis = cost_axis
+        self.surface = surface
+        self._dp = (take, order, end, w_h, w_c)
+
+        # Esquinas de la superficie: el valor sube respecto a la celda de menos horas y a la de menos coste
+        padded = np.pad(surface, ((1, 0), (1, 0)), constant_values=-1)
+        corners = (surface > padded[:-1, 1:]) & (surface > padded[1:, :-1])
+        h_idx, c_idx = np.nonzero(corners)
+        selection = _trace_selection(take, order, end, w_h, h_idx, w_c, c_idx)
+
+        ids = _ids(df)
+        portfolio = as_portfolio(df)
+        self.frontier = pd.DataFrame({
+            'Horas_Min': hours_axis[h_idx],
+            'Coste_Min': cost_axis[c_idx],
+            'Valor': portfolio.score @ selection,
+            'Horas': portfolio.hours @ selection,
+            'Coste': portfolio.cost @ selection,
+            'Actividades': selection.sum(axis=0),
+            'IDs': [tuple(ids[selection[:, j]]) for j in range(selection.shape[1])],
+        }).sort_values(['Horas_Min', 'Coste_Min'], ignore_index=True)
+
+    def selected(self, hours, budget):
+        """Cartera óptima para cualquier punto (hours, budget) de la rejilla."""
+        take, order, end, w_h, w_c = self._dp
+        h = int(np.clip(np.searchsorted(self.hours_axis, hours, side='right') - 1, 0, len(self.hours_axis) - 1))
+        c = int(np.clip(np.searchsorted(self.cost_axis, budget, side='right') - 1, 0, len(self.cost_axis) - 1))
+        sel = _trace_selection(take, order, end, w_h, [h], w_c, [c])
+        return _take(self.df, np.flatnonzero(sel[:, 0]))
+
+
+def pareto_frontier(df, max_hours=None, max_budget=None, hours_step=1, cost_step=None):
+    """
+    FRONTERA DE PARETO HORAS x PRESUPUESTO (UN SOLO DP 2D)
+    ------------------------------------------------------
+    Un único DP sobre la rejilla (horas x coste) da el óptimo de TODAS las
+    celdas: cada celda se construye a partir de sus vecinas en lugar de
+    resolverse en frío. Por defecto la rejilla es exacta (1 hora; el MCD de
+    los costes). Pasos mayores redondean hacia arriba horas/costes de cada
+    tarea: la rejilla es más gruesa pero las carteras siguen siendo factibles.
+    """
+    portfolio = as_portfolio(df)
+    hours, cost = portfolio.hours, portfolio.cost
+    if (hours < 0).any() or (cost < 0).any():
+        raise ValueError("pareto_frontier necesita horas y costes no negativos")
+    max_hours = hours.sum() if max_hours is None else max_hours
+    max_budget = cost.sum() if max_budget is None else max_budget
+
+    if cost_step is None:
+        cost_step = int(np.gcd.reduce(_integral_weights(cost))) or 1
+    w_h = _integral_weights(hours / hours_step)
+    w_c = _integral_weights(cost / cost_step)
+    max_h = int(np.floor(max_hours / hours_step + 1e-9))
+    max_c = int(np.floor(max_budget / cost_step + 1e-9))
+
+    cells = len(portfolio) * (max_h + 1) * (max_c + 1)
+    if cells > MAX_NATIVE_CELLS:
+        raise ValueError(f"Rejilla demasiado grande ({cells:,} celdas): aumenta hours_step o cost_step")
+
+    value, tiebreak = _objective_units(portfolio.score)
+    order, end = _forest_preorder(portfolio.parent)
+    take, best = _knapsack_dp(value, tiebreak, w_h, order, end, max_h, w_c, max_c)
+
+    return ParetoFrontier(df, take, order, end, w_h, w_c,
+                          np.arange(max_h + 1) * hours_step, np.arange(max_c + 1) * cost_step, best / 1e6)
+
+
+def _forced_values(value, w_h, parent, order, end, cap_h, w_c=None, cap_c=None):
+    """
+    VALOR ÓPTIMO FORZANDO CADA TAREA DENTRO / FUERA (DOS PASADAS)
+    -------------------------------------------------------------
+    S[k][c] = mejor valor desde la posición k con capacidad c (el DP de siempre)
+    y F[k][c] = mejor valor de los caminos que llegan a k gastando como mucho c.
+    Llegar a k implica haber cogido todos sus ancestros, así que:
+      coger k:  max_c F[k][c] + v + S[k+1][C - w - c]
+      saltar k: max_c F[k][c] + S[end[k]][C - c]
+    Una tarea queda fuera si se salta ella o cualquiera de sus ancestros.
+    Devuelve (con, sin) por tarea en micro-puntos (NEG = no cabe).
+    """
+    n = len(order)
+    shape = (cap_h + 1,) if w_c is None else (cap_h + 1, cap_c + 1)
+    flip = (slice(None, None, -1),) * len(shape)
+
+    def shifted(row, i):
+        # Fila tras coger la tarea i: desplazada por su peso, NEG donde no cabe
+        out = np.full(shape, NEG_UNITS)
+        wh, wc = w_h[i], 0 if w_c is None else w_c[i]
+        if wh <= cap_h and (w_c is None or wc <= cap_c):
+            if w_c is None:
+                out[wh:] = row[:cap_h + 1 - wh] + value[i]
+            else:
+                out[wh:, wc:] = row[:cap_h + 1 - wh, :cap_c + 1 - wc] + value[i]
+        return out
+
+    suffix = np.empty((n + 1,) + shape, dtype=np.int64)
+    suffix[n] = 0
+    for k in range(n - 1, -1, -1):
+        suffix[k] = np.maximum(suffix[end[k]], shifted(suffix[k + 1], order[k]))
+
+    take_val = np.full(n, NEG_UNITS)
+    skip_val = np.full(n, NEG_UNITS)
+    prefix = {0: np.zeros(shape, dtype=np.int64)}
+    for k in range(n):
+        # Todo lo que llega a k viene de posiciones anteriores: la fila ya está completa
+        arrive = prefix.pop(k)
+        taken = shifted(arrive, order[k])
+        take_val[k] = (taken + suffix[k + 1][flip]).max()
+        skip_val[k] = (arrive + suffix[end[k]][flip]).max()
+        for r, row in ((k + 1, taken), (end[k], arrive)):
+            prefix[r] = row if r not in prefix else np.maximum(prefix[r], row)
+
+    # Fuera = saltar la propia tarea o algún ancestro (los padres van antes en el preorden)
+    pos = np.empty(n, dtype=np.int64)
+    pos[order] = np.arange(n)
+    parent_pos = np.where(parent[order] >= 0, pos[np.maximum(parent[order], 0)], -1)
+    out_val = skip_val.copy()
+    for k in np.flatnonzero(parent_pos >= 0):
+        out_val[k] = max(out_val[k], out_val[parent_pos[k]])
+
+    forced_in = np.full(n, NEG_UNITS)
+    forced_out = np.full(n, NEG_UNITS)
+    forced_in[order] = np.where(take_val < NEG_UNITS // 2, NEG_UNITS, take_val)
+    forced_out[order] = out_val
+    return forced_in, forced_out
+
+
+class SensitivityReport:
+    """
+    SENSIBILIDAD POR ACTIVIDAD
+    --------------------------
+    `frame` (una fila por actividad, en el orden del df):
+      - Seleccionada: está en la cartera óptima de run_optimization
+      - Perdida_Si_Fuera: valor que se pierde si se fuerza a quedar fuera
+      - Perdida_Si_Dentro: valor que se pierde si se fuerza a entrar (NaN = no cabe)
+      - Horas_Extra / Coste_Extra: menor aumento de horas (o presupuesto) con
+        el que entra en el óptimo (NaN = no entra dentro del horizonte)
+      - Valor_Hora_Extra: valor ganado por cada una de esas horas extra
+    `marginal_hour` / `marginal_budget`: valor de una hora (un €) más.
+    """
+
+    def __init__(self, frame, value, marginal_hour, marginal_budget=None):
+        self.frame = frame
+        self.value = value
+        self.marginal_hour = marginal_hour
+        self.marginal_budget = marginal_budget
+
+    def copy(self):
+        """Copia con su propio `frame` (la de la caché no se toca)."""
+        return SensitivityReport(self.frame.copy(), self.value, self.marginal_hour, self.marginal_budget)
+
+
+def sensitivity_analysis(df, hours, budget=None):
+    """
+    ANÁLISIS DE SENSIBILIDAD EN UNA PASADA
+    --------------------------------------
+    Explica por qué cada actividad entra o no sin re-resolver n veces:
+    un barrido paramétrico de horas (un DP, trazado para todas las bolsas a
+    la vez), otro de presupuesto si lo hay, y dos pasadas prefijo/sufijo
+    que dan el óptimo forzando cada actividad dentro o fuera.
+    """
+    key = fingerprint('sensitivity_analysis', df, OPTIMIZATION_COLUMNS, hours, budget)
+    report = _cache_get('sensitivity_analysis', key)
+    if report is None:
+        with stage('optimize.sensitivity'):
+            report = _sensitivity(df, hours, budget)
+        RESULT_CACHE.put(key, report)
+    # Cada llamada recibe su copia: modificar report.frame no corrompe los siguientes aciertos
+    return report.copy()
+
+
+def _sweep_horizon(n, fixed_cells, cap, top):
+    """Mayor capacidad del barrido (entre cap y top) que cabe en MAX_NATIVE_CELLS."""
+    top = min(top, MAX_NATIVE_CELLS // max(1, n * fixed_cells) - 1)
+    if top < cap:
+        raise ValueError("Problema demasiado grande para el análisis de sensibilidad")
+    return top
+
+
+def _first_lane(selection):
+    """Primer carril en el que aparece cada tarea (-1 si en ninguno)."""
+    return np.where(selection.any(axis=1), selection.argmax(axis=1), -1)
+
+
+def _sensitivity(df, hours, budget):
+    n = len(df)
+    columns = ['ID', 'Actividad', 'Seleccionada', 'Perdida_Si_Fuera', 'Perdida_Si_Dentro',
+               'Horas_Extra', 'Coste_Extra', 'Valor_Hora_Extra']
+    if n == 0:
+        return SensitivityReport(pd.DataFrame(columns=columns), 0.0, 0.0, None if budget is None else 0.0)
+
+    portfolio = as_portfolio(df)
+    value, tiebreak = _objective_units(portfolio.score)
+    w_h = _integral_weights(portfolio.hours)
+    if (w_h < 0).any():
+        raise ValueError("sensitivity_analysis necesita horas no negativas")
+    parent = portfolio.parent
+    order, end = _forest_preorder(parent)
+    cap_h = max(int(np.floor(hours + 1e-9)), 0)
+
+    if budget is None:
+        w_c = cap_c = None
+        budget_cells = 1
+    else:
+        cost = _integral_weights(portfolio.cost)
+        if (cost < 0).any():
+            raise ValueError("sensitivity_analysis necesita costes no negativos")
+        unit = int(np.gcd.reduce(cost)) or 1
+        w_c, cap_c = _budget_grid(portfolio.cost, budget)
+        budget_cells = cap_c + 1
+
+    if (n + 1) * (cap_h + 1) * budget_cells > MAX_NATIVE_CELLS // 8:
+        raise ValueError("Problema demasiado grande para el análisis de sensibilidad")
+
+    # 1. Barrido de horas: con la suma de horas ya cabe todo, no hace falta ir más allá
+    top_h = _sweep_horizon(n, budget_cells, cap_h, max(cap_h, int(w_h.sum())))
+    lanes_h = np.arange(cap_h, top_h + 1)
+    take, _ = _knapsack_dp(value, tiebreak, w_h, order, end, top_h, w_c, cap_c)
+    sel_h = _trace_selection(take, order, end, w_h, lanes_h,
+                             w_c, None if w_c is None else np.full(len(lanes_h), cap_c))
+    del take
+    selected = sel_h[:, 0]
+    curve_h = value @ sel_h
+    first_h = _first_lane(sel_h)
+    horas_extra = np.where(first_h >= 0, np.maximum(lanes_h[first_h] - hours, 0), np.nan)
+    gain = (curve_h[first_h] - curve_h[0]) / 1e6
+    valor_hora = np.where(first_h > 0, gain / np.maximum(lanes_h[first_h] - cap_h, 1), np.nan)
+    marginal_hour = (curve_h[1] - curve_h[0]) / 1e6 if len(lanes_h) > 1 else 0.0
+
+    # 2. Barrido de presupuesto con las horas fijas
+    coste_extra = np.full(n, np.nan)
+    marginal_budget = None
+    if budget is not None:
+        top_c = _sweep_horizon(n, cap_h + 1, cap_c, max(cap_c, int(w_c.sum())))
+        lanes_c = np.arange(cap_c, top_c + 1)
+        take, _ = _knapsack_dp(value, tiebreak, w_h, order, end, cap_h, w_c, top_c)
+        sel_c = _trace_selection(take, order, end, w_h, np.full(len(lanes_c), cap_h), w_c, lanes_c)
+        del take
+        first_c = _first_lane(sel_c)
+        coste_extra = np.where(first_c >= 0, np.maximum(lanes_c[np.maximum(first_c, 0)] * unit - budget, 0), np.nan)
+        curve_c = value @ sel_c
+        marginal_budget = (curve_c[1] - curve_c[0]) / 1e6 / unit if len(lanes_c) > 1 else 0.0
+
+    # 3. Óptimo forzando cada actividad dentro / fuera
+    forced_in, forced_out = _forced_values(value, w_h, parent, order, end, cap_h, w_c, cap_c)
+    best = curve_h[0]
+    perdida_fuera = np.where(selected, (best - forced_out) / 1e6, 0.0)
+    perdida_dentro = np.where(selected, 0.0, np.where(forced_in == NEG_UNITS, np.nan, (best - forced_in) / 1e6))
+
+    frame = pd.DataFrame({
+        'ID': _ids(df),
+        'Actividad': portfolio.values('Actividad') if 'Actividad' in portfolio else None,
+        'Seleccionada': selected,
+        'Perdida_Si_Fuera': perdida_fuera,
+        'Perdida_Si_Dentro': perdida_dentro,
+        'Horas_Extra': horas_extra,
+        'Coste_Extra': coste_extra,
+        'Valor_Hora_Extra': valor_hora,
+    }, columns=columns)
+    return SensitivityReport(frame, best / 1e6, marginal_hour, marginal_budget)
+
+
+# Con más muestras que esto en un símplice se parte por el punto medio de una arista
+# (como mucho m // WEIGHT_BISECT_SAMPLES veces, así que nunca hay muchas más resoluciones que vectores)
+WEIGHT_BISECT_SAMPLES = 8
+
+
+class WeightSweep:
+    """
+    ESTABILIDAD FRENTE A LOS PESOS DEL SCORE
+    ----------------------------------------
+    `weights`: un vector de pesos por fila (normalizados a suma 1) con la
+    cartera que elige (`Cartera`, índice en `portfolios`) y su valor.
+    `portfolios`: carteras distintas (posiciones en el df); `base`: la del
+    vector de pesos actual.
+    `frame` (una fila por actividad, en el orden del df):
+      - Frecuencia: fracción de vectores cuya cartera la incluye
+      - En_Base: está en la cartera de los pesos actuales
+    `solves` / `certified`: vectores resueltos vs reutilizados sin resolver.
+    """
+
+    def __init__(self, weights, portfolios, base, frame, solves, certified):
+        self.weights = weights
+        self.portfolios = portfolios
+        self.base = base
+        self.frame = frame
+        self.solves = solves
+        self.certified = certified
+
+    def copy(self):
+        """Copia con sus propias tablas y carteras (la de la caché no se toca)."""
+        return WeightSweep(self.weights.copy(), [p.copy() for p in self.portfolios], self.base, self.frame.copy(),
+                           self.solves, self.certified)
+
+    @property
+    def base_share(self):
+        """Fracción de vectores que eligen exactamente la cartera base."""
+        if self.weights.empty:
+            return 1.0
+        return float((self.weights['Cartera'] == self.base).mean())
+
+
+def weight_sensitivity(df, hours, base_weights, budget=None, weights=None, samples=1_000,
+                       concentration=50.0, seed=None):
+    """
+    SENSIBILIDAD A LOS PESOS DEL SCORE
+    ----------------------------------
+    ¿Cuánto cambia la cartera si cambian los pesos de la fórmula del Score?
+    `base_weights` = {ingrediente: peso} (p. ej. data_loader.SCORE_WEIGHTS).
+    `weights` es una matriz (vectores x ingredientes); sin ella se sortean
+    `samples` vectores de una Dirichlet centrada en la base (más
+    `concentration`, más cerca de ella). Todos se puntúan con un único
+    producto matricial y el ajuste de Probabilidad en bloque, y solo se
+    resuelve donde la cartera puede cambiar: el óptimo es convexo en los
+    pesos, así que si la misma cartera es óptima en los vértices de un
+    símplice de pesos lo es en todo su interior. Con `seed` (o `weights`)
+    es reproducible y cacheable.
+    """
+    ingredients = list(base_weights)
+    missing = [c for c in ingredients + ['Probabilidad'] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas para el barrido de pesos: {missing}")
+    base = _simplex_weights(np.array([list(base_weights.values())], dtype=float))[0]
+    reproducible = seed is not None or weights is not None
+    if weights is None:
+        rng = np.random.default_rng(seed)
+        weights = rng.dirichlet(np.maximum(base * concentration, 1e-3), size=samples)
+    weights = _simplex_weights(np.atleast_2d(np.asarray(weights, dtype=float)))
+    if weights.shape[1] != len(ingredients):
+        raise ValueError(f"Cada vector de pesos necesita {len(ingredients)} componentes")
+
+    key = None
+    if reproducible:
+        key = fingerprint('weight_sensitivity', df, OPTIMIZATION_COLUMNS + ingredients + ['Probabilidad'],
+                          hours, budget, tuple(ingredients), base.tobytes(), weights.tobytes())
+        sweep = _cache_get('weight_sensitivity', key)
+        if sweep is not None:
+            return sweep.copy()
+
+    with stage('optimize.weight_sweep'):
+        sweep = _weight_sweep(df, hours, budget, ingredients, base, weights)
+    instrumentation.record('weight_sweep', vectors=len(weights), solves=sweep.solves,
+                           certified=sweep.certified, portfolios=len(sweep.portfolios))
+    if key is not None:
+        RESULT_CACHE.put(key, sweep)
+        return sweep.copy()
+    return sweep
+
+
+def _simplex_weights(weights):
+    """Pesos no negativos normalizados a suma 1 (la escala no cambia la cartera)."""
+    if (weights < 0).any() or not np.isfinite(weights).all():
+        raise ValueError("Los pesos del Score deben ser no negativos")
+    total = weights.sum(axis=1, keepdims=True)
+    if (total <= 0).any():
+        raise ValueError("Cada vector de pesos necesita algún peso positivo")
+    return weights / total
+
+
+def _weight_sweep(df, hours, budget, ingredients, base, weights):
+    m, k = weights.shape
+    # Score_Real por vector de pesos = (pesos @ ingredientes) x Probabilidad ajustada
+    portfolio = as_portfolio(df)
+    ingredient_matrix = np.column_stack([pd.to_numeric(portfolio.values(c), errors='coerce')
+                                         for c in ingredients]).astype(float)
+    ingredient_matrix[np.isnan(ingredient_matrix)] = 0.0
+    prob = portfolio.prob
+    values = (weights @ ingredient_matrix.T) * prob  # (vectores x tareas), un solo producto
+
+    model = PortfolioModel(portfolio)
+    portfolios, portfolio_id, solved = [], {}, {}
+    solves = 0
+
+    def solve(w, score=None):
+        """(cartera óptima, su valor) para el vector de pesos w; cada w se resuelve una vez."""
+        nonlocal solves
+        cell = tuple(np.round(w, 12))
+        if cell not in solved:
+            score = (ingredient_matrix @ w) * prob if score is None else score
+            selected = model.rescored(score).solve(hours, budget)
+            solves += 1
+            mask = np.zeros(len(portfolio), dtype=bool)
+            mask[selected] = True
+            p = portfolio_id.setdefault(mask.tobytes(), len(portfolios))
+            if p == len(portfolios):
+                portfolios.append(selected)
+            solved[cell] = (p, float(score[selected].sum()))
+        return solved[cell]
+
+    # Subdivisión del símplice de pesos (vértices = un solo ingrediente). `coords`
+    # son las coordenadas baricéntricas de cada vector dentro de su símplice.
+    # El óptimo es convexo en los pesos: en un vector interior no supera la
+    # combinación de los óptimos de los vértices, así que una cartera conocida
+    # que alcanza esa cota es óptima ahí sin resolver nada.
+    plan = np.full(m, -1, dtype=np.int64)
+    certified = done = 0
+    bisections = m // WEIGHT_BISECT_SAMPLES
+    stack = [(np.eye(k), [solve(c) for c in np.eye(k)], np.arange(m), weights.copy())]
+    while stack:
+        vertices, opt, idx, coords = stack.pop()
+        bound = coords @ np.array([v for _, v in opt])
+        best = np.full(len(idx), -np.inf)
+        pick = np.full(len(idx), -1, dtype=np.int64)
+        for p in range(len(portfolios)):
+            reached = values[idx][:, portfolios[p]].sum(axis=1)
+            better = reached > best
+            best[better], pick[better] = reached[better], p
+        ok = best >= bound - 1e-9 * np.maximum(1.0, np.abs(bound))
+        plan[idx[ok]] = pick[ok]
+        certified += int(ok.sum())
+        done += int(ok.sum())
+        idx, coords = idx[~ok], coords[~ok]
+
+        if len(idx) <= 2:
+            # Con una o dos muestras, resolverlas sale más barato que seguir partiendo
+            for i in idx.tolist():
+                plan[i] = solve(weights[i], values[i])[0]
+            done += len(idx)
+        else:
+            if len(idx) > WEIGHT_BISECT_SAMPLES and bisections > 0:
+                bisections -= 1
+                # Muchas muestras: el punto medio de la arista más larga (una resolución sirve a muchas)
+                a, b = max(((a, b) for a in range(k) for b in range(a + 1, k)),
+                           key=lambda e: np.abs(vertices[e[0]] - vertices[e[1]]).sum())
+                mu = np.zeros(k)
+                mu[[a, b]] = 0.5
+                centre = (vertices[a] + vertices[b]) / 2
+                centre_opt = solve(centre)
+            else:
+                # Pocas: la muestra más central, cuya resolución hacía falta igual
+                c = int(np.argmax(coords.min(axis=1)))
+                centre, mu = weights[idx[c]], coords[c]
+                centre_opt = solve(centre, values[idx[c]])
+            # El nuevo punto sustituye a cada vértice en un sub-símplice (subdivisión estelar)
+            live = mu > 1e-12
+            ratio = np.where(live, coords / np.where(live, mu, 1.0), np.inf)
+            face = ratio.argmin(axis=1)
+            t = ratio[np.arange(len(idx)), face]
+            for i in np.flatnonzero(live).tolist():
+                side = face == i
+                if side.any():
+                    child = np.maximum(coords[side] - t[side, None] * mu, 0.0)
+                    child[:, i] = t[side]
+                    child_vertices = vertices.copy()
+                    child_vertices[i] = centre
+                    child_opt = list(opt)
+                    child_opt[i] = centre_opt
+                    stack.append((child_vertices, child_opt, idx[side], child))
+        instrumentation.progress(done, m)
+
+    base_id = solve(base)[0]
+    membership = np.zeros((len(portfolios), len(portfolio)), dtype=bool)
+    for p, selected in enumerate(portfolios):
+        membership[p, selected] = True
+
+    frame = pd.DataFrame({'ID': _ids(df)})
+    if 'Actividad' in portfolio:
+        frame['Actividad'] = portfolio.values('Actividad')
+    counts = np.bincount(plan, minlength=len(membership)) if m else np.zeros(len(membership))
+    frame['Frecuencia'] = counts @ membership / max(m, 1)
+    frame['En_Base'] = membership[base_id]
+
+    table = pd.DataFrame(weights, columns=ingredients)
+    table['Cartera'] = plan
+    table['Valor'] = (values * membership[plan]).sum(axis=1)
+    return WeightSweep(table, portfolios, base_id, frame, solves, certified)
+
+
+# Fecha de inicio del plan: primer lunes laboral de 2026
+PLAN_START = datetime(2026, 1, 5)
+
+
+def calculate_sequential_gantt(df_opt, weekly_hours):
+    """
+    MOTOR DE CALENDARIZACIÓN (TOPOLOGICAL SORT + HEAP)
+    --------------------------------------------------
+    Ordena las tareas óptimas en una línea de tiempo realista.
+    Usa 'Score Heredado' para priorizar desbloqueadores.
+    `df_opt` puede ser el plan como DataFrame o como `Portfolio`.
+    """
+    if df_opt.empty: return pd.DataFrame()
+
+    key = fingerprint('calculate_sequential_gantt', df_opt, GANTT_COLUMNS, weekly_hours)
+    gantt = _cache_get('calculate_sequential_gantt', key)
+    if gantt is None:
+        with stage('schedule.sequential_gantt'):
+            gantt = _sequential_gantt(as_portfolio(df_opt), weekly_hours)
+        RESULT_CACHE.put(key, gantt)
+    return gantt.copy()
+
+
+def calculate_parallel_gantt(df_opt, resources):
+    """
+    MOTOR DE CALENDARIZACIÓN MULTI-RECURSO (HEAP DE TAREAS + HEAP DE RECURSOS)
+    --------------------------------------------------------------------------
+    Igual que el Gantt secuencial, pero con varias personas / líneas de
+    trabajo en paralelo. `resources` es una lista de horas/semana por recurso
+    o un dict {nombre: horas/semana}. Cada tarea lista (por Score Heredado) va
+    al recurso que antes queda libre. Añade la columna 'Recurso'.
+    Con un único recurso reproduce exactamente calculate_sequential_gantt.
+    """
+    if df_opt.empty: return pd.DataFrame()
+
+    names, capacity = _resource_table(resources)
+    key = fingerprint('calculate_parallel_gantt', df_opt, GANTT_COLUMNS, tuple(names), tuple(capacity.tolist()))
+    gantt = _cache_get('calculate_parallel_gantt', key)
+    if gantt is None:
+        with stage('schedule.parallel_gantt'):
+            gantt = _parallel_gantt(as_portfolio(df_opt), names, capacity)
+        RESULT_CACHE.put(key, gantt)
+    return gantt.copy()
+
+
+def _resource_table(resources):
+    """Normaliza `resources` a (nombres, horas/semana)."""
+    if isinstance(resources, dict):
+        names, hours = list(resources), list(resources.values())
+    else:
+        hours = list(resources)
+        names = [f"Recurso {k + 1}" for k in range(len(hours))]
+    if not hours:
+        raise ValueError("Hace falta al menos un recurso")
+    return [str(n) for n in names], np.asarray(hours, dtype=float)
+
+
+def resource_utilization(gantt, resources=None):
+    """
+    Ocupación de cada recurso: tareas asignadas, días ocupados y fracción del
+    plan (desde PLAN_START hasta la última fecha de fin) en la que trabaja.
+    """
+    names = _resource_table(resources)[0] if resources is not None else []
+    if gantt.empty:
+        busy = pd.DataFrame({'Recurso': names, 'Tareas': 0, 'Dias_Ocupado': 0})
+        return busy.assign(Fin=pd.NaT, Ocupacion=0.0)
+
+    days = (gantt['Fin'] - gantt['Inicio']).dt.days
+    busy = (gantt.assign(Dias=days).groupby('Recurso', sort=False)
+            .agg(Tareas=('ID', 'size'), Dias_Ocupado=('Dias', 'sum'), Fin=('Fin', 'max')))
+    busy = busy.reindex(list(dict.fromkeys(names + busy.index.tolist())))
+    busy['Tareas'] = busy['Tareas'].fillna(0).astype(np.int64)
+    busy['Dias_Ocupado'] = busy['Dias_Ocupado'].fillna(0).astype(np.int64)
+
+    makespan = max(1, (gantt['Fin'].max() - PLAN_START).days)
+    busy['Ocupacion'] = busy['Dias_Ocupado'] / makespan
+    return busy.rename_axis('Recurso').reset_index()
+
+
+def _gantt_priorities(plan):
+    """
+    Estructura común a los dos calendarizadores: padre de cada tarea, hijos en
+    formato CSR y prioridad entera por Score Heredado (desc.) e ID (asc.).
+    """
+    ids = plan.ids
+    if not pd.Index(ids).is_unique:
+        raise ValueError("El Gantt necesita IDs únicos")
+
+    # 1. Mapeo de Grafos: padre de cada tarea (posición) e hijos en formato CSR
+    n = len(plan)
+    parent = plan.parent
+    has_parent = parent >= 0
+    kids = np.flatnonzero(has_parent)[np.argsort(parent[has_parent], kind='stable')]
+    ptr = np.concatenate(([0], np.cumsum(np.bincount(parent[has_parent], minlength=n))))
+    kids, ptr, parent_l = kids.tolist(), ptr.tolist(), parent.tolist()
+
+    # Orden topológico (BFS desde las raíces). Las tareas en un ciclo nunca se desbloquean.
+    roots = np.flatnonzero(~has_parent).tolist()
+    topo = list(roots)
+    for v in topo:
+        topo.extend(kids[ptr[v]:ptr[v + 1]])
+
+    # 2. Cálculo de "Score Heredado" (Back-Propagation), sin recursión
+    # Una tarea pequeña necesaria para una grande hereda la importancia de la grande:
+    # recorriendo el orden topológico al revés, cada hijo está resuelto antes que su padre.
+    effective = plan.score.tolist()
+    for v in reversed(topo):
+        p = parent_l[v]
+        if p >= 0 and effective[v] > effective[p]:
+            effective[p] = effective[v]
+
+    # La prioridad se reduce a un rango entero: los heaps comparan enteros, no tuplas
+    by_priority = np.lexsort((ids, -np.asarray(effective)))
+    priority = np.empty(n, dtype=np.int64)
+    priority[by_priority] = np.arange(n)
+    return parent, kids, ptr, roots, priority.tolist(), by_priority.tolist()
+
+
+def _gantt_frame(plan, sequence, start, duration):
+    """Tabla del Gantt a partir del orden de ejecución y de los días de inicio."""
+    plan_start = np.datetime64(PLAN_START, 'D')
+    return pd.DataFrame({
+        'Tarea': plan.values('Actividad')[sequence],
+        'Inicio': (plan_start + start).astype('datetime64[us]'),
+        'Fin': (plan_start + start + duration).astype('datetime64[us]'),
+        'Tipo': plan.values('Tipo')[sequence] if 'Tipo' in plan else 'General',
+        'ID': plan.ids[sequence],
+        'Pre_req': plan.pre_req[sequence],
+        'Capa_desc': plan.values('Capa_desc')[sequence] if 'Capa_desc' in plan else 'General',
+    })
+
+
+def _sequential_gantt(plan, weekly_hours):
+    n = len(plan)
+    parent, kids, ptr, roots, priority, by_priority = _gantt_priorities(plan)
+
+    # 3. Cola de Prioridad (Heap): entran las tareas sin dependencias pendientes
+    queue = [priority[v] for v in roots]
+    heapq.heapify(queue)
+    sequence = []
+    while queue:
+        v = by_priority[heapq.heappop(queue)]
+        sequence.append(v)
+        # Desbloqueo de Hijos: al terminar esta tarea, sus hijos ya pueden entrar
+        for child in kids[ptr[v]:ptr[v + 1]]:
+            heapq.heappush(queue, priority[child])
+    sequence = np.asarray(sequence, dtype=np.int64)
+
+    # 4. Fechas como desplazamientos en días desde PLAN_START
+    # Un único recurso: cada tarea empieza cuando acaba la anterior, y un día
+    # después si la anterior es justo su prerrequisito.
+    rank = np.full(n, -1, dtype=np.int64)
+    rank[sequence] = np.arange(len(sequence))
+    parent_rank = np.where(parent[sequence] >= 0, rank[parent[sequence]], -1)
+    gap = (parent_rank >= 0) & (parent_rank == np.arange(len(sequence)) - 1)
+
+    hours = plan.hours[sequence]
+    duration = np.maximum(1, (hours / max(1, weekly_hours) * 7).astype(np.int64))
+    start = np.cumsum(duration) - duration + np.cumsum(gap)
+    return _gantt_frame(plan, sequence, start, duration)
+
+
+def _parallel_gantt(plan, names, capacity):
+    n = len(plan)
+    parent, kids, ptr, roots, priority, by_priority = _gantt_priorities(plan)
+    parent_l = parent.tolist()
+    hours = plan.hours.tolist()
+    pace = [max(1, c) for c in capacity.tolist()]
+
+    # Tres heaps: tareas listas (por prioridad), tareas cuyo padre aún no ha
+    # terminado (por día de liberación) y recursos (por día en que quedan libres).
+    ready = [priority[v] for v in roots]
+    heapq.heapify(ready)
+    pending = []
+    free = [(0, r) for r in range(len(pace))]
+
+    end_day = [0] * n
+    sequence, start, duration, assigned = [], [], [], []
+    while ready or pending:
+        t, r = heapq.heappop(free)
+        while pending and pending[0][0] <= t:
+            heapq.heappush(ready, heapq.heappop(pending)[1])
+        if not ready:
+            # Nada listo: el recurso espera a que termine el siguiente prerrequisito
+            t = pending[0][0]
+            while pending and pending[0][0] <= t:
+                heapq.heappush(ready, heapq.heappop(pending)[1])
+
+        v = by_priority[heapq.heappop(ready)]
+        p = parent_l[v]
+        # A. Dependencia: el día después de que acabe el padre. B. Recurso: cuando quede libre
+        s = max(t, end_day[p] + 1) if p >= 0 else t
+        d = max(1, int(hours[v] / pace[r] * 7))
+        end_day[v] = s + d
+        heapq.heappush(free, (s + d, r))
+        for child in kids[ptr[v]:ptr[v + 1]]:
+            heapq.heappush(pending, (s + d, priority[child]))
+
+        sequence.append(v)
+        start.append(s)
+        duration.append(d)
+        assigned.append(r)
+
+    gantt = _gantt_frame(plan, np.asarray(sequence, dtype=np.int64),
+                         np.asarray(start, dtype=np.int64), np.asarray(duration, dtype=np.int64))
+    gantt['Recurso'] = np.asarray(names, dtype=object)[np.asarray(assigned, dtype=np.int64)]
+    return gantt
+
+
+# Elementos (iteraciones x tareas) por bloque de simulación: acota la memoria
+MC_CHUNK_ELEMENTS = 1 << 22
+# Desviación de las horas reales (Ley de Hofstadter): factor entre 0.9 y 1.5
+HOURS_FACTOR_RANGE = (0.9, 1.5)
+
+
+def _mc_chunks(iterations, n_tasks, seed=None, chunk_size=None):
+    """
+    Parte las iteraciones en bloques de tamaño fijo, cada uno con su propio
+    flujo aleatorio (SeedSequence.spawn). El resultado depende solo de
+    (seed, chunk_size), no de cómo ni dónde se ejecuten los bloques.
+    """
+    if chunk_size is None:
+        chunk_size = max(1, MC_CHUNK_ELEMENTS // max(1, n_tasks))
+    starts = np.arange(0, iterations, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    return [(int(a), int(min(a + chunk_size, iterations)), ss) for a, ss in zip(starts, seeds)]
+
+
+def _simulate_chunk(hours, prob, value, size, seed_seq):
+    """Un bloque de Monte Carlo: matrices (size x tareas) de factores y éxitos."""
+    rng = np.random.default_rng(seed_seq)
+    # 1. Incertidumbre de Tiempo (Ley de Hofstadter): factor entre 0.9 y 1.5
+    real_h = rng.uniform(*HOURS_FACTOR_RANGE, size=(size, len(hours))) @ hours
+    # 2. Incertidumbre de Éxito (Bernoulli): si falla, la tarea no suma valor
+    real_v = (rng.random((size, len(prob))) < prob) @ value
+    return real_h, real_v
+
+
+def run_monte_carlo(df_plan, iterations=500, seed=None, chunk_size=None, workers=1):
+    """
+    SIMULACIÓN DE RIESGO (MONTE CARLO)
+    ----------------------------------
+    Evalúa qué tan probable es cumplir el plan.
+    Vectorizado por bloques: cada bloque sortea de golpe la matriz completa
+    (iteraciones x tareas), así que 1M+ iteraciones tardan segundos.
+    Con `workers` > 1 los bloques se reparten en un pool de procesos; como
+    cada bloque tiene su propia semilla, el resultado es idéntico bit a bit
+    con cualquier número de procesos. Con `seed` es reproducible (y cacheable).
+    `df_plan` puede ser el plan como DataFrame o como `Portfolio`.
+    """
+    if seed is None:
+        with stage('simulate.monte_carlo'):
+            return _run_monte_carlo(df_plan, iterations, seed, chunk_size, workers)
+
+    # `workers` no cambia el resultado, así que no forma parte de la clave
+    key = fingerprint('run_monte_carlo', df_plan, MONTE_CARLO_COLUMNS, iterations, seed, chunk_size)
+    res = _cache_get('run_monte_carlo', key)
+    if res is None:
+        with stage('simulate.monte_carlo'):
+            res = _run_monte_carlo(df_plan, iterations, seed, chunk_size, workers)
+        RESULT_CACHE.put(key, res)
+    return res.copy()
+
+
+def _run_monte_carlo(df_plan, iterations, seed, chunk_size, workers):
+    # Usamos Score_Real (que ya tiene el ajuste de riesgo de Líder)
+    plan = as_portfolio(df_plan)
+    if plan.prob is None:
+        raise KeyError('Probabilidad')
+    hours, prob, value = plan.hours, plan.prob, plan.score
+
+    chunks = _mc_chunks(iterations, len(hours), seed, chunk_size)
+    sizes = [stop - start for start, stop, _ in chunks]
+    seeds = [seed_seq for _, _, seed_seq in chunks]
+    simulate = partial(_simulate_chunk, hours, prob, value)
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(simulate, sizes, seeds))
+    else:
+        partials = map(simulate, sizes, seeds)
+
+    # Fusionamos los bloques en su orden original
+    res_h = np.empty(iterations)
+    res_v = np.empty(iterations)
+    for (start, stop, _), (real_h, real_v) in zip(chunks, partials):
+        res_h[start:stop], res_v[start:stop] = real_h, real_v
+        instrumentation.progress(stop, iterations)
+
+    return pd.DataFrame({'Horas': res_h, 'Valor': res_v})
+
+
+class _QuantileSketch:
+    """
+    Histograma de rango fijo como sketch de cuantiles en streaming.
+    Como los límites de Horas y Valor se conocen de antemano, el error de
+    cualquier cuantil está acotado por el ancho de bin y la memoria es constante.
+    """
+
+    def __init__(self, lo, hi, bins):
+        self.lo = float(lo)
+        self.width = max(float(hi) - float(lo), 1e-12) / bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, x):
+        idx = np.clip(((x - self.lo) / self.width).astype(np.int64), 0, len(self.counts) - 1)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def value_at_rank(self, rank):
+        """Valor aproximado de la observación número `rank` (interpolando en el bin)."""
+        cum = np.cumsum(self.counts)
+        rank = float(np.clip(rank, 0, cum[-1]))
+        b = int(np.searchsorted(cum, rank))
+        b = min(b, len(cum) - 1)
+        below = cum[b - 1] if b > 0 else 0
+        frac = (rank - below) / self.counts[b] if self.counts[b] else 0.0
+        return self.lo + (b + frac) * self.width
+
+    def quantile(self, q, z=None):
+        """Cuantil q y, con z, su intervalo de confianza por estadísticos de orden."""
+        n = self.counts.sum()
+        est = self.value_at_rank(q * n)
+        if z is None:
+            return est
+        half = z * np.sqrt(n * q * (1 - q))
+        return est, self.value_at_rank(q * n - half), self.value_at_rank(q * n + half + 1)
+
+
+class _RunningMoments:
+    """Media y varianza acumuladas por bloques (fórmula de Chan / Welford)."""
+
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+
+    def update(self, x):
+        n_b, mean_b = len(x), float(np.mean(x))
+        m2_b = float(np.sum((x - mean_b) ** 2))
+        delta = mean_b - self.mean
+        total = self.n + n_b
+        self.mean += delta * n_b / total
+        self.m2 += m2_b + delta ** 2 * self.n * n_b / total
+        self.n = total
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+def run_monte_carlo_adaptive(df_plan, tol=0.005, confidence=0.95, seed=None, chunk_size=10_000,
+                             min_iterations=10_000, max_iterations=10_000_000, bins=1 << 14):
+    """
+    MONTE CARLO ADAPTATIVO (PARADA TEMPRANA)
+    ----------------------------------------
+    Simula bloques hasta que el intervalo de confianza de P50 y P90 (Horas y
+    Valor) es más estrecho que `tol` (relativo al propio percentil).
+    Memoria constante: sketches de cuantiles + momentos acumulados, sin
+    guardar las muestras. Los bloques usan los mismos flujos aleatorios que
+    `run_monte_carlo` con igual (seed, chunk_size).
+    """
+    plan = as_portfolio(df_plan)
+    if plan.prob is None:
+        raise KeyError('Probabilidad')
+    hours, prob, value = plan.hours, plan.prob, plan.score
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    sketches = {
+        'Horas': _QuantileSketch(0.9 * hours.sum(), 1.5 * hours.sum(), bins),
+        'Valor': _QuantileSketch(np.minimum(value, 0).sum(), np.maximum(value, 0).sum(), bins),
+    }
+    moments = {col: _RunningMoments() for col in sketches}
+
+    def intervals():
+        out = {}
+        for col, sketch in sketches.items():
+            for q in (0.5, 0.9):
+                out[(col, q)] = sketch.quantile(q, z)
+        return out
+
+    with stage('simulate.monte_carlo_adaptive'):
+        root = np.random.SeedSequence(seed)
+        done, converged = 0, False
+        while done < max_iterations:
+            size = min(chunk_size, max_iterations - done)
+            real_h, real_v = _simulate_chunk(hours, prob, value, size, root.spawn(1)[0])
+            for col, x in (('Horas', real_h), ('Valor', real_v)):
+                sketches[col].update(x)
+                moments[col].update(x)
+            done += size
+            instrumentation.progress(done, max_iterations)
+
+            if done >= min_iterations:
+                ci = intervals()
+                converged = all(hi - lo <= tol * max(abs(est), sketches[col].width)
+                                for (col, _), (est, lo, hi) in ci.items())
+                if converged:
+                    break
+    instrumentation.record('simulation', method='adaptive', iterations=done, converged=converged)
+
+    ci = intervals()
+    resumen = pd.DataFrame([{
+        'Variable': col,
+        'Media': moments[col].mean,
+        'Desv': moments[col].std,
+        'P50': ci[(col, 0.5)][0], 'P50_inf': ci[(col, 0.5)][1], 'P50_sup': ci[(col, 0.5)][2],
+        'P90': ci[(col, 0.9)][0], 'P90_inf': ci[(col, 0.9)][1], 'P90_sup': ci[(col, 0.9)][2],
+        'Ancho_P50': ci[(col, 0.5)][2] - ci[(col, 0.5)][1],
+        'Ancho_P90': ci[(col, 0.9)][2] - ci[(col, 0.9)][1],
+    } for col in sketches]).set_index('Variable')
+
+    return {'Iteraciones': done, 'Convergido': converged, 'Resumen': resumen}
+
+
+def _schedule_structure(gantt):
+    """
+    Extrae del Gantt (una sola vez) la estructura que fija las fechas:
+    padre de cada tarea y tarea anterior en el mismo recurso, ambos como
+    posiciones dentro del orden de ejecución.
+    """
+    n = len(gantt)
+    ids = gantt['ID'].to_numpy()
+    pre = gantt['Pre_req'].to_numpy()
+    parent = pd.Series(np.arange(n), index=ids).reindex(pre).fillna(-1).to_numpy().astype(np.int64)
+    parent[~(pre > 0)] = -1
+    if 'Recurso' in gantt.columns:
+        # Varios recursos: cada tarea espera a la anterior de SU recurso
+        prev = (pd.Series(np.arange(n)).groupby(gantt['Recurso'].to_numpy(), sort=False).shift(1)
+                .fillna(-1).to_numpy().astype(np.int64))
+    else:
+        # Un único recurso: cada tarea espera a la anterior del orden
+        prev = np.arange(n, dtype=np.int64) - 1
+    return parent, prev
+
+
+def _propagate_schedule(dur, parent, prev):
+    """
+    Propaga una matriz de duraciones (iteraciones x tareas, en días) por la
+    estructura del Gantt. Bucle sobre tareas, vectorizado sobre iteraciones.
+    Devuelve el día de fin de cada tarea y quién la retrasó (padre o recurso).
+    """
+    m, n = dur.shape
+    end = np.empty((m, n), dtype=np.int64)
+    driver = np.full((m, n), -1, dtype=np.int64)
+
+    for k in range(n):
+        start = np.zeros(m, dtype=np.int64)
+        if prev[k] >= 0:
+            # B. Restricción de Recurso: no antes de que el recurso esté libre
+            start = end[:, prev[k]].copy()
+            driver[:, k] = prev[k]
+        if parent[k] >= 0:
+            # A. Restricción de Dependencia: el día después de que acabe el padre
+            dep = end[:, parent[k]] + 1
+            bind = dep > start
+            start = np.where(bind, dep, start)
+            driver[bind, k] = parent[k]
+        end[:, k] = start + dur[:, k]
+
+    return end, driver
+
+
+def _count_chain(finish, links):
+    """Cuenta, por tarea, cuántas iteraciones la recorre la cadena que acaba en `finish`."""
+    m = len(finish)
+    rows = np.arange(m)
+    counts = np.zeros(links.shape[1], dtype=np.int64)
+    cur = finish.copy()
+    active = cur >= 0
+    while active.any():
+        np.add.at(counts, cur[active], 1)
+        cur = np.where(active, links[rows, np.maximum(cur, 0)], -1)
+        active = cur >= 0
+    return counts
+
+
+def simulate_schedule(df_plan, weekly_hours, iterations=1000, seed=None, chunk_size=None, resources=None):
+    """
+    MONTE CARLO DE CALENDARIO (FECHAS DE FIN)
+    -----------------------------------------
+    Calcula el Gantt una vez y hace pasar por su estructura (orden, Pre_req y
+    recurso) miles de vectores de duraciones sorteadas (factor 0.9-1.5).
+    Devuelve la distribución de la fecha de fin, P50/P90 y la frecuencia con
+    la que cada tarea queda en el camino crítico:
+      - 'Criticidad': cadena real que fija la fecha de fin (dependencias y
+        recurso). Con un único recurso todas las tareas están en ella.
+      - 'Criticidad_Dependencias': cadena de Pre_req más larga (CPM clásico,
+        sin limitar recursos): señala los cuellos de botella estructurales.
+    Con `resources` (ver calculate_parallel_gantt) simula el Gantt multi-recurso
+    y cada tarea avanza al ritmo del recurso que la tiene asignada.
+    """
+    if resources is None:
+        gantt = calculate_sequential_gantt(df_plan, weekly_hours)
+    else:
+        gantt = calculate_parallel_gantt(df_plan, resources)
+    if gantt.empty:
+        return {'Fin': pd.Series(dtype='datetime64[ns]', name='Fin'), 'P50': None, 'P90': None,
+                'Criticidad': pd.DataFrame(columns=['ID', 'Tarea', 'Criticidad', 'Criticidad_Dependencias'])}
+
+    n = len(gantt)
+    parent, prev = _schedule_structure(gantt)
+    plan = as_portfolio(df_plan)
+    hours = pd.Series(plan.hours, index=plan.ids).reindex(gantt['ID']).to_numpy(dtype=float)
+    if resources is None:
+        pace = max(1, weekly_hours)
+    else:
+        # Horas/semana del recurso asignado a cada tarea
+        names, capacity = _resource_table(resources)
+        pace = np.maximum(1, pd.Series(capacity, index=names).reindex(gantt['Recurso']).to_numpy())
+    no_links = np.full(n, -1, dtype=np.int64)
+
+    finish_days = np.empty(iterations, dtype=np.int64)
+    critical = np.zeros(n, dtype=np.int64)
+    critical_dep = np.zeros(n, dtype=np.int64)
+    with stage('simulate.schedule'):
+        for start, stop, seed_seq in _mc_chunks(iterations, n, seed, chunk_size):
+            rng = np.random.default_rng(seed_seq)
+            t_factor = rng.uniform(*HOURS_FACTOR_RANGE, size=(stop - start, n))
+            # Misma conversión que el Gantt: semanas -> días, mínimo 1 día
+            dur = np.maximum(1, np.floor(hours * t_factor / pace * 7)).astype(np.int64)
+
+            end, driver = _propagate_schedule(dur, parent, prev)
+            last = end.argmax(axis=1)
+            finish_days[start:stop] = end[np.arange(stop - start), last]
+            critical += _count_chain(last, driver)
+
+            # CPM sin recursos: solo cuentan las dependencias
+            end_dep, _ = _propagate_schedule(dur, parent, no_links)
+            critical_dep += _count_chain(end_dep.argmax(axis=1), np.broadcast_to(parent, end_dep.shape))
+            instrumentation.progress(stop, iterations)
+
+    base = np.datetime64(PLAN_START, 'D')
+    fin = pd.Series(base + finish_days.astype('timedelta64[D]'), name='Fin')
+    p50, p90 = np.ceil(np.percentile(finish_days, [50, 90])).astype(np.int64) if iterations else (0, 0)
+
+    return {
+        'Fin': fin,
+        'P50': pd.Timestamp(base + np.timedelta64(p50, 'D')),
+        'P90': pd.Timestamp(base + np.timedelta64(p90, 'D')),
+        'Criticidad': pd.DataFrame({
+            'ID': gantt['ID'].to_numpy(),
+            'Tarea': gantt['Tarea'].to_numpy(),
+            'Criticidad': critical / max(1, iterations),
+            'Criticidad_Dependencias': critical_dep / max(1, iterations),
+        }),
+    }
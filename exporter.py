@@ -0,0 +1,129 @@
+import io
+import zipfile
+
+from cache import ResultCache, fingerprint
+import instrumentation
+from instrumentation import stage
+from engine import calculate_sequential_gantt, calculate_parallel_gantt, run_monte_carlo
+
+# Formato -> (etiqueta, MIME, extensión). CSV y Parquet van en un zip (un fichero por hoja)
+EXPORT_FORMATS = {
+    'xlsx': ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    'csv': ("CSV (zip)", "application/zip", "zip"),
+    'parquet': ("Parquet (zip)", "application/zip", "zip"),
+}
+
+AUDIT_COLUMNS = ['ID', 'Actividad', 'Score_Real', 'Probabilidad', 'Probabilidad_Original', 'Eficiencia']
+
+# Filas por bloque al volcar: la memoria extra no crece con el tamaño del plan
+CHUNK_ROWS = 5_000
+
+# Semilla fija: el resumen de riesgo exportado es reproducible (y cacheable)
+EXPORT_SEED = 2026
+EXPORT_MC_ITERATIONS = 5_000
+
+# Pocos ficheros y potencialmente grandes: caché propia, separada de la del motor
+EXPORT_CACHE = ResultCache(maxsize=8)
+
+
+def export_sheets(df, df_opt, weekly_hours, resources=None):
+    """
+    HOJAS DEL PAQUETE DE EXPORTACIÓN
+    --------------------------------
+    Generador perezoso de (nombre, DataFrame): Plan, Gantt, Riesgo (resumen
+    Monte Carlo) y Auditoría. Cada hoja se calcula justo antes de escribirla,
+    así que solo una está en memoria a la vez. Gantt y Monte Carlo salen de
+    la caché del motor si la app ya los calculó.
+    """
+    yield 'Plan', df_opt
+
+    if resources:
+        yield 'Gantt', calculate_parallel_gantt(df_opt, resources)
+    else:
+        yield 'Gantt', calculate_sequential_gantt(df_opt, weekly_hours)
+
+    mc = run_monte_carlo(df_opt, iterations=EXPORT_MC_ITERATIONS, seed=EXPORT_SEED)
+    summary = mc.describe(percentiles=[0.1, 0.5, 0.9]).T.rename(columns={'10%': 'P10', '50%': 'P50', '90%': 'P90'})
+    yield 'Riesgo', summary.rename_axis('Variable').reset_index()
+
+    cols = [c for c in AUDIT_COLUMNS if c in df.columns]
+    audit = df[cols].assign(Seleccionada=df['ID'].isin(df_opt['ID']).map({True: 'SI', False: 'NO'}))
+    yield 'Auditoria', audit.sort_values(by='Score_Real', ascending=False)
+
+
+def _row_blocks(frame, chunk_rows=CHUNK_ROWS):
+    """Filas como tuplas nativas (NaN -> None), convirtiendo un bloque cada vez."""
+    for start in range(0, len(frame), chunk_rows):
+        block = frame.iloc[start:start + chunk_rows]
+        yield from block.astype(object).where(block.notna(), None).itertuples(index=False, name=None)
+
+
+def write_xlsx(sheets, fh, chunk_rows=CHUNK_ROWS):
+    """
+    Excel en modo constant_memory de xlsxwriter: cada fila se vuelca a disco al
+    escribir la siguiente, así que la memoria no depende del número de filas.
+    Exige escribir fila a fila y en orden (pandas.to_excel escribe por columnas).
+    """
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(fh, {'constant_memory': True, 'nan_inf_to_errors': True,
+                                  'default_date_format': 'yyyy-mm-dd', 'remove_timezone': True})
+    header = wb.add_format({'bold': True})
+    for name, frame in sheets:
+        ws = wb.add_worksheet(name[:31])
+        ws.write_row(0, 0, [str(c) for c in frame.columns], header)
+        for r, row in enumerate(_row_blocks(frame, chunk_rows), start=1):
+            ws.write_row(r, 0, row)
+    wb.close()
+
+
+def write_csv_zip(sheets, fh, chunk_rows=CHUNK_ROWS):
+    """Un CSV por hoja dentro de un zip, escrito por bloques directamente al stream."""
+    with zipfile.ZipFile(fh, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, frame in sheets:
+            with zf.open(f"{name}.csv", 'w') as raw, io.TextIOWrapper(raw, encoding='utf-8', newline='') as text:
+                frame.to_csv(text, index=False, chunksize=chunk_rows)
+
+
+def write_parquet_zip(sheets, fh, chunk_rows=CHUNK_ROWS):
+    """Un Parquet por hoja dentro de un zip; cada bloque es un row group (requiere pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Parquet ya va comprimido: el zip solo empaqueta
+    with zipfile.ZipFile(fh, 'w', zipfile.ZIP_STORED) as zf:
+        for name, frame in sheets:
+            schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            with zf.open(f"{name}.parquet", 'w') as raw:
+                writer = pq.ParquetWriter(raw, schema)
+                for start in range(0, max(1, len(frame)), chunk_rows):
+                    block = frame.iloc[start:start + chunk_rows]
+                    writer.write_table(pa.Table.from_pandas(block, schema=schema, preserve_index=False))
+                writer.close()
+
+
+WRITERS = {'xlsx': write_xlsx, 'csv': write_csv_zip, 'parquet': write_parquet_zip}
+
+
+def export_plan(df, df_opt, fmt='xlsx', weekly_hours=10, resources=None):
+    """
+    EXPORTACIÓN BAJO DEMANDA
+    ------------------------
+    Genera el paquete (Plan, Gantt, Riesgo, Auditoría) en el formato pedido y
+    devuelve los bytes. Cacheado por huella del plan, de la cartera auditada y
+    de los parámetros: volver a descargar el mismo plan no regenera nada.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Formato de exportación desconocido: {fmt}")
+
+    audit_key = fingerprint('export_audit', df, AUDIT_COLUMNS)
+    key = fingerprint('export_plan', df_opt, list(df_opt.columns), fmt, weekly_hours, resources, audit_key)
+    data = EXPORT_CACHE.get(key)
+    instrumentation.count(f"cache.export_plan.{'miss' if data is None else 'hit'}")
+    if data is None:
+        with stage(f'export.{fmt}'):
+            buffer = io.BytesIO()
+            WRITERS[fmt](export_sheets(df, df_opt, weekly_hours, resources), buffer)
+            data = buffer.getvalue()
+        EXPORT_CACHE.put(key, data)
+    return data
@@ -0,0 +1,165 @@
+import json
+import time
+import logging
+import contextvars
+from collections import Counter
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Estadísticas activas en este contexto (None = instrumentación apagada)
+_ACTIVE = contextvars.ContextVar('spo_stats', default=None)
+# Quién escucha el avance de la operación en curso (None = nadie)
+_PROGRESS = contextvars.ContextVar('spo_progress', default=None)
+
+
+class RunStats:
+    """
+    ESTADÍSTICAS DE UNA EJECUCIÓN
+    -----------------------------
+    Tiempos por etapa (llamadas y segundos), contadores (aciertos de caché...)
+    y registros estructurados por sección ('solver', 'model', ...).
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = Counter()
+        self.records = {}
+
+    def add_time(self, name, seconds):
+        calls, total = self.stages.get(name, (0, 0.0))
+        self.stages[name] = (calls + 1, total + seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def record(self, section, **fields):
+        self.records.setdefault(section, []).append(fields)
+
+    def last(self, section):
+        """Último registro de una sección (p. ej. el último solve) o None."""
+        entries = self.records.get(section)
+        return entries[-1] if entries else None
+
+    def to_dict(self):
+        return {
+            'stages': {name: {'calls': calls, 'seconds': round(total, 6)}
+                       for name, (calls, total) in self.stages.items()},
+            'counters': dict(self.counters),
+            'records': self.records,
+        }
+
+    def stage_frame(self):
+        """Tabla de etapas ordenada por tiempo total (para el panel de diagnóstico)."""
+        rows = [{'Etapa': name, 'Llamadas': calls, 'Segundos': total}
+                for name, (calls, total) in self.stages.items()]
+        frame = pd.DataFrame(rows, columns=['Etapa', 'Llamadas', 'Segundos'])
+        return frame.sort_values('Segundos', ascending=False, ignore_index=True)
+
+
+class collect_stats:
+    """
+    Activa la instrumentación en este bloque y devuelve el RunStats:
+
+        with collect_stats() as stats:
+            plan = run_optimization(df, 300)
+        stats.to_dict()
+
+    Al salir emite las estadísticas como un log estructurado (JSON).
+    """
+
+    def __init__(self, log=True):
+        self.stats = RunStats()
+        self.log = log
+
+    def __enter__(self):
+        self._token = _ACTIVE.set(self.stats)
+        return self.stats
+
+    def __exit__(self, *exc):
+        _ACTIVE.reset(self._token)
+        if self.log:
+            logger.info("spo_stats %s", json.dumps(self.stats.to_dict(), default=str),
+                        extra={'spo_stats': self.stats.to_dict()})
+        return False
+
+
+class stage:
+    """Cronometra una etapa si hay estadísticas activas; si no, no hace nada."""
+
+    __slots__ = ('name', 'stats', 't0')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.stats = _ACTIVE.get()
+        if self.stats is not None:
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.stats is not None:
+            seconds = time.perf_counter() - self.t0
+            self.stats.add_time(self.name, seconds)
+            logger.debug("stage %s %.6f", self.name, seconds, extra={'stage': self.name, 'seconds': seconds})
+        return False
+
+
+def current_stats():
+    return _ACTIVE.get()
+
+
+def enabled():
+    return _ACTIVE.get() is not None
+
+
+def count(name, n=1):
+    stats = _ACTIVE.get()
+    if stats is not None:
+        stats.count(name, n)
+
+
+def record(section, **fields):
+    stats = _ACTIVE.get()
+    if stats is not None:
+        stats.record(section, **fields)
+        logger.debug("%s %s", section, json.dumps(fields, default=str), extra={'spo_record': {section: fields}})
+
+
+class listen_progress:
+    """
+    Durante el bloque, cada progress(done, total) del motor llama a
+    `callback(done, total)`. El callback puede lanzar una excepción para
+    interrumpir la operación (así cancela el ejecutor de trabajos).
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __enter__(self):
+        self._token = _PROGRESS.set(self.callback)
+        return self.callback
+
+    def __exit__(self, *exc):
+        _PROGRESS.reset(self._token)
+        return False
+
+
+def current_progress():
+    return _PROGRESS.get()
+
+
+def progress(done, total):
+    """Avance de la operación en curso; sin nadie escuchando no hace nada."""
+    callback = _PROGRESS.get()
+    if callback is not None:
+        callback(done, total)
+
+
+def profile_call(fn, *args, **kwargs):
+    """Ejecuta fn(*args, **kwargs) instrumentada y devuelve (resultado, RunStats)."""
+    with collect_stats() as stats:
+        result = fn(*args, **kwargs)
+    return result, stats
@@ -0,0 +1,233 @@
+import time
+import hashlib
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from instrumentation import collect_stats
+
+# Estados visibles de un trabajo
+PENDING, RUNNING, DONE, CANCELLED, FAILED = 'en cola', 'en curso', 'terminado', 'cancelado', 'error'
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras corría (en el siguiente punto de progreso)."""
+
+
+def job_key(fn, *args, **kwargs):
+    """
+    CLAVE DE UN TRABAJO
+    -------------------
+    Hash de la función y de sus argumentos. Los DataFrames/Series/arrays (y
+    las Portfolio) se hashean por contenido (como `fingerprint`), así que dos llamadas con los
+    mismos datos son el mismo trabajo aunque vengan de objetos distintos.
+    """
+    h = hashlib.blake2b(digest_size=16)
+
+    def feed(obj):
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            labels = list(obj.columns) if isinstance(obj, pd.DataFrame) else [obj.name]
+            h.update(repr((type(obj).__name__, obj.shape, labels)).encode())
+            h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        elif hasattr(obj, 'content_digest'):  # Portfolio: su hash por filas ya está calculado
+            h.update(repr(('Portfolio', len(obj))).encode())
+            h.update(obj.content_digest(list(obj.columns))[1])
+        elif isinstance(obj, np.ndarray):
+            h.update(repr((obj.dtype.str, obj.shape)).encode())
+            h.update(np.ascontiguousarray(obj).tobytes())
+        elif isinstance(obj, (list, tuple)):
+            h.update(f"{type(obj).__name__}[{len(obj)}]".encode())
+            for item in obj:
+                feed(item)
+        elif callable(obj):
+            h.update(f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}".encode())
+        else:
+            # 300 y 300.0 son el mismo parámetro
+            if isinstance(obj, (int, float, np.integer, np.floating)) and not isinstance(obj, bool):
+                obj = float(obj)
+            h.update(repr(obj).encode())
+
+    feed(fn)
+    feed(args)
+    feed(sorted(kwargs.items()))
+    return h.hexdigest()
+
+
+def sweep(fn, param, values, *args, **kwargs):
+    """
+    Llama a fn(*args, **{param: v}, **kwargs) para cada valor (p. ej. un
+    barrido de run_optimization por horas) e informa del avance por punto;
+    el progreso interno de cada llamada se reparte dentro de su tramo.
+    """
+    values = list(values)
+    total = max(1, len(values))
+    results = []
+    for j, v in enumerate(values):
+        outer = instrumentation.current_progress()
+        inner = None if outer is None else (lambda d, t, j=j: outer(j + d / max(1, t), total))
+        with instrumentation.listen_progress(inner):
+            results.append(fn(*args, **{param: v}, **kwargs))
+        instrumentation.progress(j + 1, total)
+    return results
+
+
+class Job:
+    """
+    TRABAJO EN SEGUNDO PLANO
+    ------------------------
+    Una llamada al motor corriendo en el pool. Guarda el avance (lo que
+    reporta el motor vía instrumentation.progress), el estado, los tiempos,
+    las estadísticas de la ejecución y, al terminar, el resultado o el error.
+    """
+
+    def __init__(self, key, label):
+        self.key = key
+        self.label = label
+        self.future = None
+        self.stats = None
+        self.submitted = time.perf_counter()
+        self.started = self.finished = None
+        self._done_units, self._total_units = 0.0, 1.0
+        self._cancel = threading.Event()
+
+    def _report(self, done, total):
+        # Punto de cancelación: el motor sale por aquí sin dejar nada a medias en la caché
+        if self._cancel.is_set():
+            raise JobCancelled(self.label)
+        self._done_units, self._total_units = done, total
+
+    @property
+    def progress(self):
+        """Fracción completada en [0, 1]."""
+        if self.status == DONE:
+            return 1.0
+        return float(min(1.0, max(0.0, self._done_units / max(self._total_units, 1e-12))))
+
+    @property
+    def status(self):
+        f = self.future
+        if f.cancelled():
+            return CANCELLED
+        if not f.done():
+            return PENDING if self.started is None else RUNNING
+        if isinstance(f.exception(), JobCancelled):
+            return CANCELLED
+        return FAILED if f.exception() is not None else DONE
+
+    @property
+    def elapsed(self):
+        """Segundos corriendo (hasta ahora o hasta que terminó)."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        """Cancela: si aún está en cola no llega a empezar; si corre, para en su siguiente punto de progreso."""
+        self._cancel.set()
+        self.future.cancel()
+
+    def result(self, timeout=None):
+        """Resultado (espera si hace falta). Lanza JobCancelled o el error del trabajo."""
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise JobCancelled(self.label) from None
+
+    @property
+    def error(self):
+        """Excepción del trabajo si falló (None si no)."""
+        if not self.future.done() or self.future.cancelled():
+            return None
+        exc = self.future.exception()
+        return None if isinstance(exc, JobCancelled) else exc
+
+
+class JobManager:
+    """
+    EJECUTOR DE TRABAJOS EN SEGUNDO PLANO
+    -------------------------------------
+    Pool de hilos para las llamadas largas del motor (curva de valor, Monte
+    Carlo, simulación de calendario, barridos). Hilos y no procesos: NumPy y
+    CBC sueltan el GIL, y así el avance, la cancelación y la caché del motor
+    se comparten sin serializar nada.
+      - submit() deduplica: un trabajo idéntico en curso o terminado se reutiliza.
+      - Se conservan los `keep` últimos trabajos terminados para consultarlos.
+    """
+
+    def __init__(self, max_workers=2, keep=32):
+        self.keep = keep
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='spo-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Lanza fn(*args, **kwargs) en segundo plano (o devuelve el trabajo idéntico ya lanzado)."""
+        key = job_key(fn, *args, **kwargs)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status not in (CANCELLED, FAILED):
+                self._jobs.move_to_end(key)
+                instrumentation.count('jobs.dedup')
+                return job
+
+            func = getattr(fn, 'func', fn)  # functools.partial
+            job = Job(key, getattr(func, '__name__', repr(func)))
+            self._jobs[key] = job
+            job.future = self._pool.submit(self._run, job, fn, args, kwargs)
+            self._trim()
+        instrumentation.count('jobs.submitted')
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.started = time.perf_counter()
+        try:
+            # Contexto limpio: ni el progreso ni las estadísticas de otro trabajo (o de la app) se cuelan
+            return contextvars.Context().run(self._call, job, fn, args, kwargs)
+        finally:
+            job.finished = time.perf_counter()
+
+    @staticmethod
+    def _call(job, fn, args, kwargs):
+        with collect_stats(log=False) as job.stats, instrumentation.listen_progress(job._report):
+            job._report(0, 1)
+            return fn(*args, **kwargs)
+
+    def _trim(self):
+        finished = [k for k, j in self._jobs.items() if j.done()]
+        for k in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[k]
+
+    def get(self, key):
+        """Trabajo con esa clave (en curso o terminado) o None."""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def lookup(self, fn, *args, **kwargs):
+        """Como get(), pero a partir de la llamada: ¿hay un trabajo para esto?"""
+        return self.get(job_key(fn, *args, **kwargs))
+
+    def jobs(self):
+        """Tabla de trabajos (para el panel de diagnóstico)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return pd.DataFrame([{'Trabajo': j.label, 'Estado': j.status, 'Progreso': j.progress, 'Segundos': j.elapsed}
+                             for j in jobs], columns=['Trabajo', 'Estado', 'Progreso', 'Segundos'])
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if not job.done():
+                job.cancel()
+
+    def shutdown(self, wait=True):
+        self.cancel_all()
+        self._pool.shutdown(wait=wait)
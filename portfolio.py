@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+
+def resolve_parent(ids, pre_req):
+    """
+    Traduce Pre_req (ID del padre) a posiciones enteras (int32) dentro de `ids`.
+    Devuelve -1 cuando la tarea no tiene prerrequisito válido.
+    """
+    n = len(ids)
+    # Igual que dict(zip(ID, index)): si hay IDs repetidos gana el último
+    id_pos = pd.Series(np.arange(n, dtype=np.int32), index=ids)
+    id_pos = id_pos[~id_pos.index.duplicated(keep='last')]
+
+    parent = id_pos.reindex(pre_req).fillna(-1).to_numpy().astype(np.int32)
+    parent[~(pre_req > 0)] = -1
+    return parent
+
+
+def _frozen(values, dtype=float):
+    """Copia contigua y de solo lectura (no comparte memoria con el DataFrame)."""
+    array = np.array(values, dtype=dtype, copy=True, order='C')
+    array.flags.writeable = False
+    return array
+
+
+class Portfolio:
+    """
+    CARTERA COMPACTA (SOLO LECTURA)
+    -------------------------------
+    Lo que el motor necesita de una cartera, calculado una sola vez: arrays
+    NumPy contiguos de Score_Real, Horas, Coste y Probabilidad, el índice del
+    padre (int32, resuelto desde Pre_req al primer uso) y la huella de
+    contenido por columnas para la caché. Las columnas de texto (Actividad,
+    Tipo...) se leen del DataFrame de origen, que se referencia sin copiarlo.
+    Todas las funciones del motor que reciben una cartera o un plan la aceptan
+    en lugar del DataFrame; take() da la sub-cartera de un plan sin tocar pandas.
+    """
+
+    __slots__ = ('ids', 'pre_req', 'score', 'hours', 'cost', 'prob', 'rows', 'attrs',
+                 '_source', '_parent', '_digests')
+
+    def __init__(self, source, rows, ids, pre_req, score, hours, cost, prob, parent=None):
+        for name, value in (('_source', source), ('rows', rows), ('ids', ids), ('pre_req', pre_req),
+                            ('score', score), ('hours', hours), ('cost', cost), ('prob', prob),
+                            ('_parent', parent), ('attrs', {}), ('_digests', {})):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Portfolio es inmutable")
+
+    def __reduce__(self):
+        # pickle (pool de procesos del batch) sin pasar por __setattr__
+        return (Portfolio, (self._source, self.rows, self.ids, self.pre_req, self.score, self.hours,
+                            self.cost, self.prob, self._parent))
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Cartera a partir de un DataFrame puntuado (como el de load_data). Solo
+        Score_Real y Horas son obligatorias: sin ID/Pre_req no hay dependencias,
+        sin Coste cuesta 0 y sin Probabilidad `prob` es None.
+        """
+        n = len(df)
+        ids = df['ID'].to_numpy() if 'ID' in df.columns else np.arange(1, n + 1)
+        pre_req = df['Pre_req'].to_numpy() if 'Pre_req' in df.columns else np.zeros(n, dtype=np.int64)
+        prob = _frozen(df['Probabilidad']) if 'Probabilidad' in df.columns else None
+        # Coste solo lo usa la optimización con presupuesto: sin la columna, todo gratis
+        cost = _frozen(df['Coste']) if 'Coste' in df.columns else _frozen(np.zeros(n))
+        if 'ID' not in df.columns or 'Pre_req' not in df.columns:
+            parent = np.full(n, -1, dtype=np.int32)
+            parent.flags.writeable = False
+        else:
+            parent = None
+        return cls(df, None, _frozen(ids, ids.dtype), _frozen(pre_req, pre_req.dtype),
+                   _frozen(df['Score_Real']), _frozen(df['Horas']), cost, prob, parent)
+
+    @property
+    def parent(self):
+        """Posición del prerrequisito de cada tarea (-1 = sin prerrequisito)."""
+        if self._parent is None:
+            parent = resolve_parent(self.ids, self.pre_req)
+            parent.flags.writeable = False
+            object.__setattr__(self, '_parent', parent)
+        return self._parent
+
+    def __len__(self):
+        return len(self.score)
+
+    def __contains__(self, column):
+        return column in self._source.columns
+
+    def __repr__(self):
+        return f"Portfolio({len(self)} actividades, valor {self.score.sum():.1f}, {self.hours.sum():.0f} h)"
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    @property
+    def columns(self):
+        return self._source.columns
+
+    @property
+    def frame(self):
+        """Filas de la cartera como DataFrame (el original si es la cartera completa)."""
+        return self._source if self.rows is None else self._source.iloc[self.rows]
+
+    def values(self, column):
+        """Valores de una columna del origen para las filas de la cartera."""
+        values = self._source[column]
+        # Primero las filas y luego a NumPy: no se materializa la columna entera (texto)
+        return (values if self.rows is None else values.take(self.rows)).to_numpy()
+
+    def take(self, positions):
+        """Sub-cartera (p. ej. el plan elegido); los Pre_req se resuelven dentro de ella."""
+        positions = np.asarray(positions, dtype=np.int64)
+        rows = positions if self.rows is None else self.rows[positions]
+        prob = None if self.prob is None else _frozen(self.prob[positions])
+        return Portfolio(self._source, rows, _frozen(self.ids[positions], self.ids.dtype),
+                         _frozen(self.pre_req[positions], self.pre_req.dtype), _frozen(self.score[positions]),
+                         _frozen(self.hours[positions]), _frozen(self.cost[positions]), prob)
+
+    def content_digest(self, columns):
+        """
+        (columnas presentes, hash por filas) como lo calcula cache.fingerprint,
+        pero una sola vez por juego de columnas: la cartera no cambia.
+        """
+        key = tuple(columns)
+        if key not in self._digests:
+            cols = [c for c in columns if c in self._source.columns]
+            frame = self._source[cols]
+            if self.rows is not None:
+                frame = frame.iloc[self.rows]
+            data = pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes()
+            self._digests[key] = (cols, data)
+        return self._digests[key]
+
+
+def as_portfolio(df):
+    """La propia cartera, o una construida al vuelo desde un DataFrame."""
+    return df if isinstance(df, Portfolio) else Portfolio.from_frame(df)
@@ -0,0 +1,228 @@
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Sube este número si cambia el esquema (PRAGMA user_version)
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    id           INTEGER PRIMARY KEY,
+    created_at   TEXT    NOT NULL,
+    kind         TEXT    NOT NULL,
+    name         TEXT    NOT NULL,
+    portfolio    TEXT,
+    hours        REAL    NOT NULL,
+    budget       REAL,
+    weekly_hours REAL,
+    value        REAL    NOT NULL,
+    cost         REAL    NOT NULL,
+    used_hours   REAL    NOT NULL,
+    n_items      INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS decision_items (
+    decision_id  INTEGER NOT NULL REFERENCES decisions(id) ON DELETE CASCADE,
+    activity_id  INTEGER NOT NULL,
+    PRIMARY KEY (decision_id, activity_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_decisions_kind_created ON decisions(kind, created_at);
+CREATE INDEX IF NOT EXISTS idx_decisions_created ON decisions(created_at);
+CREATE INDEX IF NOT EXISTS idx_decisions_name ON decisions(name);
+CREATE INDEX IF NOT EXISTS idx_decisions_params ON decisions(hours, budget);
+CREATE INDEX IF NOT EXISTS idx_decisions_portfolio ON decisions(portfolio, created_at);
+CREATE INDEX IF NOT EXISTS idx_items_activity ON decision_items(activity_id);
+"""
+
+# Pasos para llevar una base existente de la versión N-1 a la N (antes de aplicar SCHEMA)
+MIGRATIONS = {
+    # Cartera (libro/hoja) de la que sale cada decisión; NULL en las guardadas antes
+    2: "ALTER TABLE decisions ADD COLUMN portfolio TEXT;",
+}
+
+# Columnas de la tabla -> nombres que ve la app (mismo vocabulario que el resto del SPO)
+DISPLAY_NAMES = {
+    'id': 'ID', 'created_at': 'Fecha', 'kind': 'Tipo', 'name': 'Nombre', 'portfolio': 'Cartera', 'hours': 'Horas',
+    'budget': 'Presupuesto', 'weekly_hours': 'Horas_Semana', 'value': 'Valor', 'cost': 'Coste',
+    'used_hours': 'Horas_Usadas', 'n_items': 'Actividades',
+}
+
+KINDS = ('escenario', 'historial')
+
+
+class DecisionStore:
+    """
+    ALMACÉN SQLITE DE DECISIONES Y ESCENARIOS
+    -----------------------------------------
+    Sustituye al CSV de historial y a los escenarios en session_state.
+    Cada decisión guarda su cartera, sus parámetros, totales y los IDs de
+    las actividades elegidas. WAL permite leer mientras se escribe; las
+    consultas filtran y paginan en SQL (índices por fecha, nombre y
+    parámetros), así que nunca se carga la tabla entera en pandas.
+    """
+
+    def __init__(self, path="spo_decisiones.db"):
+        self.path = path
+        if path != ':memory:' and os.path.dirname(os.path.abspath(path)):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Streamlit atiende cada rerun en un hilo: una conexión compartida con cerrojo
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                with self._conn:
+                    if version:
+                        # Base existente: antes las columnas nuevas (SCHEMA crea índices sobre ellas)
+                        for step in range(version + 1, SCHEMA_VERSION + 1):
+                            self._conn.executescript(MIGRATIONS[step])
+                    self._conn.executescript(SCHEMA)
+                    self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- ESCRITURA ---
+
+    def record(self, kind, name, hours, budget, value, cost, used_hours, activity_ids,
+               weekly_hours=None, created_at=None, portfolio=None):
+        """
+        Guarda una decisión (con los IDs de sus actividades) y devuelve su id.
+        `portfolio` es la cartera de la que salen esos IDs.
+        """
+        return self.record_many([dict(kind=kind, name=name, hours=hours, budget=budget, value=value, cost=cost,
+                                      used_hours=used_hours, activity_ids=activity_ids,
+                                      weekly_hours=weekly_hours, created_at=created_at, portfolio=portfolio)])[0]
+
+    def record_many(self, decisions):
+        """
+        Escritura por lotes: todas las decisiones (y sus actividades) en una
+        sola transacción con executemany. Devuelve los ids asignados.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        ids = []
+        with self._lock, self._conn:
+            cur = self._conn.cursor()
+            items = []
+            for d in decisions:
+                if d['kind'] not in KINDS:
+                    raise ValueError(f"Tipo de decisión desconocido: {d['kind']}")
+                activity_ids = sorted({int(a) for a in d.get('activity_ids', ())})
+                cur.execute(
+                    "INSERT INTO decisions (created_at, kind, name, portfolio, hours, budget, weekly_hours, value,"
+                    " cost, used_hours, n_items) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (d.get('created_at') or now, d['kind'], str(d['name']),
+                     None if d.get('portfolio') is None else str(d['portfolio']), float(d['hours']),
+                     None if d.get('budget') is None else float(d['budget']),
+                     None if d.get('weekly_hours') is None else float(d['weekly_hours']),
+                     float(d['value']), float(d['cost']), float(d['used_hours']),
+                     int(d.get('n_items') or len(activity_ids))))
+                ids.append(cur.lastrowid)
+                items.extend((cur.lastrowid, a) for a in activity_ids)
+            cur.executemany("INSERT INTO decision_items (decision_id, activity_id) VALUES (?, ?)", items)
+        return ids
+
+    def delete(self, kind=None, ids=None, portfolio=None):
+        """Borra decisiones (por tipo, cartera y/o ids); sus actividades caen en cascada."""
+        where, params = self._where(kind=kind, portfolio=portfolio)
+        if ids is not None:
+            ids = [int(i) for i in ids]
+            where.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        sql = "DELETE FROM decisions" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    # --- LECTURA ---
+
+    @staticmethod
+    def _where(kind=None, name=None, portfolio=None, date_from=None, date_to=None, min_hours=None, max_hours=None,
+               max_budget=None, activity_id=None):
+        where, params = [], []
+        if kind is not None:
+            where.append("kind = ?")
+            params.append(kind)
+        if portfolio is not None:
+            where.append("portfolio = ?")
+            params.append(str(portfolio))
+        if name:
+            # Prefijo: aprovecha idx_decisions_name
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append(name.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if date_from is not None:
+            where.append("created_at >= ?")
+            params.append(str(date_from))
+        if date_to is not None:
+            where.append("created_at < ?")
+            params.append(str(date_to))
+        if min_hours is not None:
+            where.append("hours >= ?")
+            params.append(float(min_hours))
+        if max_hours is not None:
+            where.append("hours <= ?")
+            params.append(float(max_hours))
+        if max_budget is not None:
+            where.append("budget IS NOT NULL AND budget <= ?")
+            params.append(float(max_budget))
+        if activity_id is not None:
+            where.append("id IN (SELECT decision_id FROM decision_items WHERE activity_id = ?)")
+            params.append(int(activity_id))
+        return where, params
+
+    def query(self, limit=50, offset=0, newest_first=True, **filters):
+        """
+        Una página de decisiones que cumplen los filtros (kind, name = prefijo,
+        portfolio, date_from/date_to, min_hours/max_hours, max_budget, activity_id).
+        Solo la página llega a pandas.
+        """
+        where, params = self._where(**filters)
+        sql = ("SELECT " + ", ".join(DISPLAY_NAMES) + " FROM decisions"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + f" ORDER BY created_at {'DESC' if newest_first else 'ASC'}, id {'DESC' if newest_first else 'ASC'}"
+               + " LIMIT ? OFFSET ?")
+        with self._lock:
+            rows = self._conn.execute(sql, params + [int(limit), int(offset)]).fetchall()
+        return pd.DataFrame(rows, columns=list(DISPLAY_NAMES.values()))
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        sql = "SELECT COUNT(*) FROM decisions" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def items(self, decision_id):
+        """IDs de las actividades elegidas en una decisión."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT activity_id FROM decision_items WHERE decision_id = ? ORDER BY activity_id",
+                (int(decision_id),)).fetchall()
+        return [r[0] for r in rows]
+
+    # --- MIGRACIÓN ---
+
+    def import_history_csv(self, csv_path):
+        """
+        Importa el antiguo historial_decisiones.csv (una sola vez: solo si aún
+        no hay historial en la base). El CSV no guardaba IDs, solo el número.
+        """
+        if not os.path.exists(csv_path) or self.count(kind='historial'):
+            return 0
+        old = pd.read_csv(csv_path)
+        budget = pd.to_numeric(old['Presupuesto'], errors='coerce')  # "Ilimitado" -> NaN
+        decisions = [dict(kind='historial', name=row.Escenario, hours=row.Horas,
+                          budget=None if pd.isna(b) else b, value=row.Valor, cost=row.Coste,
+                          used_hours=row.Tiempo_Real, n_items=int(row.Items), activity_ids=[],
+                          created_at=pd.Timestamp(row.Fecha).isoformat(timespec='seconds'))
+                     for row, b in zip(old.itertuples(), budget)]
+        self.record_many(decisions)
+        logger.info("Importadas %d decisiones de %s", len(decisions), csv_path)
+        return len(decisions)
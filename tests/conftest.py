@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Permite importar engine / data_loader al lanzar pytest desde cualquier carpeta
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,48 @@
+"""
+Tests del runner batch de escenarios (núcleo sin Streamlit)
+Run with: pytest tests/test_batch_runner.py -v
+"""
+
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from batch_runner import CsvSink, run_batch, scenario_grid
+from test_engine import make_portfolio
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestBatchRunner:
+
+    def test_core_imports_without_streamlit(self):
+        """El batch no arrastra Streamlit (se puede lanzar en un servidor)"""
+        code = "import sys, batch_runner; assert 'streamlit' not in sys.modules"
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+
+    def test_grid_streamed_to_csv(self, tmp_path):
+        """Cada escenario de la rejilla acaba como una fila del CSV"""
+        path = str(tmp_path / "out.csv")
+        sink = CsvSink(path)
+        n = run_batch(make_portfolio(), scenario_grid([10, 30], [None, 100], [10]), sink, batch_size=3)
+        sink.close()
+        out = pd.read_csv(path)
+
+        assert n == 4 and len(out) == 4
+        row = out[(out['Horas_Disp'] == 30) & out['Presupuesto'].isna()].iloc[0]
+        assert row['IDs'] == '1;2;3'
+        assert row['Valor'] == 12.0
+
+    def test_process_pool_matches_serial(self, tmp_path):
+        """El pool de procesos da los mismos resultados que el modo serie"""
+        results = []
+        for workers in (1, 2):
+            path = str(tmp_path / f"out_{workers}.csv")
+            sink = CsvSink(path)
+            run_batch(make_portfolio(), scenario_grid([0, 15, 30, 45], [None, 60], [5, 10]), sink, workers=workers)
+            sink.close()
+            results.append(pd.read_csv(path).sort_values('Escenario').reset_index(drop=True))
+
+        pd.testing.assert_frame_equal(results[0], results[1])
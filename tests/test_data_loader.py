@@ -0,0 +1,197 @@
+"""
+Tests del cargador de datos (pipeline de scoring + caché columnar)
+Run with: pytest tests/test_data_loader.py -v
+"""
+
+import os
+
+import pytest
+import pandas as pd
+
+from data_loader import load_scored_sheet, load_workbook, load_workbooks, _cache_paths, _prepare, _prepare_many
+from cache import fingerprint
+from engine import compare_portfolios, run_optimization
+from instrumentation import collect_stats
+
+SHEET = "4_Actividades_Priorizadas"
+
+
+def write_workbook(path, horas=(10, 20), extra=True):
+    df = pd.DataFrame({
+        'ID': [1, 2],
+        'Actividad': ['A', 'B'],
+        'Horas': list(horas),
+        'Coste': [0, 50],
+        'Pre-req': [0, 1],
+        'Probabilidad': [90, 80],
+        'Empleabilidad': [10, 8],
+        'Capa_score': [9, 7],
+        'Facilidad': [8, 6],
+    })
+    if extra:
+        df['Notas largas'] = ['no se usa', 'tampoco']
+    df.to_excel(path, sheet_name=SHEET, index=False)
+
+
+class TestScoringPipeline:
+    """El pipeline normaliza nombres y calcula Score, Score_Real y Eficiencia"""
+
+    def test_scores_and_renames(self, tmp_path):
+        path = str(tmp_path / "roadmap.xlsx")
+        write_workbook(path)
+        df = load_scored_sheet(path, SHEET)
+
+        assert 'ID' in df.columns and 'Pre_req' in df.columns
+        assert df['Score'].tolist() == pytest.approx([9.2, 7.2])
+        # Leader Risk: 0.9 -> 0.95, 0.8 -> 0.9
+        assert df['Probabilidad'].tolist() == pytest.approx([0.95, 0.9])
+        assert df['Score_Real'].tolist() == pytest.approx([9.2 * 0.95, 7.2 * 0.9])
+
+    def test_only_used_columns_read(self, tmp_path):
+        path = str(tmp_path / "roadmap.xlsx")
+        write_workbook(path)
+
+        assert 'Notas largas' not in load_scored_sheet(path, SHEET).columns
+
+    def test_missing_columns_raise(self, tmp_path):
+        path = str(tmp_path / "roadmap.xlsx")
+        pd.DataFrame({'ID': [1], 'Actividad': ['A']}).to_excel(path, sheet_name=SHEET, index=False)
+
+        with pytest.raises(ValueError):
+            load_scored_sheet(path, SHEET)
+
+
+class TestColumnarCache:
+    """La caché en disco se reutiliza y se invalida con el contenido"""
+
+    def test_cache_written_and_reused(self, tmp_path):
+        path = str(tmp_path / "roadmap.xlsx")
+        write_workbook(path)
+        first = load_scored_sheet(path, SHEET)
+        data_path, meta_path = _cache_paths(path, SHEET)
+
+        assert os.path.exists(data_path) and os.path.exists(meta_path)
+        pd.testing.assert_frame_equal(first, load_scored_sheet(path, SHEET))
+
+    def test_touch_without_changes_keeps_cache(self, tmp_path):
+        path = str(tmp_path / "roadmap.xlsx")
+        write_workbook(path)
+        load_scored_sheet(path, SHEET)
+        data_path, _ = _cache_paths(path, SHEET)
+        built = os.stat(data_path).st_mtime_ns
+
+        st_ = os.stat(path)
+        os.utime(path, ns=(st_.st_atime_ns, st_.st_mtime_ns + 10**9))
+        load_scored_sheet(path, SHEET)
+
+        assert os.stat(data_path).st_mtime_ns == built
+
+    def test_edit_rebuilds(self, tmp_path):
+        path = str(tmp_path / "roadmap.xlsx")
+        write_workbook(path)
+        load_scored_sheet(path, SHEET)
+        write_workbook(path, horas=(11, 22))
+
+        assert load_scored_sheet(path, SHEET)['Horas'].tolist() == [11, 22]
+
+    def test_cached_load_matches_cold_load_with_dropped_rows(self, tmp_path):
+        """Una fila sin Actividad se descarta igual en frío que desde la caché (mismo índice y huella)"""
+        path = str(tmp_path / "roadmap.xlsx")
+        pd.DataFrame({
+            'ID': [1, 2, 3], 'Actividad': ['A', None, 'C'], 'Horas': [10, 5, 20], 'Coste': [0, 0, 50],
+            'Pre-req': [0, 0, 1], 'Probabilidad': [90, 90, 80], 'Score': [9.0, 1.0, 7.0],
+        }).to_excel(path, sheet_name=SHEET, index=False)
+        cold = load_scored_sheet(path, SHEET)
+        cached = load_scored_sheet(path, SHEET)
+
+        assert cold.index.tolist() == [0, 2]
+        pd.testing.assert_frame_equal(cold, cached, check_index_type=True)
+        assert fingerprint('f', cold, list(cold.columns)) == fingerprint('f', cached, list(cached.columns))
+
+
+def write_team_workbook(path, horas=(10, 20)):
+    """Libro con dos carteras (Score dado y auto-calculado) y una hoja que no es cartera."""
+    scored = pd.DataFrame({
+        'Id': [1, 2, 3], 'Actividad': ['X', 'Y', None], 'Horas': [5, 15, 1], 'Coste €': ['0', 'n/a', 3],
+        'Score final': [6.0, 9.0, 1.0], 'Dependencia': [0, 1, 0], 'Prob': [0.5, 1.0, 1.0],
+    })
+    with pd.ExcelWriter(path) as xl:
+        pd.DataFrame({'Glosario': ['Score', 'Horas']}).to_excel(xl, sheet_name='0_Glosario', index=False)
+        scored.to_excel(xl, sheet_name='Equipo_B', index=False)
+        pd.DataFrame({
+            'ID': [1, 2], 'Actividad': ['A', 'B'], 'Horas': list(horas), 'Coste': [0, 50], 'Pre-req': [0, 1],
+            'Probabilidad': [90, 80], 'Empleabilidad': [10, 8], 'Capa_score': [9, 7], 'Facilidad': [8, 6],
+        }).to_excel(xl, sheet_name=SHEET, index=False)
+
+
+class TestWorkbookLoader:
+    """Todas las hojas de uno o varios libros en una pasada -> registro de carteras"""
+
+    def test_all_sheets_in_one_pass(self, tmp_path):
+        path = str(tmp_path / "equipos.xlsx")
+        write_team_workbook(path)
+        reg = load_workbook(path)
+
+        assert reg.names == ['Equipo_B', SHEET]
+        assert list(reg.skipped) == ['0_Glosario']
+        assert reg[SHEET].score.tolist() == pytest.approx([9.2 * 0.95, 7.2 * 0.9])
+        # Equipo_B: Score dado, probabilidad ya en 0-1, fila sin actividad fuera, coste no numérico -> 0
+        assert reg['Equipo_B'].score.tolist() == pytest.approx([6.0 * 0.75, 9.0])
+        assert reg['Equipo_B'].frame['Coste'].tolist() == [0, 0]
+
+    def test_vectorized_pipeline_matches_per_sheet(self, tmp_path):
+        """Puntuar las hojas apiladas da lo mismo (valores y tipos) que una a una"""
+        path = str(tmp_path / "equipos.xlsx")
+        write_team_workbook(path)
+        raw = pd.read_excel(path, sheet_name=None)
+        batch, skipped = _prepare_many({k: v.copy() for k, v in raw.items()}, strict=False)
+
+        assert list(skipped) == ['0_Glosario']
+        for sheet, df in batch.items():
+            pd.testing.assert_frame_equal(df, _prepare(raw[sheet].copy()))
+        with pytest.raises(ValueError):
+            _prepare_many({k: v.copy() for k, v in raw.items()})
+
+    def test_many_workbooks_and_cache(self, tmp_path):
+        paths = [str(tmp_path / "norte.xlsx"), str(tmp_path / "sur.xlsx")]
+        write_team_workbook(paths[0])
+        write_team_workbook(paths[1], horas=(11, 22))
+        with collect_stats(log=False) as stats:
+            first = load_workbooks(paths)
+            again = load_workbooks(paths)
+            single = load_scored_sheet(paths[1], SHEET)
+
+        assert first.names == ['norte/Equipo_B', f'norte/{SHEET}', 'sur/Equipo_B', f'sur/{SHEET}']
+        assert first[f'sur/{SHEET}'].hours.tolist() == [11, 22]
+        assert stats.counters['cache.load_workbook.miss'] == 2
+        assert stats.counters['cache.load_workbook.hit'] == 2
+        # Cada hoja queda en su caché individual
+        assert stats.counters['cache.load_data.hit'] == 1
+        for name in first:
+            pd.testing.assert_frame_equal(first[name].frame, again[name].frame)
+        pd.testing.assert_frame_equal(single, again[f'sur/{SHEET}'].frame)
+
+        write_team_workbook(paths[0], horas=(12, 24))
+        assert load_workbooks(paths)[f'norte/{SHEET}'].hours.tolist() == [12, 24]
+
+    def test_selected_sheets(self, tmp_path):
+        path = str(tmp_path / "equipos.xlsx")
+        write_team_workbook(path)
+
+        assert load_workbook(path, sheets=[SHEET]).names == [SHEET]
+        with pytest.raises(ValueError, match='Faltan columnas'):
+            load_workbook(path, sheets=['0_Glosario'])
+        with pytest.raises(ValueError, match='no existe'):
+            load_workbook(path, sheets=['Otra'])
+
+    def test_side_by_side_optimization(self, tmp_path):
+        path = str(tmp_path / "equipos.xlsx")
+        write_team_workbook(path)
+        reg = load_workbook(path)
+        summary = compare_portfolios(reg, 20, budget={'Equipo_B': 0}).set_index('Cartera')
+
+        for name in reg:
+            budget = 0 if name == 'Equipo_B' else None
+            assert summary.loc[name, 'Valor'] == pytest.approx(run_optimization(reg[name], 20, budget).score.sum())
+        assert summary.loc[SHEET, 'Actividades_Total'] == 2
+        assert set(reg.frame()['Cartera']) == set(reg.names)
@@ -3,8 +3,35 @@ Tests for SPO - Strategic Portfolio Optimizer v2.2 (Time-First)
 Run with: pytest tests/test_engine.py -v
 """
 
+import os
+
 import pytest
 import numpy as np
+import pandas as pd
+
+from engine import (PortfolioModel, run_optimization, value_curve, select_solver, run_monte_carlo,
+                    calculate_sequential_gantt, calculate_parallel_gantt, resource_utilization,
+                    simulate_schedule, run_monte_carlo_adaptive, pareto_frontier, sensitivity_analysis,
+                    run_robust_optimization, hour_scenarios, hours_reliability, weight_sensitivity,
+                    greedy_plan)
+from engine import _schedule_structure, _propagate_schedule, _cbc_solution, PLAN_START
+from cache import ResultCache, RESULT_CACHE, fingerprint
+from instrumentation import collect_stats
+
+WORKBOOK = os.path.join(os.path.dirname(__file__), '..', 'Roadmap_2026_CORREGIDO.xlsx')
+
+
+def make_portfolio():
+    """Mini-roadmap: 1 -> 2 -> 3 (cadena) y 4, 5 independientes."""
+    return pd.DataFrame({
+        'ID':         [1, 2, 3, 4, 5],
+        'Actividad':  ['A', 'B', 'C', 'D', 'E'],
+        'Score_Real': [1.0, 2.0, 9.0, 4.0, 3.0],
+        'Horas':      [10, 10, 10, 15, 5],
+        'Coste':      [0, 50, 100, 20, 0],
+        'Pre_req':    [0, 1, 2, 0, 0],
+        'Probabilidad': [1.0, 0.9, 0.8, 1.0, 0.95],
+    })
 
 
 class TestAdversarialValidation:
@@ -211,6 +238,572 @@ class TestKnapsackTimeFirst:
                 assert selected.get(prereq, False), f"{task} seleccionado sin prereq {prereq}"
 
 
+class TestPortfolioModel:
+    """Tests del modelo persistente de optimización"""
+
+    def test_parent_index_resolves_pre_req(self):
+        """Pre_req se traduce a posiciones; 0 o IDs inexistentes = -1"""
+        model = PortfolioModel(make_portfolio())
+
+        assert model.parent.tolist() == [-1, 0, 1, -1, -1]
+
+    def test_dependencies_respected(self):
+        """Para coger C (score 9) hay que coger toda la cadena A -> B -> C"""
+        res = run_optimization(make_portfolio(), 30)
+
+        assert set(res['ID']) == {1, 2, 3}
+
+    def test_reused_model_matches_fresh_build(self):
+        """Cambiar solo el RHS da lo mismo que reconstruir el problema"""
+        df = make_portfolio()
+        model = PortfolioModel(df)
+
+        for hours, budget in [(30, None), (20, None), (50, 100), (0, None), (50, None)]:
+            reused = run_optimization(df, hours, budget, model=model)
+            fresh = run_optimization(df, hours, budget)
+            assert reused.index.tolist() == fresh.index.tolist()
+
+    def test_budget_limits_selection(self):
+        """Con presupuesto 100 la cadena completa (150 €) ya no cabe"""
+        res = run_optimization(make_portfolio(), 50, budget=100)
+
+        assert res['Coste'].sum() <= 100
+        assert 3 not in set(res['ID'])
+
+
+class TestIncrementalSolve:
+    """Tests de la re-optimización incremental del PortfolioModel"""
+
+    def test_shrinking_reuses_incumbent(self):
+        """Si la solución anterior sigue cabiendo con menos recursos, no se resuelve"""
+        df = make_portfolio()
+        model = PortfolioModel(df)
+        first = model.solve(50, 200)
+        used = df['Horas'].to_numpy()[first].sum()
+
+        again = model.solve(used, 200)
+        assert model.last_mode == 'incumbent'
+        assert list(again) == list(first)
+
+    def test_incremental_matches_cold_solves(self):
+        """Cualquier secuencia de movimientos da lo mismo que resolver en frío"""
+        df = make_portfolio()
+        model = PortfolioModel(df)
+        rng = np.random.default_rng(0)
+
+        for _ in range(60):
+            hours = float(rng.integers(0, 60))
+            budget = None if rng.random() < 0.3 else float(rng.integers(0, 20) * 10)
+            warm = model.solve(hours, budget)
+            cold = PortfolioModel(df).solve(hours, budget)
+            assert sorted(warm) == sorted(cold)
+        assert model.last_mode in ('incumbent', 'table')
+
+    def test_warm_start_is_feasible(self):
+        """El MIP start recorta hojas hasta caber y nunca rompe Pre_req"""
+        df = make_portfolio()
+        model = PortfolioModel(df)
+        model.solve(60)
+
+        start = model.warm_start(25, 60)
+        assert df['Horas'].to_numpy()[start].sum() <= 25
+        assert df['Coste'].to_numpy()[start].sum() <= 60
+        chosen = set(df['ID'].to_numpy()[start])
+        for pos in start:
+            pre = df['Pre_req'].iloc[pos]
+            assert pre == 0 or pre in chosen
+
+    def test_cbc_warm_start_keeps_optimum(self):
+        """CBC con MIP start devuelve el mismo óptimo que en frío"""
+        df = make_portfolio()
+        df['Horas'] = df['Horas'] + 0.5
+        model = PortfolioModel(df)
+        model.solve(60, solver='cbc')
+
+        warm = model.solve(21, 100, solver='cbc')
+        assert model.last_mode == 'warm'
+        assert sorted(warm) == sorted(PortfolioModel(df).solve(21, 100, solver='cbc'))
+
+
+class TestValueCurve:
+    """Tests de la curva de valor exacta (tree knapsack)"""
+
+    def test_curve_matches_solver_at_every_hour(self):
+        """Cada punto de la curva coincide con el óptimo del MILP"""
+        df = make_portfolio()
+        curve = value_curve(df, 60)
+        model = PortfolioModel(df)
+
+        for h in range(0, 61, 5):
+            assert curve.at(h) == pytest.approx(run_optimization(df, h, model=model)['Score_Real'].sum())
+
+    def test_curve_is_monotone_step(self):
+        """Más horas nunca dan menos valor; horas decimales = suelo"""
+        curve = value_curve(make_portfolio(), 60)
+
+        assert np.all(np.diff(curve.value) >= 0)
+        assert curve.at(29.9) == curve.at(29)
+
+    def test_selected_respects_dependencies_and_budget(self):
+        """La selección en cualquier punto cumple Pre_req y presupuesto"""
+        df = make_portfolio()
+        curve = value_curve(df, 60, budget=100)
+
+        for h in range(61):
+            sel = curve.selected(h)
+            assert sel['Coste'].sum() <= 100
+            assert sel['Horas'].sum() <= h
+            for pre in sel['Pre_req']:
+                assert pre == 0 or pre in set(sel['ID'])
+
+    def test_cycles_rejected(self):
+        """Un ciclo en Pre_req no es un bosque"""
+        df = make_portfolio()
+        df.loc[0, 'Pre_req'] = 3
+
+        with pytest.raises(ValueError):
+            value_curve(df, 10)
+
+
+class TestParetoFrontier:
+    """Tests de la superficie horas x presupuesto y su frontera"""
+
+    def test_surface_matches_solver(self):
+        """Cada celda de la superficie es el óptimo del MILP con esas horas y ese presupuesto"""
+        df = make_portfolio()
+        pf = pareto_frontier(df)
+        model = PortfolioModel(df)
+
+        for i, h in enumerate(pf.hours_axis[::7]):
+            for j, b in enumerate(pf.cost_axis):
+                best = run_optimization(df, h, b, model=model, solver='cbc')['Score_Real'].sum()
+                assert pf.surface[i * 7, j] == pytest.approx(best)
+                assert pf.selected(h, b)['Score_Real'].sum() == pytest.approx(best)
+
+    def test_frontier_is_non_dominated(self):
+        """Ninguna cartera de la frontera domina a otra"""
+        pf = pareto_frontier(make_portfolio())
+        F = pf.frontier[['Valor', 'Horas', 'Coste']].to_numpy()
+
+        for v, h, c in F:
+            better = (F[:, 0] >= v) & (F[:, 1] <= h) & (F[:, 2] <= c)
+            strictly = (F[:, 0] > v) | (F[:, 1] < h) | (F[:, 2] < c)
+            assert not (better & strictly).any()
+        assert pf.frontier['Valor'].max() == pytest.approx(19.0)
+
+    def test_coarse_grid_stays_feasible(self):
+        """Con pasos gruesos las carteras siguen cabiendo en su celda"""
+        pf = pareto_frontier(make_portfolio(), hours_step=7, cost_step=30)
+
+        for row in pf.frontier.itertuples():
+            assert row.Horas <= row.Horas_Min and row.Coste <= row.Coste_Min
+
+    def test_grid_limit(self):
+        with pytest.raises(ValueError):
+            pareto_frontier(make_portfolio(), max_hours=1e7, max_budget=1e7, cost_step=1)
+
+
+class TestSensitivity:
+    """Tests del análisis de sensibilidad por actividad (sin re-resolver)"""
+
+    def setup_method(self):
+        RESULT_CACHE.clear()
+
+    def test_report_on_mini_roadmap(self):
+        """Con 30 h gana la cadena 1 -> 2 -> 3 (valor 12)"""
+        rep = sensitivity_analysis(make_portfolio(), 30).frame.set_index('ID')
+
+        assert rep['Seleccionada'].tolist() == [True, True, True, False, False]
+        # Sin la 3 lo mejor es {1, 4, 5} (8); sin la 1 cae toda la cadena: {4, 5} (7)
+        assert rep.loc[3, 'Perdida_Si_Fuera'] == pytest.approx(4.0)
+        assert rep.loc[1, 'Perdida_Si_Fuera'] == pytest.approx(5.0)
+        assert rep.loc[4, 'Perdida_Si_Dentro'] == pytest.approx(4.0)
+        assert rep.loc[5, 'Horas_Extra'] == 5 and rep.loc[4, 'Horas_Extra'] == 15
+        assert rep.loc[5, 'Valor_Hora_Extra'] == pytest.approx(3.0 / 5)
+
+    def test_matches_re_solving(self):
+        """Cada cifra coincide con re-resolver el problema a mano"""
+        df = make_portfolio()
+        model = PortfolioModel(df)
+        for hours, budget in ((20, None), (30, 100), (45, 70)):
+            rep = sensitivity_analysis(df, hours, budget)
+            best = run_optimization(df, hours, budget)['Score_Real'].sum()
+            assert rep.value == pytest.approx(best)
+
+            for row in rep.frame.itertuples():
+                entry = next((h for h in range(hours, 61) if row.ID in set(df['ID'].iloc[model.solve(h, budget)])), None)
+                if entry is None:  # ni con todas las horas cabe en el presupuesto
+                    assert np.isnan(row.Horas_Extra)
+                else:
+                    assert row.Horas_Extra == entry - hours
+                # Fuera: quitar la actividad y todo lo que depende de ella
+                drop = {row.ID}
+                while True:
+                    more = set(df.loc[df['Pre_req'].isin(drop), 'ID']) - drop
+                    if not more:
+                        break
+                    drop |= more
+                rest = df[~df['ID'].isin(drop)]
+                without = run_optimization(rest, hours, budget)['Score_Real'].sum()
+                if row.Seleccionada:
+                    assert row.Perdida_Si_Fuera == pytest.approx(best - without)
+                else:
+                    assert without == pytest.approx(best)
+
+    def test_budget_sweep_and_marginals(self):
+        """Con presupuesto: coste extra para entrar y valor de 1 hora / 1 € más"""
+        df = make_portfolio()
+        rep = sensitivity_analysis(df, 30, 50)
+        frame = rep.frame.set_index('ID')
+
+        # Con 50 € la 3 (100 €) no cabe: entra con 100 € más
+        assert not frame.loc[3, 'Seleccionada']
+        assert frame.loc[3, 'Coste_Extra'] == 100
+        assert rep.marginal_hour == pytest.approx(run_optimization(df, 31, 50)['Score_Real'].sum() - rep.value)
+        assert np.isnan(sensitivity_analysis(df, 30).frame['Coste_Extra']).all()
+
+    def test_cache_hits_are_copies(self):
+        """Modificar report.frame no corrompe los siguientes aciertos de la caché"""
+        df = make_portfolio()
+        first = sensitivity_analysis(df, 30)
+        expected = first.frame.copy()
+        first.frame['Perdida_Si_Fuera'] = -1.0
+        with collect_stats(log=False) as stats:
+            again = sensitivity_analysis(df, 30)
+
+        assert stats.counters['cache.sensitivity_analysis.hit'] == 1
+        pd.testing.assert_frame_equal(again.frame, expected)
+
+
+class TestRobustOptimization:
+    """Tests del modo robusto (restricción probabilística sobre escenarios)"""
+
+    def setup_method(self):
+        RESULT_CACHE.clear()
+
+    def test_matches_brute_force_saa(self):
+        """Mismo óptimo que enumerar todas las carteras sobre los mismos escenarios"""
+        from itertools import product
+        df = make_portfolio()
+        hours, alpha, n_scen, seed = 30, 0.8, 200, 7
+        scen = hour_scenarios(df['Horas'].to_numpy(dtype=float), n_scen, seed)
+        allowed = int(np.floor((1 - alpha) * n_scen + 1e-9))
+
+        best = 0.0
+        for bits in product([0, 1], repeat=len(df)):
+            x = np.array(bits, dtype=bool)
+            parents_ok = all(p == 0 or x[df['ID'].tolist().index(p)] for p in df.loc[x, 'Pre_req'])
+            if parents_ok and ((scen @ x) > hours + 1e-9).sum() <= allowed:
+                best = max(best, df.loc[x, 'Score_Real'].sum())
+
+        plan = run_robust_optimization(df, hours, alpha=alpha, scenarios=n_scen, seed=seed, time_limit=30)
+        x = df['ID'].isin(plan['ID']).to_numpy()
+        assert plan['Score_Real'].sum() == pytest.approx(best)
+        assert ((scen @ x) > hours + 1e-9).sum() <= allowed
+        assert plan.attrs['solve']['status'] == 'Optimal' and plan.attrs['solve']['gap'] == 0
+
+    def test_limited_cbc_is_not_optimal(self):
+        """PuLP da sol_status óptimo aunque CBC pare por tiempo o gap: manda el resultado del log"""
+        from types import SimpleNamespace
+        optimal, feasible = SimpleNamespace(sol_status=1), SimpleNamespace(sol_status=2)
+
+        assert _cbc_solution(optimal, {'result': "Optimal solution found"}) == 'Optimal'
+        assert _cbc_solution(optimal, {}) == 'Optimal'  # sin límites no hay log
+        assert _cbc_solution(optimal, {'result': "Optimal solution found (within gap tolerance)"}) == 'Feasible'
+        assert _cbc_solution(optimal, {'result': "Stopped on time limit"}) == 'Feasible'
+        assert _cbc_solution(feasible, {'result': "Stopped on time limit"}) == 'Feasible'
+        assert _cbc_solution(SimpleNamespace(sol_status=0), {'result': "Stopped on time limit"}) is None
+
+    def test_time_limit_reports_gap(self):
+        """Parado por tiempo: el plan trae la cota y el gap para avisar al usuario"""
+        df = make_scored_portfolio(60)
+        hours = float(df['Horas'].sum()) * 0.3
+        plan = run_robust_optimization(df, hours, alpha=0.9, scenarios=500, seed=1, time_limit=0.01)
+        info = plan.attrs['solve']
+
+        assert info['status'] != 'Optimal' and info['gap'] > 0
+        assert info['value'] == pytest.approx(plan['Score_Real'].sum()) and info['bound'] > info['value']
+        with collect_stats(log=False) as stats:
+            run_robust_optimization(df, hours, alpha=0.9, scenarios=500, seed=1, time_limit=0.01)
+        assert stats.counters['cache.run_robust_optimization.miss'] == 1
+
+    def test_more_reliable_than_deterministic(self):
+        """El plan determinista apura las horas; el robusto deja colchón"""
+        df = make_portfolio()
+        det = run_optimization(df, 30)
+        rob = run_robust_optimization(df, 30, alpha=0.9, scenarios=500, seed=1, time_limit=30)
+
+        assert rob['Score_Real'].sum() <= det['Score_Real'].sum() + 1e-9
+        assert hours_reliability(rob, 30, seed=2) >= 0.85
+        assert hours_reliability(rob, 30, seed=2) > hours_reliability(det, 30, seed=2)
+
+    def test_budget_and_cache(self):
+        df = make_portfolio()
+        with collect_stats(log=False) as stats:
+            first = run_robust_optimization(df, 40, budget=60, scenarios=300, seed=3, time_limit=30)
+            again = run_robust_optimization(df, 40, budget=60, scenarios=300, seed=3, time_limit=30)
+
+        assert first['Coste'].sum() <= 60
+        assert first['ID'].tolist() == again['ID'].tolist()
+        assert stats.counters['cache.run_robust_optimization.hit'] == 1
+        assert stats.stages['optimize.chance_constrained'][0] == 1
+
+    def test_invalid_alpha(self):
+        with pytest.raises(ValueError):
+            run_robust_optimization(make_portfolio(), 30, alpha=0)
+
+
+SCORE_WEIGHTS = {'Empleabilidad': 0.4, 'Capa_score': 0.4, 'Facilidad': 0.2}
+
+
+def make_scored_portfolio(n=60, seed=0):
+    """Cartera sintética con los ingredientes del Score y Score_Real = fórmula x Probabilidad."""
+    from benchmarks.synthetic import generate_portfolio
+    rng = np.random.default_rng(seed)
+    df = generate_portfolio(n, seed=seed)
+    for col in SCORE_WEIGHTS:
+        df[col] = rng.integers(1, 11, n)
+    df['Score_Real'] = sum(df[c] * w for c, w in SCORE_WEIGHTS.items()) * df['Probabilidad']
+    return df
+
+
+class TestWeightSensitivity:
+    """Tests del barrido de pesos del Score"""
+
+    def setup_method(self):
+        RESULT_CACHE.clear()
+
+    def brute_force(self, df, hours, weights):
+        model = PortfolioModel(df)
+        X = df[list(SCORE_WEIGHTS)].to_numpy(dtype=float)
+        prob = df['Probabilidad'].to_numpy(dtype=float)
+        values = []
+        for w in weights:
+            score = (X @ w) * prob
+            values.append(score[model.rescored(score).solve(hours)].sum())
+        return np.array(values)
+
+    def test_certified_plans_are_optimal(self):
+        """Cada vector recibe una cartera óptima, con muchas menos resoluciones que vectores"""
+        df = make_scored_portfolio()
+        hours = float(round(df['Horas'].sum() * 0.3))
+        with collect_stats(log=False) as stats:
+            sweep = weight_sensitivity(df, hours, SCORE_WEIGHTS, samples=300, concentration=5.0, seed=1)
+        weights = sweep.weights[list(SCORE_WEIGHTS)].to_numpy()
+
+        np.testing.assert_allclose(sweep.weights['Valor'], self.brute_force(df, hours, weights), atol=1e-9)
+        assert sweep.solves < len(weights) and sweep.certified > 0
+        assert stats.records['weight_sweep'][0]['vectors'] == 300
+
+    def test_base_weights_reproduce_plan(self):
+        df = make_scored_portfolio()
+        sweep = weight_sensitivity(df, 80, SCORE_WEIGHTS, weights=[[0.4, 0.4, 0.2], [2, 2, 1]])
+
+        base = set(run_optimization(df, 80).index)
+        assert set(df.index[sweep.frame['En_Base']]) == base
+        assert (sweep.weights['Cartera'] == sweep.base).all() and sweep.base_share == 1.0
+        assert sweep.frame.loc[list(base), 'Frecuencia'].eq(1.0).all()
+
+    def test_stability_map_and_cache(self):
+        df = make_scored_portfolio()
+        corners = np.eye(3)
+        sweep = weight_sensitivity(df, 80, SCORE_WEIGHTS, weights=corners)
+        with collect_stats(log=False) as stats:
+            again = weight_sensitivity(df.copy(), 80, SCORE_WEIGHTS, weights=corners)
+
+        assert stats.counters['cache.weight_sensitivity.hit'] == 1
+        # Los aciertos son copias: modificar una no cambia lo que devuelve la caché
+        pd.testing.assert_frame_equal(again.frame, sweep.frame)
+        again.frame['Frecuencia'] = -1.0
+        again.weights.drop(index=0, inplace=True)
+        third = weight_sensitivity(df, 80, SCORE_WEIGHTS, weights=corners)
+        pd.testing.assert_frame_equal(third.frame, sweep.frame)
+        assert len(third.weights) == len(sweep.weights)
+        picks = np.zeros(len(df))
+        for p in sweep.weights['Cartera']:
+            picks[sweep.portfolios[p]] += 1
+        np.testing.assert_allclose(sweep.frame['Frecuencia'], picks / 3)
+
+    def test_invalid_weights(self):
+        df = make_scored_portfolio()
+        with pytest.raises(ValueError):
+            weight_sensitivity(df, 80, SCORE_WEIGHTS, weights=[[-1, 1, 1]])
+        with pytest.raises(ValueError):
+            weight_sensitivity(df.drop(columns='Facilidad'), 80, SCORE_WEIGHTS, seed=1)
+
+
+class TestSolverBackends:
+    """Tests del registro de backends (nativo vs CBC)"""
+
+    def test_auto_prefers_native_for_forest(self):
+        """Bosque con horas enteras -> backend nativo en proceso"""
+        model = PortfolioModel(make_portfolio())
+
+        assert select_solver(model, 30) == 'native'
+        assert select_solver(model, 30, budget=100) == 'native'
+
+    def test_auto_falls_back_to_cbc(self):
+        """Horas decimales o ciclos en Pre_req -> CBC"""
+        df = make_portfolio()
+        df['Horas'] = df['Horas'] + 0.5
+        assert select_solver(PortfolioModel(df), 30) == 'cbc'
+
+        df = make_portfolio()
+        df.loc[0, 'Pre_req'] = 3
+        assert select_solver(PortfolioModel(df), 30) == 'cbc'
+
+    def test_backends_identical_on_workbook(self):
+        """Ambos backends eligen exactamente la misma cartera en el Excel real"""
+        from data_loader import load_data
+        df, _ = load_data(WORKBOOK, "4_Actividades_Priorizadas")
+        model = PortfolioModel(df)
+
+        for hours in range(0, 650, 50):
+            for budget in (None, 50, 600):
+                native = model.solve(hours, budget, solver='native')
+                cbc = model.solve(hours, budget, solver='cbc')
+                assert native.tolist() == cbc.tolist()
+
+
+class TestAnytime:
+    """Tests del solve 'anytime': voraz inmediata, cota superior y límite de tiempo/gap"""
+
+    def setup_method(self):
+        RESULT_CACHE.clear()
+
+    def test_greedy_feasible_and_respects_dependencies(self):
+        """La voraz valora la cadena: E primero y luego A -> B para llegar a C (score 9)"""
+        model = PortfolioModel(make_portfolio())
+
+        for hours, budget in [(30, None), (20, None), (50, 100), (0, None)]:
+            selected = model.greedy(hours, budget)
+            assert model._feasible(selected, hours, budget)
+        assert set(make_portfolio()['ID'].iloc[model.greedy(35)]) == {1, 2, 3, 5}
+
+    def test_greedy_long_chain_and_deadline(self):
+        """Una cadena de 8.000 Pre_req no recorre ancestros por tarea y respeta el reloj"""
+        import time
+        n = 8_000
+        df = pd.DataFrame({'ID': np.arange(1, n + 1), 'Pre_req': np.r_[0, np.arange(1, n)],
+                           'Score_Real': np.linspace(0.1, 10, n), 'Horas': np.ones(n), 'Coste': np.ones(n)})
+        model = PortfolioModel(df)
+
+        t0 = time.perf_counter()
+        selected = model.greedy(n / 2)
+        assert time.perf_counter() - t0 < 1
+        assert len(selected) == n / 2 and model._feasible(selected, n / 2)
+        late = model.greedy(n / 2, deadline=time.perf_counter())
+        assert len(late) <= 64 and model._feasible(late, n / 2)
+
+    def test_bound_never_below_optimum(self):
+        from benchmarks.synthetic import generate_portfolio
+        df = generate_portfolio(200, seed=5)
+        model = PortfolioModel(df)
+
+        for share in (0.1, 0.3, 0.6):
+            hours = float(round(df['Horas'].sum() * share))
+            best = run_optimization(df, hours)['Score_Real'].sum()
+            assert model.score[model.greedy(hours)].sum() <= best + 1e-9 <= model.upper_bound(hours) + 2e-9
+
+    def test_generous_limit_matches_exact(self):
+        from benchmarks.synthetic import generate_portfolio
+        df = generate_portfolio(200, seed=5)
+        hours = float(round(df['Horas'].sum() * 0.3))
+        exact = run_optimization(df, hours)
+
+        for solver in ('native', 'cbc'):
+            plan = run_optimization(df, hours, solver=solver, time_limit=60)
+            assert plan.attrs['solve']['status'] == 'Optimal' and plan.attrs['solve']['gap'] == 0
+            assert plan['Score_Real'].sum() == pytest.approx(exact['Score_Real'].sum())
+        assert exact.attrs['solve']['status'] == 'Optimal'
+
+    def test_time_limit_returns_feasible_plan_with_gap(self):
+        """Sin tiempo para el DP: queda la voraz, factible y con su distancia a la cota"""
+        from benchmarks.synthetic import generate_portfolio
+        df = generate_portfolio(300, seed=5)
+        hours = float(round(df['Horas'].sum() * 0.3))
+        model = PortfolioModel(df)
+
+        with collect_stats(log=False) as stats:
+            plan = run_optimization(df, hours, model=model, solver='native', time_limit=1e-9)
+        info = plan.attrs['solve']
+
+        assert info['status'] == 'Greedy' and 0 < info['gap'] < 1
+        assert info['value'] == pytest.approx(plan['Score_Real'].sum())
+        assert info['bound'] >= run_optimization(df, hours)['Score_Real'].sum()
+        assert model._feasible(model.greedy(hours), hours) and plan['Horas'].sum() <= hours
+        assert stats.records['solver'][-1]['backend'] == 'greedy'
+        # El incumbente no probado no se reutiliza como óptimo
+        assert run_optimization(df, hours, model=model)['Score_Real'].sum() >= info['value']
+
+    def test_greedy_plan_while_model_is_busy(self):
+        """La voraz de respaldo no espera al candado del modelo que otro hilo está resolviendo"""
+        df = make_portfolio()
+        model = PortfolioModel(df)
+
+        with model._lock:
+            plan = greedy_plan(df, 35, model=model)
+        assert set(plan['ID']) == {1, 2, 3, 5}
+        assert plan.attrs['solve']['value'] == pytest.approx(plan['Score_Real'].sum())
+        assert plan.attrs['solve']['bound'] >= run_optimization(df, 35)['Score_Real'].sum()
+
+    def test_cbc_stopped_on_gap_is_not_optimal(self):
+        """CBC parado por gapRel: PuLP lo da por óptimo, pero ni el status ni el incumbente lo son"""
+        from benchmarks.synthetic import generate_portfolio
+        df = generate_portfolio(400, seed=1)
+        hours = float(df['Horas'].sum()) * 0.37
+        best = run_optimization(df, hours)['Score_Real'].sum()
+        model = PortfolioModel(df)
+
+        selected, info = model.solve_anytime(hours, solver='cbc', gap=0.05)
+        assert model.score[selected].sum() < best - 1e-6
+        assert info['status'] == 'Feasible' and info['gap'] > 0 and info['bound'] >= best - 1e-9
+        assert not model._incumbent_still_optimal(hours, None)
+
+    def test_scaled_objective_check_does_not_overflow(self):
+        """Valores x escala más allá de int64: el MILP usa Score_Real tal cual, no coeficientes desbordados"""
+        n = 3_000
+        df = pd.DataFrame({'ID': np.arange(1, n + 1), 'Pre_req': 0, 'Score_Real': np.full(n, 1e3),
+                           'Horas': np.ones(n), 'Coste': np.ones(n)})
+        model = PortfolioModel(df)
+        model._build_milp()
+        assert model.objective_scale is None
+
+    def test_cbc_bound_unscaled(self):
+        """La cota de CBC (objetivo escalado con desempate) se pasa a Score_Real y mejora la de Dantzig"""
+        from benchmarks.synthetic import generate_portfolio
+        df = generate_portfolio(400, seed=1)
+        hours = float(df['Horas'].sum()) * 0.37
+        model = PortfolioModel(df)
+
+        _, info = model.solve_anytime(hours, solver='cbc', gap=0.05)
+        assert model.objective_scale is not None
+        assert info['bound'] < model.upper_bound(hours)
+        assert info['bound'] >= run_optimization(df, hours)['Score_Real'].sum() - 1e-9
+
+    def test_time_limited_results_cached_only_when_optimal(self):
+        """Lo que dejó el reloj no se cachea; el óptimo probado sí"""
+        from benchmarks.synthetic import generate_portfolio
+        df = generate_portfolio(300, seed=5)
+        hours = float(round(df['Horas'].sum() * 0.3))
+
+        with collect_stats(log=False) as stats:
+            for _ in range(2):
+                assert run_optimization(df, hours, solver='native', time_limit=1e-9).attrs['solve']['status'] != 'Optimal'
+            for _ in range(2):
+                assert run_optimization(df, hours, solver='native', time_limit=60).attrs['solve']['status'] == 'Optimal'
+        assert stats.counters['cache.run_optimization.miss'] == 3
+        assert stats.counters['cache.run_optimization.hit'] == 1
+
+    def test_gap_target_stops_early(self):
+        """Si la voraz ya está dentro del gap pedido no se lanza ningún solver"""
+        with collect_stats(log=False) as stats:
+            plan = run_optimization(make_portfolio(), 30, gap=0.5)
+
+        assert plan.attrs['solve']['gap'] <= 0.5
+        assert 'optimize.native' not in stats.stages and 'optimize.cbc' not in stats.stages
+
+
 class TestBiasDetection:
     """Tests para validar deteccion de sesgos"""
     
@@ -268,6 +861,78 @@ class TestGanttScoreHeredado:
         
         assert effective_score_a == 2
 
+    def test_unblocker_scheduled_first(self):
+        """La tarea que desbloquea a la más valiosa sale antes que las sueltas"""
+        gantt = calculate_sequential_gantt(make_portfolio(), 10)
+
+        assert gantt['ID'].tolist() == [1, 2, 3, 4, 5]
+        # El hijo que sigue justo a su padre empieza un día después
+        assert (gantt['Inicio'].iloc[1] - gantt['Fin'].iloc[0]).days == 1
+        assert gantt['Inicio'].iloc[0] == PLAN_START
+
+    def test_deep_chain_without_recursion(self):
+        """Una cadena de miles de niveles no revienta la pila"""
+        n = 5000
+        df = pd.DataFrame({
+            'ID': np.arange(1, n + 1), 'Actividad': 'T', 'Score_Real': np.linspace(0, 1, n),
+            'Horas': 10, 'Coste': 0, 'Pre_req': np.arange(n),
+        })
+        gantt = calculate_sequential_gantt(df, 70)
+
+        assert gantt['ID'].tolist() == list(range(1, n + 1))
+        assert (gantt['Fin'].iloc[-1] - PLAN_START).days == n * 2 - 1
+
+    def test_cycle_is_never_scheduled(self):
+        """Las tareas en un ciclo de Pre_req nunca se desbloquean"""
+        df = make_portfolio()
+        df.loc[0, 'Pre_req'] = 3
+
+        assert calculate_sequential_gantt(df, 10)['ID'].tolist() == [4, 5]
+
+
+class TestParallelGantt:
+    """Tests del Gantt multi-recurso"""
+
+    def test_single_resource_matches_sequential(self):
+        """Con un recurso el resultado es el Gantt secuencial de siempre"""
+        df = make_portfolio()
+        par = calculate_parallel_gantt(df, [10])
+        seq = calculate_sequential_gantt(df, 10)
+
+        pd.testing.assert_frame_equal(par.drop(columns='Recurso'), seq)
+
+    def test_dependencies_and_resource_overlap(self):
+        """Nadie hace dos tareas a la vez y ningún hijo empieza antes de que acabe su padre"""
+        df = make_portfolio()
+        gantt = calculate_parallel_gantt(df, {'Ana': 10, 'Luis': 5})
+        end = dict(zip(gantt['ID'], gantt['Fin']))
+
+        for row in gantt.itertuples():
+            if row.Pre_req in end:
+                assert row.Inicio > end[row.Pre_req]
+        for _, g in gantt.groupby('Recurso'):
+            g = g.sort_values('Inicio')
+            assert (g['Inicio'].to_numpy()[1:] >= g['Fin'].to_numpy()[:-1]).all()
+        assert gantt['Fin'].max() < calculate_sequential_gantt(df, 10)['Fin'].max()
+
+    def test_utilization(self):
+        """La ocupación cuenta días de trabajo e incluye recursos sin tareas"""
+        resources = {'Ana': 10, 'Luis': 5, 'Eva': 1}
+        df = make_portfolio().iloc[[0, 3]]
+        util = resource_utilization(calculate_parallel_gantt(df, resources), resources).set_index('Recurso')
+
+        assert util['Tareas'].sum() == 2
+        assert util.loc['Eva', 'Tareas'] == 0 and util.loc['Eva', 'Ocupacion'] == 0
+        assert util['Ocupacion'].max() == pytest.approx(1.0)
+
+    def test_schedule_simulation_uses_resources(self):
+        """El Monte Carlo de fechas respeta el reparto entre recursos"""
+        df = make_portfolio()
+        seq = simulate_schedule(df, 10, iterations=200, seed=1)
+        par = simulate_schedule(df, 10, iterations=200, seed=1, resources=[10, 10])
+
+        assert par['P50'] < seq['P50']
+
 
 class TestMonteCarlo:
     """Tests para validar simulacion Monte Carlo"""
@@ -280,6 +945,72 @@ class TestMonteCarlo:
         assert factors.min() >= 0.9
         assert factors.max() <= 1.5
     
+    def test_run_monte_carlo_bounds(self):
+        """Horas simuladas siempre entre 0.9x y 1.5x del plan"""
+        df = make_portfolio()
+        mc = run_monte_carlo(df, iterations=2000, seed=7)
+
+        assert list(mc.columns) == ['Horas', 'Valor']
+        assert len(mc) == 2000
+        assert mc['Horas'].min() >= 0.9 * df['Horas'].sum()
+        assert mc['Horas'].max() <= 1.5 * df['Horas'].sum()
+        assert mc['Valor'].max() <= df['Score_Real'].sum()
+
+    def test_run_monte_carlo_reproducible(self):
+        """Misma semilla = mismos resultados; los bloques no dependen del total"""
+        df = make_portfolio()
+        a = run_monte_carlo(df, iterations=1000, seed=3, chunk_size=100)
+        b = run_monte_carlo(df, iterations=1000, seed=3, chunk_size=100)
+        c = run_monte_carlo(df, iterations=500, seed=3, chunk_size=100)
+
+        pd.testing.assert_frame_equal(a, b)
+        pd.testing.assert_frame_equal(a.iloc[:500], c)
+
+    def test_run_monte_carlo_workers_bit_identical(self):
+        """El resultado no depende del número de procesos"""
+        df = make_portfolio()
+        serial = run_monte_carlo(df, iterations=3000, seed=9, chunk_size=500)
+        parallel = run_monte_carlo(df, iterations=3000, seed=9, chunk_size=500, workers=2)
+
+        pd.testing.assert_frame_equal(serial, parallel, check_exact=True)
+
+    def test_run_monte_carlo_expected_value(self):
+        """Media de Valor ~ suma de Score_Real x Probabilidad"""
+        df = make_portfolio()
+        mc = run_monte_carlo(df, iterations=50_000, seed=11)
+        expected = (df['Score_Real'] * df['Probabilidad']).sum()
+
+        assert mc['Valor'].mean() == pytest.approx(expected, rel=0.01)
+
+    def test_adaptive_stops_when_converged(self):
+        """Para en cuanto los IC de P50/P90 son más estrechos que la tolerancia"""
+        df = make_portfolio()
+        loose = run_monte_carlo_adaptive(df, tol=0.02, seed=1)
+        tight = run_monte_carlo_adaptive(df, tol=0.002, seed=1)
+
+        assert loose['Convergido'] and tight['Convergido']
+        assert loose['Iteraciones'] < tight['Iteraciones']
+        widths = tight['Resumen'][['Ancho_P50', 'Ancho_P90']]
+        assert (widths.to_numpy() <= 0.002 * tight['Resumen'][['P50', 'P90']].abs().to_numpy() + 1e-9).all()
+
+    def test_adaptive_matches_fixed_run(self):
+        """Mismos flujos aleatorios que run_monte_carlo con igual seed y chunk_size"""
+        df = make_portfolio()
+        ad = run_monte_carlo_adaptive(df, tol=0.002, seed=4, chunk_size=5000, min_iterations=5000)
+        mc = run_monte_carlo(df, iterations=ad['Iteraciones'], seed=4, chunk_size=5000)
+
+        assert ad['Resumen'].loc['Horas', 'Media'] == pytest.approx(mc['Horas'].mean())
+        assert ad['Resumen'].loc['Horas', 'Desv'] == pytest.approx(mc['Horas'].std())
+        assert ad['Resumen'].loc['Horas', 'P90'] == pytest.approx(np.percentile(mc['Horas'], 90), rel=1e-3)
+
+    def test_adaptive_respects_max_iterations(self):
+        """Con un techo bajo devuelve lo que tenga y avisa de que no convergió"""
+        ad = run_monte_carlo_adaptive(make_portfolio(), tol=1e-9, seed=2, max_iterations=3000,
+                                      chunk_size=1000, min_iterations=1000)
+
+        assert ad['Iteraciones'] == 3000
+        assert not ad['Convergido']
+
     def test_bernoulli_success(self):
         """Exito simulado respeta probabilidad"""
         np.random.seed(42)
@@ -293,6 +1024,98 @@ class TestMonteCarlo:
         assert abs(observed_rate - prob) < 0.02
 
 
+class TestScheduleSimulation:
+    """Tests del Monte Carlo de calendario (fechas de fin)"""
+
+    def test_nominal_durations_reproduce_gantt(self):
+        """Sin incertidumbre, la propagación vectorizada da las fechas del Gantt"""
+        df = make_portfolio()
+        gantt = calculate_sequential_gantt(df, 10)
+        parent, prev = _schedule_structure(gantt)
+        hours = df.set_index('ID')['Horas'].reindex(gantt['ID']).to_numpy(dtype=float)
+        dur = np.maximum(1, (hours / 10 * 7).astype(int))[None, :]
+
+        end, _ = _propagate_schedule(dur, parent, prev)
+        expected = (gantt['Fin'] - pd.Timestamp(PLAN_START)).dt.days.to_numpy()
+
+        assert end[0].tolist() == expected.tolist()
+
+    def test_percentiles_and_criticality(self):
+        """P50 <= P90 y la cadena 1 -> 2 -> 3 es siempre la crítica por dependencias"""
+        sim = simulate_schedule(make_portfolio(), 10, iterations=2000, seed=5)
+        crit = sim['Criticidad'].set_index('ID')
+
+        assert len(sim['Fin']) == 2000
+        assert sim['P50'] <= sim['P90']
+        assert (crit['Criticidad'] == 1.0).all()
+        assert crit.loc[[1, 2, 3], 'Criticidad_Dependencias'].tolist() == [1.0, 1.0, 1.0]
+        assert crit.loc[[4, 5], 'Criticidad_Dependencias'].tolist() == [0.0, 0.0]
+
+
+class TestResultCache:
+    """Tests de la caché de resultados por contenido"""
+
+    def test_repeated_calls_hit(self):
+        """Las llamadas repetidas de una misma ejecución de la app son aciertos"""
+        RESULT_CACHE.clear()
+        df = make_portfolio()
+        first = run_optimization(df, 30)
+        second = run_optimization(df.copy(), 30.0)
+
+        assert RESULT_CACHE.stats()['hits'] == 1
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_key_ignores_irrelevant_columns(self):
+        """Cambiar 'Actividad' no invalida la optimización; cambiar Horas sí"""
+        df = make_portfolio()
+        other = df.copy()
+        other['Actividad'] = ['X'] * len(df)
+        key = fingerprint('run_optimization', df, ['Horas', 'Score_Real'], 30, None)
+
+        assert key == fingerprint('run_optimization', other, ['Horas', 'Score_Real'], 30, None)
+        other['Horas'] = other['Horas'] + 1
+        assert key != fingerprint('run_optimization', other, ['Horas', 'Score_Real'], 30, None)
+
+    def test_cached_rows_come_from_current_frame(self):
+        """Un acierto devuelve las filas del df actual, no las del cacheado"""
+        df = make_portfolio()
+        run_optimization(df, 30)
+        renamed = df.copy()
+        renamed['Actividad'] = renamed['Actividad'].str.lower()
+
+        assert set(run_optimization(renamed, 30)['Actividad']) == {'a', 'b', 'c'}
+
+    def test_lru_eviction(self):
+        """Se expulsa la entrada menos usada"""
+        cache = ResultCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1 and cache.get('c') == 3
+
+    def test_disk_persistence(self, tmp_path):
+        """Con disk_dir los resultados sobreviven a un 'reinicio'"""
+        ResultCache(disk_dir=str(tmp_path)).put('k', pd.DataFrame({'x': [1]}))
+        restarted = ResultCache(disk_dir=str(tmp_path))
+
+        assert restarted.get('k')['x'].tolist() == [1]
+        assert restarted.stats()['disk_hits'] == 1
+
+    def test_monte_carlo_without_seed_not_cached(self):
+        """Sin semilla la simulación no es reproducible: no se cachea"""
+        RESULT_CACHE.clear()
+        df = make_portfolio()
+        run_monte_carlo(df, 100)
+        run_monte_carlo(df, 100)
+        run_monte_carlo(df, 100, seed=1)
+        run_monte_carlo(df, 100, seed=1, workers=2)
+
+        assert RESULT_CACHE.stats()['hits'] == 1
+
+
 class TestURLVerification:
     """Tests para validar que las actividades tienen URL"""
     
@@ -0,0 +1,63 @@
+"""
+Tests de la exportación bajo demanda (Excel, CSV y Parquet).
+Run with: pytest tests/test_exporter.py -v
+"""
+
+import io
+import zipfile
+
+import pandas as pd
+
+from cache import RESULT_CACHE
+from engine import run_optimization
+from exporter import EXPORT_CACHE, export_plan, write_xlsx
+from instrumentation import collect_stats
+from test_engine import make_portfolio
+
+SHEETS = ['Plan', 'Gantt', 'Riesgo', 'Auditoria']
+
+
+class TestExport:
+    """Tests de export_plan"""
+
+    def setup_method(self):
+        RESULT_CACHE.clear()
+        EXPORT_CACHE.clear()
+        self.df = make_portfolio()
+        self.plan = run_optimization(self.df, 30)
+
+    def test_xlsx_bundle(self):
+        book = pd.read_excel(io.BytesIO(export_plan(self.df, self.plan, 'xlsx', 10)), sheet_name=None)
+
+        assert list(book) == SHEETS
+        assert book['Plan']['ID'].tolist() == self.plan['ID'].tolist()
+        assert pd.api.types.is_datetime64_any_dtype(book['Gantt']['Inicio'])
+        assert book['Riesgo']['Variable'].tolist() == ['Horas', 'Valor']
+        assert (book['Auditoria']['Seleccionada'] == 'SI').sum() == len(self.plan)
+
+    def test_csv_and_parquet_zip_match_plan(self):
+        for fmt, read in (('csv', pd.read_csv), ('parquet', pd.read_parquet)):
+            with zipfile.ZipFile(io.BytesIO(export_plan(self.df, self.plan, fmt, 10, [10, 5]))) as zf:
+                assert [n.rsplit('.', 1)[0] for n in zf.namelist()] == SHEETS
+                gantt = read(io.BytesIO(zf.read(zf.namelist()[1])))
+            assert sorted(gantt['ID']) == sorted(self.plan['ID'])
+            assert set(gantt['Recurso']) <= {'Recurso 1', 'Recurso 2'}
+
+    def test_cached_by_plan_hash(self):
+        """El mismo plan (aunque sea otra copia) no se regenera; otro plan sí"""
+        with collect_stats(log=False) as stats:
+            first = export_plan(self.df, self.plan, 'xlsx', 10)
+            again = export_plan(self.df.copy(), self.plan.copy(), 'xlsx', 10)
+            export_plan(self.df, run_optimization(self.df, 10), 'xlsx', 10)
+
+        assert first is again
+        assert stats.counters['cache.export_plan.hit'] == 1
+        assert stats.counters['cache.export_plan.miss'] == 2
+        assert stats.stages['export.xlsx'][0] == 2
+
+    def test_xlsx_rows_written_in_chunks(self):
+        """Con bloques pequeños el contenido es idéntico (NaN -> celda vacía)"""
+        frame = pd.DataFrame({'a': range(23), 'b': [1.5, None] * 11 + [2.0], 'c': ['x'] * 23})
+        buffer = io.BytesIO()
+        write_xlsx([('Hoja', frame)], buffer, chunk_rows=4)
+        pd.testing.assert_frame_equal(pd.read_excel(buffer), frame, check_dtype=False)
@@ -0,0 +1,76 @@
+"""
+Tests de la instrumentación opcional (tiempos por etapa y estadísticas del solver).
+Run with: pytest tests/test_instrumentation.py -v
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from cache import RESULT_CACHE
+from data_loader import load_scored_sheet
+from engine import PortfolioModel, run_optimization, calculate_sequential_gantt
+from instrumentation import collect_stats, current_stats, profile_call
+from test_engine import make_portfolio, WORKBOOK
+
+
+class TestInstrumentation:
+    """Tests de RunStats y del cableado en engine / data_loader"""
+
+    def setup_method(self):
+        RESULT_CACHE.clear()
+
+    def test_off_by_default(self):
+        """Sin collect_stats no hay estadísticas activas y todo funciona igual"""
+        assert current_stats() is None
+        assert len(run_optimization(make_portfolio(), 30)) > 0
+
+    def test_cbc_solver_statistics(self):
+        """CBC informa de estado, nodos, iteraciones, gap y tamaño del modelo"""
+        with collect_stats() as stats:
+            PortfolioModel(make_portfolio()).solve(30, solver='cbc')
+
+        solver = stats.last('solver')
+        assert solver['backend'] == 'cbc' and solver['status'] == 'Optimal'
+        assert solver['gap'] == 0.0
+        assert {'nodes', 'iterations'} <= set(solver)
+        assert stats.last('model')['variables'] == 5
+        assert {'optimize.model', 'optimize.build_milp', 'optimize.cbc'} <= set(stats.stages)
+
+    def test_native_stats_and_cache_counters(self):
+        """El DP nativo es exacto (gap 0) y la caché cuenta aciertos por función"""
+        df = make_portfolio()
+        with collect_stats() as stats:
+            run_optimization(df, 30)
+            run_optimization(df, 30)
+            calculate_sequential_gantt(df, 10)
+
+        assert stats.last('solver')['backend'] == 'native'
+        assert stats.last('solver')['gap'] == 0.0
+        assert stats.counters['cache.run_optimization.miss'] == 1
+        assert stats.counters['cache.run_optimization.hit'] == 1
+        assert stats.stages['schedule.sequential_gantt'][0] == 1
+
+    def test_profile_call_and_structured_log(self, caplog):
+        """profile_call devuelve (resultado, stats) y emite un log estructurado"""
+        with caplog.at_level(logging.INFO, logger='instrumentation'):
+            plan, stats = profile_call(run_optimization, make_portfolio(), 30)
+
+        assert isinstance(plan, pd.DataFrame)
+        record = [r for r in caplog.records if hasattr(r, 'spo_stats')][-1]
+        assert record.spo_stats['stages'] == stats.to_dict()['stages']
+        frame = stats.stage_frame()
+        assert list(frame.columns) == ['Etapa', 'Llamadas', 'Segundos']
+        assert np.all(np.diff(frame['Segundos']) <= 0)
+
+    def test_loader_stages(self, tmp_path):
+        """La carga distingue Excel (reconstrucción) de caché columnar"""
+        with collect_stats() as stats:
+            load_scored_sheet(WORKBOOK, '4_Actividades_Priorizadas', cache_dir=str(tmp_path))
+            load_scored_sheet(WORKBOOK, '4_Actividades_Priorizadas', cache_dir=str(tmp_path))
+
+        assert {'load.read_excel', 'load.prepare', 'load.cache_write', 'load.cache_read'} <= set(stats.stages)
+        assert stats.counters['cache.load_data.miss'] == 1
+        assert stats.counters['cache.load_data.hit'] == 1
+        assert [r['source'] for r in stats.records['load']] == ['excel', 'cache']
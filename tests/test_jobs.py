@@ -0,0 +1,97 @@
+"""
+Tests del ejecutor de trabajos en segundo plano (progreso, cancelación, deduplicación).
+Run with: pytest tests/test_jobs.py -v
+"""
+
+import threading
+
+import pytest
+import pandas as pd
+
+import instrumentation
+from cache import RESULT_CACHE
+from engine import run_optimization, run_monte_carlo, value_curve, simulate_schedule
+from instrumentation import collect_stats, listen_progress
+from jobs import JobManager, JobCancelled, job_key, sweep, DONE, CANCELLED, FAILED
+from test_engine import make_portfolio
+
+
+def wait_for_progress(release, n):
+    """Trabajo de prueba: avanza solo cuando el test lo suelta (sin carreras)."""
+    for i in range(n):
+        release.wait(5)
+        instrumentation.progress(i + 1, n)
+    return n
+
+
+class TestJobs:
+    """Tests de JobManager y del cableado de progreso en el motor"""
+
+    def setup_method(self):
+        RESULT_CACHE.clear()
+        self.jobs = JobManager(max_workers=2)
+
+    def teardown_method(self):
+        self.jobs.shutdown()
+
+    def test_result_matches_direct_call(self):
+        plan = run_optimization(make_portfolio(), 30)
+        job = self.jobs.submit(run_monte_carlo, plan, 20_000, seed=1, chunk_size=1_000)
+
+        pd.testing.assert_frame_equal(job.result(timeout=30), run_monte_carlo(plan, 20_000, seed=1, chunk_size=1_000))
+        assert job.status == DONE and job.progress == 1.0
+        assert job.stats.stages['simulate.monte_carlo'][0] == 1
+
+    def test_identical_jobs_deduplicated(self):
+        """Mismos datos (aunque sea otra copia) = mismo trabajo; otros parámetros = otro"""
+        release = threading.Event()
+        with collect_stats(log=False) as stats:
+            first = self.jobs.submit(wait_for_progress, release, 3)
+            again = self.jobs.submit(wait_for_progress, release, 3)
+            other = self.jobs.submit(wait_for_progress, release, 4)
+        found = self.jobs.lookup(wait_for_progress, release, 3)
+        release.set()
+
+        assert first is again and first is not other
+        assert stats.counters['jobs.dedup'] == 1
+        assert stats.counters['jobs.submitted'] == 2
+        assert job_key(value_curve, make_portfolio(), 60) == job_key(value_curve, make_portfolio().copy(), 60.0)
+        assert found is first
+
+    def test_cancel_running_job(self):
+        release = threading.Event()
+        job = self.jobs.submit(wait_for_progress, release, 1_000)
+        job.cancel()
+        release.set()
+
+        with pytest.raises(JobCancelled):
+            job.result(timeout=5)
+        assert job.status == CANCELLED and job.error is None
+        # Un trabajo cancelado no se reutiliza: se vuelve a lanzar
+        assert self.jobs.submit(wait_for_progress, release, 1_000) is not job
+
+    def test_failed_job(self):
+        job = self.jobs.submit(value_curve, make_portfolio().assign(Horas=-1), 10)
+        with pytest.raises(ValueError):
+            job.result(timeout=5)
+        assert job.status == FAILED and isinstance(job.error, ValueError)
+
+    def test_sweep_reports_progress(self):
+        df = make_portfolio()
+        seen = []
+        with listen_progress(lambda done, total: seen.append(done / total)):
+            plans = sweep(run_optimization, 'hours', [10, 20, 30], df)
+
+        assert [p['ID'].tolist() for p in plans] == [run_optimization(df, h)['ID'].tolist() for h in (10, 20, 30)]
+        assert seen == sorted(seen) and seen[-1] == 1.0
+
+    def test_engine_reports_progress(self):
+        """DP, Monte Carlo y simulación de calendario avisan hasta completar"""
+        plan = run_optimization(make_portfolio(), 30)
+        for call in (lambda: value_curve(make_portfolio(), 60),
+                     lambda: run_monte_carlo(plan, 5_000, chunk_size=1_000),
+                     lambda: simulate_schedule(plan, 10, iterations=3_000, chunk_size=1_000)):
+            seen = []
+            with listen_progress(lambda done, total: seen.append((done, total))):
+                call()
+            assert seen and seen[-1][0] == seen[-1][1]
@@ -0,0 +1,101 @@
+"""
+Tests de la cartera compacta (Portfolio) y de su uso en el motor.
+Run with: pytest tests/test_portfolio.py -v
+"""
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cache import RESULT_CACHE
+from data_loader import load_data
+from engine import (run_optimization, calculate_sequential_gantt, calculate_parallel_gantt, run_monte_carlo,
+                    run_robust_optimization, value_curve, pareto_frontier, sensitivity_analysis, weight_sensitivity,
+                    run_monte_carlo_adaptive, simulate_schedule)
+from instrumentation import collect_stats
+from portfolio import Portfolio
+from test_engine import make_portfolio, make_scored_portfolio, SCORE_WEIGHTS, WORKBOOK
+
+
+class TestPortfolio:
+    """Tests de Portfolio"""
+
+    def setup_method(self):
+        RESULT_CACHE.clear()
+
+    def test_compact_and_immutable(self):
+        p = Portfolio.from_frame(make_portfolio())
+
+        assert p.parent.dtype == np.int32 and p.parent.tolist() == [-1, 0, 1, -1, -1]
+        for array in (p.score, p.hours, p.cost, p.prob, p.parent):
+            assert array.flags.c_contiguous and not array.flags.writeable
+        with pytest.raises(AttributeError):
+            p.score = p.hours
+        with pytest.raises(AttributeError):
+            p.extra = 1  # __slots__: sin __dict__
+
+    def test_take_resolves_pre_req_inside_plan(self):
+        """En la sub-cartera el padre es una posición dentro de ella (o -1 si no está)"""
+        p = Portfolio.from_frame(make_portfolio())
+        plan = p.take([1, 2, 4])
+
+        assert plan.ids.tolist() == [2, 3, 5] and plan.parent.tolist() == [-1, 0, -1]
+        assert plan.values('Actividad').tolist() == ['B', 'C', 'E']
+        assert pickle.loads(pickle.dumps(plan)).frame.equals(plan.frame)
+
+    def test_engine_matches_dataframe(self):
+        """Mismo plan, Gantt y Monte Carlo que con el DataFrame (y la misma clave de caché)"""
+        df = make_portfolio()
+        p = Portfolio.from_frame(df)
+        plan_df = run_optimization(df, 30)
+        with collect_stats(log=False) as stats:
+            plan = run_optimization(p, 30)
+
+        assert isinstance(plan, Portfolio) and plan.ids.tolist() == plan_df['ID'].tolist()
+        assert plan.attrs['solve'] == plan_df.attrs['solve']
+        assert stats.counters['cache.run_optimization.hit'] == 1
+        pd.testing.assert_frame_equal(calculate_sequential_gantt(plan, 10), calculate_sequential_gantt(plan_df, 10))
+        pd.testing.assert_frame_equal(calculate_parallel_gantt(plan, [10, 5]),
+                                      calculate_parallel_gantt(plan_df, [10, 5]))
+        RESULT_CACHE.clear()
+        pd.testing.assert_frame_equal(run_monte_carlo(plan, 2_000, seed=3), run_monte_carlo(plan_df, 2_000, seed=3))
+
+    def test_every_entry_point_accepts_portfolio(self):
+        """Mismos resultados con la Portfolio que con el DataFrame; las selecciones son sub-carteras"""
+        df = make_portfolio()
+        p = Portfolio.from_frame(df)
+        plan_df, plan = run_optimization(df, 30), run_optimization(p, 30)
+
+        robust = run_robust_optimization(p, 30, alpha=0.9, scenarios=200, seed=1, time_limit=30)
+        assert isinstance(robust, Portfolio)
+        assert robust.ids.tolist() == run_robust_optimization(df, 30, scenarios=200, seed=1, time_limit=30)['ID'].tolist()
+        curve = value_curve(p, 40)
+        np.testing.assert_array_equal(curve.value, value_curve(df, 40).value)
+        assert isinstance(curve.selected(30), Portfolio)
+        pd.testing.assert_frame_equal(pareto_frontier(p).frontier, pareto_frontier(df).frontier)
+        pd.testing.assert_frame_equal(sensitivity_analysis(p, 30, 100).frame, sensitivity_analysis(df, 30, 100).frame)
+        assert run_monte_carlo_adaptive(plan, seed=1)['Resumen'].equals(run_monte_carlo_adaptive(plan_df, seed=1)['Resumen'])
+        assert simulate_schedule(plan, 10, 500, seed=1)['Criticidad'].equals(
+            simulate_schedule(plan_df, 10, 500, seed=1)['Criticidad'])
+
+        scored = make_scored_portfolio(30)
+        sweep = weight_sensitivity(Portfolio.from_frame(scored), 60, SCORE_WEIGHTS, samples=50, seed=2)
+        pd.testing.assert_frame_equal(sweep.frame, weight_sensitivity(scored, 60, SCORE_WEIGHTS, samples=50, seed=2).frame)
+
+    def test_load_data_builds_portfolio(self):
+        df, portfolio = load_data(WORKBOOK, "4_Actividades_Priorizadas")
+
+        assert isinstance(portfolio, Portfolio) and len(portfolio) == len(df)
+        assert portfolio.frame is df
+        np.testing.assert_array_equal(portfolio.score, df['Score_Real'].to_numpy(dtype=float))
+
+    def test_frames_without_coste(self):
+        """Monte Carlo y Gantt siguen aceptando los DataFrames que no traen Coste"""
+        df = make_portfolio()
+        mc = run_monte_carlo(df[['Horas', 'Probabilidad', 'Score_Real']], 1_000, seed=1)
+        gantt = calculate_sequential_gantt(df[['ID', 'Pre_req', 'Actividad', 'Horas', 'Score_Real']], 10)
+
+        assert len(mc) == 1_000 and gantt['ID'].tolist() == [1, 2, 3, 4, 5]
+        assert Portfolio.from_frame(df.drop(columns='Coste')).cost.tolist() == [0.0] * 5
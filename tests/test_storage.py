@@ -0,0 +1,126 @@
+"""
+Tests del almacén SQLite de decisiones y escenarios.
+Run with: pytest tests/test_storage.py -v
+"""
+
+import sqlite3
+
+import pandas as pd
+
+from batch_runner import SqliteSink, run_batch, scenario_grid
+from storage import DecisionStore
+from test_engine import make_portfolio
+
+
+def _decision(i, kind='escenario', **extra):
+    return dict(kind=kind, name=f"Escenario {i:04d}", hours=100 + i % 10 * 10, budget=None if i % 2 else 500,
+                value=float(i), cost=10.0 * i, used_hours=90.0, activity_ids=[i % 7 + 1, i % 5 + 1],
+                created_at=f"2026-01-{i % 28 + 1:02d}T10:00:{i % 60:02d}", **extra)
+
+
+class TestDecisionStore:
+    """Tests de DecisionStore"""
+
+    def test_record_and_items(self, tmp_path):
+        store = DecisionStore(str(tmp_path / "spo.db"))
+        dec_id = store.record('historial', "Plan A", 300, None, 42.5, 600, 280, [3, 1, 3, 2])
+
+        page = store.query()
+        assert page.loc[0, 'Nombre'] == "Plan A" and page.loc[0, 'Actividades'] == 3
+        assert pd.isna(page.loc[0, 'Presupuesto'])
+        assert store.items(dec_id) == [1, 2, 3]
+
+    def test_filters_and_paging_in_sql(self, tmp_path):
+        """count + query paginan con los mismos filtros sin traer el resto de filas"""
+        store = DecisionStore(str(tmp_path / "spo.db"))
+        store.record_many([_decision(i) for i in range(2000)] + [_decision(i, 'historial') for i in range(10)])
+
+        assert store.count(kind='escenario') == 2000
+        assert store.count(kind='escenario', name="Escenario 01") == 100
+        assert store.count(kind='escenario', max_budget=500) == 1000
+        assert store.count(kind='escenario', activity_id=7) == store.count(kind='escenario', activity_id=7, min_hours=0)
+
+        pages = [store.query(kind='escenario', limit=300, offset=o) for o in range(0, 2000, 300)]
+        assert [len(p) for p in pages] == [300] * 6 + [200]
+        fechas = pd.concat(pages)['Fecha']
+        assert fechas.is_monotonic_decreasing and pd.concat(pages)['ID'].is_unique
+
+    def test_name_filter_is_literal_prefix(self, tmp_path):
+        store = DecisionStore(str(tmp_path / "spo.db"))
+        store.record('escenario', "100%_remoto", 100, None, 1, 1, 1, [])
+        store.record('escenario', "100 horas", 100, None, 1, 1, 1, [])
+        assert store.query(name="100%_")['Nombre'].tolist() == ["100%_remoto"]
+
+    def test_portfolio_stored_and_filtered(self, tmp_path):
+        store = DecisionStore(str(tmp_path / "spo.db"))
+        store.record('historial', "Plan A", 100, None, 1, 1, 1, [1, 2], portfolio="Hoja1")
+        store.record('historial', "Plan B", 100, None, 1, 1, 1, [1], portfolio="Hoja2")
+
+        assert store.count(portfolio="Hoja1") == 1
+        page = store.query(portfolio="Hoja2")
+        assert page['Nombre'].tolist() == ["Plan B"] and page['Cartera'].tolist() == ["Hoja2"]
+
+    def test_v1_database_migrated(self, tmp_path):
+        """Una base anterior a la columna de cartera se migra sin perder filas"""
+        path = str(tmp_path / "spo.db")
+        conn = sqlite3.connect(path)
+        conn.executescript("""
+            CREATE TABLE decisions (id INTEGER PRIMARY KEY, created_at TEXT NOT NULL, kind TEXT NOT NULL,
+                name TEXT NOT NULL, hours REAL NOT NULL, budget REAL, weekly_hours REAL, value REAL NOT NULL,
+                cost REAL NOT NULL, used_hours REAL NOT NULL, n_items INTEGER NOT NULL);
+            INSERT INTO decisions VALUES (1, '2026-01-05T10:00:00', 'historial', 'Viejo', 100, NULL, NULL,
+                1, 1, 1, 0);
+            PRAGMA user_version=1;
+        """)
+        conn.close()
+
+        store = DecisionStore(path)
+        store.record('historial', "Nuevo", 100, None, 1, 1, 1, [], portfolio="Hoja1")
+        page = store.query(newest_first=False)
+        assert page['Nombre'].tolist() == ["Viejo", "Nuevo"]
+        assert pd.isna(page.loc[0, 'Cartera']) and page.loc[1, 'Cartera'] == "Hoja1"
+
+    def test_delete_by_portfolio_keeps_other_portfolios(self, tmp_path):
+        """Reset de la app: solo los escenarios de la cartera abierta"""
+        store = DecisionStore(str(tmp_path / "spo.db"))
+        store.record('escenario', "A", 100, None, 1, 1, 1, [1], portfolio="Hoja1")
+        otra = store.record('escenario', "B", 100, None, 1, 1, 1, [2], portfolio="Hoja2")
+        store.record('historial', "C", 100, None, 1, 1, 1, [3], portfolio="Hoja1")
+
+        assert store.delete(kind='escenario', portfolio="Hoja1") == 1
+        assert store.count(portfolio="Hoja2") == 1 and store.items(otra) == [2]
+        assert store.count(kind='historial', portfolio="Hoja1") == 1
+
+    def test_delete_cascades_to_items(self, tmp_path):
+        store = DecisionStore(str(tmp_path / "spo.db"))
+        esc = store.record('escenario', "A", 100, None, 1, 1, 1, [1, 2])
+        hist = store.record('historial', "B", 100, None, 1, 1, 1, [1])
+
+        assert store.delete(kind='escenario') == 1
+        assert store.items(esc) == [] and store.items(hist) == [1]
+        assert store.count() == 1
+
+    def test_legacy_csv_imported_once(self, tmp_path):
+        csv_path = tmp_path / "historial_decisiones.csv"
+        pd.DataFrame([{'Fecha': "2026-01-05 10:00", 'Escenario': "Viejo", 'Presupuesto': "Ilimitado", 'Horas': 300,
+                       'Valor': 40.0, 'Coste': 500, 'Tiempo_Real': 290, 'Items': 12},
+                      {'Fecha': "2026-01-06 11:30", 'Escenario': "Viejo 2", 'Presupuesto': 600, 'Horas': 200,
+                       'Valor': 30.0, 'Coste': 550, 'Tiempo_Real': 190, 'Items': 9}]).to_csv(csv_path, index=False)
+        store = DecisionStore(str(tmp_path / "spo.db"))
+
+        assert store.import_history_csv(str(csv_path)) == 2
+        assert store.import_history_csv(str(csv_path)) == 0
+        page = store.query(kind='historial', newest_first=False)
+        assert page['Actividades'].tolist() == [12, 9]
+        assert page['Fecha'].tolist() == ["2026-01-05T10:00:00", "2026-01-06T11:30:00"]
+
+    def test_batch_runner_writes_to_store(self, tmp_path):
+        path = str(tmp_path / "spo.db")
+        sink = SqliteSink(path, portfolio="Hoja1")
+        run_batch(make_portfolio(), scenario_grid([10, 30], [None], [10]), sink, batch_size=1)
+        sink.close()
+
+        store = DecisionStore(path)
+        page = store.query(kind='escenario', newest_first=False)
+        assert page['Nombre'].tolist() == ["Batch 0", "Batch 1"] and set(page['Cartera']) == {"Hoja1"}
+        assert len(store.items(page.loc[1, 'ID'])) == page.loc[1, 'Actividades']
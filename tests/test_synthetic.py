@@ -0,0 +1,72 @@
+"""
+Tests del generador sintético y de la suite de benchmarks.
+Run with: pytest tests/test_synthetic.py -v
+"""
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_roadmap, generate_portfolio
+from benchmarks.bench_engine import compare, run_suite
+from engine import PortfolioModel, calculate_sequential_gantt
+from portfolio import resolve_parent
+
+
+def _depths(parent):
+    depth = np.zeros(len(parent), dtype=np.int64)
+    for i, p in enumerate(parent):  # los padres siempre van antes que los hijos
+        if p >= 0:
+            depth[i] = depth[p] + 1
+    return depth
+
+
+class TestGenerator:
+    """Tests del roadmap sintético"""
+
+    def test_same_seed_same_roadmap(self):
+        pd.testing.assert_frame_equal(generate_roadmap(500, seed=3), generate_roadmap(500, seed=3))
+        assert not generate_roadmap(500, seed=3).equals(generate_roadmap(500, seed=4))
+
+    def test_forest_respects_depth_and_branching(self):
+        """Pre_req forma un bosque con la profundidad y ramificación pedidas"""
+        df = generate_portfolio(3000, seed=1, max_depth=3, branching=2, dependency_share=0.9)
+        parent = resolve_parent(df['ID'].to_numpy(), df['Pre_req'].to_numpy())
+
+        assert _depths(parent).max() <= 3
+        assert np.bincount(parent[parent >= 0]).max() <= 2
+        assert (parent >= 0).mean() > 0.5
+
+    def test_distributions_are_configurable(self):
+        df = generate_roadmap(1000, seed=0, hours=('integers', 5, 5), cost=('choice', [0]),
+                             score=('lognormal', 1.0, 0.2))
+        assert (df['Horas'] == 5).all() and (df['Coste'] == 0).all()
+        assert (df['Score'] > 0).all()
+
+    def test_engine_runs_on_synthetic_portfolio(self):
+        """El motor acepta el roadmap sintético tal cual sale del pipeline de scoring"""
+        df = generate_portfolio(300, seed=2)
+        model = PortfolioModel(df)
+        native = model.solve(200, solver='native')
+        cbc = model.solve(200, solver='cbc')
+
+        assert df['Score_Real'].to_numpy()[native].sum() == df['Score_Real'].to_numpy()[cbc].sum()
+        assert len(calculate_sequential_gantt(df, 10)) == 300
+
+
+class TestBenchmarkSuite:
+    """Tests de la suite de benchmarks (tamaños mínimos)"""
+
+    def test_suite_records_time_and_memory(self):
+        results = run_suite([50], cases=['run_optimization', 'calculate_sequential_gantt'], repeat=1,
+                            log=lambda msg: None)
+        assert [r['case'] for r in results] == ['run_optimization', 'calculate_sequential_gantt']
+        assert all(r['seconds'] > 0 and r['peak_mb'] >= 0 for r in results)
+
+    def test_regressions_flagged_against_baseline(self):
+        baseline = {'results': [{'case': 'a', 'size': 100, 'seconds': 0.10, 'peak_mb': 10.0},
+                                {'case': 'b', 'size': 100, 'seconds': 0.10, 'peak_mb': 10.0}]}
+        results = [{'case': 'a', 'size': 100, 'seconds': 0.20, 'peak_mb': 10.0},
+                   {'case': 'b', 'size': 100, 'seconds': 0.11, 'peak_mb': 10.5},
+                   {'case': 'c', 'size': 100, 'seconds': 9.99, 'peak_mb': 99.0}]
+
+        assert [r['case'] for r in compare(results, baseline)] == ['a']